@@ -3,10 +3,11 @@ JWT Authentication module - replaces GoTrue
 """
 import os
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
@@ -17,6 +18,8 @@ from database import get_db
 SECRET_KEY = os.getenv("JWT_SECRET", "your-super-secret-jwt-token-with-at-least-32-characters")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
+# Signed download links only work this long, and only for the URL they were made for
+DOWNLOAD_LINK_EXPIRE_SECONDS = 60
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -62,7 +65,8 @@ def decode_token(token: str) -> Optional[TokenData]:
         user_id = payload.get("sub")
         role = payload.get("role")
         profile_id = payload.get("profile_id")
-        if user_id is None:
+        # Signed download links (typ "download") are not bearer tokens
+        if user_id is None or payload.get("typ"):
             return None
         return TokenData(user_id=user_id, role=role, profile_id=profile_id)
     except JWTError:
@@ -101,6 +105,72 @@ async def get_optional_user(
     return decode_token(credentials.credentials)
 
 
+async def get_stream_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+) -> TokenData:
+    """Authenticate a streaming request.
+
+    Same check as get_current_user, but no DB session is held for the
+    lifetime of the stream.
+    """
+    token_data = decode_token(credentials.credentials) if credentials else None
+    if token_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return token_data
+
+
+def _link_target(path: str, query: List[Tuple[str, str]]) -> str:
+    return f"{path}?{urlencode(sorted(query))}"
+
+
+def create_download_link(user: TokenData, path: str, params: Dict[str, str]) -> str:
+    """URL of ``path`` with ``params`` and a short-lived signature standing in for the bearer token.
+
+    Lets the browser navigate to a download (and stream it to disk) without
+    the long-lived token appearing in logs and history.
+    """
+    query = sorted(params.items())
+    signature = jwt.encode({
+        "sub": user.user_id,
+        "role": user.role,
+        "profile_id": user.profile_id,
+        "typ": "download",
+        "target": _link_target(path, query),
+        "exp": datetime.utcnow() + timedelta(seconds=DOWNLOAD_LINK_EXPIRE_SECONDS),
+    }, SECRET_KEY, algorithm=ALGORITHM)
+    return f"{path}?{urlencode(query + [('signature', signature)])}"
+
+
+async def get_download_user(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+) -> TokenData:
+    """Authenticate a download by its Authorization header or a link from create_download_link"""
+    token_data = None
+    signature = request.query_params.get("signature")
+    if credentials:
+        token_data = decode_token(credentials.credentials)
+    elif signature:
+        try:
+            payload = jwt.decode(signature, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            payload = {}
+        query = [(key, value) for key, value in request.query_params.multi_items() if key != "signature"]
+        if payload.get("typ") == "download" and payload.get("target") == _link_target(request.scope["route"].path, query):
+            token_data = TokenData(user_id=payload["sub"], role=payload["role"], profile_id=payload["profile_id"])
+    if token_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return token_data
+
+
 def require_admin(current_user: TokenData = Depends(get_current_user)) -> TokenData:
     """Require admin role"""
     if current_user.role != "admin":
@@ -0,0 +1,79 @@
+"""
+Periodic maintenance jobs run inside the API process.
+
+Jobs are plain synchronous functions executed in a thread so they never
+block the event loop. With several uvicorn workers every worker schedules
+the job, but a Postgres advisory lock makes sure only one of them runs it
+at a time.
+
+The lock is held by a transaction left open on its own connection for as
+long as the job runs. Jobs commit in batches on their own sessions, so the
+lock cannot share their transaction. The lock connection does not come from
+the request pool: each running job costs one extra server connection, idle
+in transaction until the job ends. Allow for that in max_connections (or
+the PgBouncer pool size), and keep idle_in_transaction_session_timeout off
+for the API's role or longer than the slowest job.
+"""
+import asyncio
+import os
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.pool import NullPool
+
+from database import DATABASE_URL
+
+BACKGROUND_JOBS_ENABLED = os.getenv("BACKGROUND_JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_jobs: List[Tuple[str, float, Callable[[], Optional[dict]]]] = []
+_tasks: List[asyncio.Task] = []
+# Unpooled, so a lock connection is opened per job run and closed after it
+_lock_engine = create_engine(DATABASE_URL, poolclass=NullPool)
+
+
+def register_job(name: str, interval_seconds: float, fn: Callable[[], Optional[dict]]) -> None:
+    """Register a job to run every ``interval_seconds`` once the app starts"""
+    _jobs.append((name, interval_seconds, fn))
+
+
+def run_job_once(name: str, fn: Callable[[], Optional[dict]]) -> Optional[dict]:
+    """Run a job unless another worker already holds its lock.
+
+    Returns the job's result, or None if the job was skipped.
+    """
+    lock_key = zlib.crc32(name.encode())
+    # A transaction-level lock, held by keeping this transaction open while
+    # the job runs: it is released on commit or rollback, so it neither
+    # leaks nor needs an unlock on the same server connection, which a
+    # transaction-mode pooler (PGBOUNCER_TRANSACTION_MODE) would not promise
+    with _lock_engine.begin() as conn:
+        if not conn.execute(select(func.pg_try_advisory_xact_lock(lock_key))).scalar():
+            return None
+        return fn()
+
+
+async def _run_periodically(name: str, interval_seconds: float, fn: Callable[[], Optional[dict]]) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            result = await loop.run_in_executor(None, run_job_once, name, fn)
+            if result:
+                print(f"[{name}] {result}")
+        except Exception as e:
+            print(f"[{name}] ERROR: {e}")
+
+
+def start_background_jobs() -> None:
+    if not BACKGROUND_JOBS_ENABLED:
+        return
+    for name, interval_seconds, fn in _jobs:
+        _tasks.append(asyncio.create_task(_run_periodically(name, interval_seconds, fn)))
+
+
+async def stop_background_jobs() -> None:
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
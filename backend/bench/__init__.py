@@ -0,0 +1,8 @@
+"""
+Load-test and benchmark suite.
+
+``bench.seed`` fills a scratch Postgres with a synthetic fleet,
+``bench.run`` drives the real app over HTTP through scripted scenarios and
+writes latency, throughput and queries-per-request to ``bench/results``,
+and ``bench.compare`` diffs two result files. See bench/README.md.
+"""
@@ -0,0 +1,70 @@
+"""
+Compare two benchmark result files.
+
+    python -m bench.compare bench/results/before.json bench/results/after.json
+
+Prints per-endpoint p50/p95/p99 and queries-per-request for both runs with
+the relative change; --fail-over makes it exit non-zero when any p95
+regresses by more than the given percentage.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Optional
+
+METRICS = ["p50_ms", "p95_ms", "p99_ms", "queries_mean"]
+
+
+def change(before: Optional[float], after: Optional[float]) -> str:
+    if before is None or after is None:
+        return "-"
+    if before == 0:
+        return "same" if after == 0 else "new"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(before: dict, after: dict, fail_over: Optional[float]) -> bool:
+    """Print the comparison; returns False if a p95 regressed past fail_over"""
+    ok = True
+    print(f"before: {before['meta'].get('commit')}  {before['meta'].get('started_at')}")
+    print(f"after:  {after['meta'].get('commit')}  {after['meta'].get('started_at')}")
+    for scenario in sorted(set(before["scenarios"]) | set(after["scenarios"])):
+        old = before["scenarios"].get(scenario)
+        new = after["scenarios"].get(scenario)
+        print(f"\n== {scenario}")
+        if not old or not new:
+            print("   only in", "after" if new else "before")
+            continue
+        print(f"   throughput {old['throughput_rps']} -> {new['throughput_rps']} req/s "
+              f"({change(old['throughput_rps'], new['throughput_rps'])}), "
+              f"errors {old['errors']} -> {new['errors']}")
+        for endpoint in sorted(set(old["endpoints"]) | set(new["endpoints"])):
+            a = old["endpoints"].get(endpoint, {})
+            b = new["endpoints"].get(endpoint, {})
+            cells = [
+                f"{metric.replace('_ms', '')} {a.get(metric)} -> {b.get(metric)} ({change(a.get(metric), b.get(metric))})"
+                for metric in METRICS
+            ]
+            print(f"   {endpoint}\n      " + "  ".join(cells))
+            if fail_over is not None and a.get("p95_ms") and b.get("p95_ms"):
+                if (b["p95_ms"] - a["p95_ms"]) / a["p95_ms"] * 100 > fail_over:
+                    ok = False
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before", type=Path)
+    parser.add_argument("after", type=Path)
+    parser.add_argument("--fail-over", type=float, help="exit 1 if any endpoint's p95 grows by more than this percent")
+    args = parser.parse_args()
+
+    before = json.loads(args.before.read_text())
+    after = json.loads(args.after.read_text())
+    if not compare(before, after, args.fail_over):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Deterministic synthetic fleet data.
+
+Every row is derived from ``seed``, so the same seed and sizes always
+produce the same database, ids included. Reference tables come from one
+RNG; trips and invoices come from one RNG per bus and per month, so they
+can be generated in any number of shards in parallel without changing the
+output. Rows are plain dicts keyed by column name and are generated
+lazily, so millions of trips never have to fit in memory.
+"""
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from models import AppRole, BusStatus, ExpenseStatus, InvoiceStatus, InvoiceType, TripStatus
+
+BENCH_PASSWORD = "bench-password"
+ADMIN_EMAIL = "bench-admin@example.com"
+LOCAL_TZ = ZoneInfo("Asia/Kolkata")
+DAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# Expense category name -> (expenses per trip leg, amount range); diesel also gets litres
+EXPENSE_PROFILE = {
+    "Diesel": (1.0, (4000, 12000)),
+    "Toll": (0.9, (200, 1500)),
+    "Food": (0.6, (100, 600)),
+    "Parking": (0.2, (50, 300)),
+    "Water": (0.3, (150, 500)),
+    "Repair": (0.03, (1000, 20000)),
+    "Traffic Fine": (0.01, (500, 2000)),
+    "Miscellaneous": (0.1, (100, 1000)),
+}
+DIESEL_PRICE = 92.0
+
+
+def driver_email(index: int) -> str:
+    return f"bench-driver-{index:04d}@example.com"
+
+
+@dataclass
+class FleetConfig:
+    seed: int = 42
+    buses: int = 40
+    # Schedules are spread round-robin over the buses
+    schedules: int = 40
+    drivers: int = 50
+    routes: int = 30
+    days: int = 365
+    end_date: date = field(default_factory=lambda: date.today() - timedelta(days=1))
+    # Expenses submitted within this many days of end_date are still pending
+    pending_days: int = 14
+    invoices_per_month: int = 20
+
+
+class Fleet:
+    """Generates the tables in dependency order from one seeded RNG"""
+
+    def __init__(self, config: FleetConfig, states: Sequence[uuid.UUID], categories: Dict[str, uuid.UUID]):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.states = list(states)
+        self.categories = categories
+        self.start_date = config.end_date - timedelta(days=config.days - 1)
+
+    def new_id(self, rng: Optional[random.Random] = None) -> uuid.UUID:
+        return uuid.UUID(int=(rng or self.rng).getrandbits(128), version=4)
+
+    def stream(self, *key) -> random.Random:
+        """An RNG of its own for one shardable unit (a bus, a month)"""
+        return random.Random(":".join(str(part) for part in (self.config.seed,) + key))
+
+    def users(self, password_hash: str) -> Tuple[List[dict], List[dict], List[dict]]:
+        """auth.users, profiles and user_roles for one admin and the drivers"""
+        users, profiles, roles = [], [], []
+        accounts = [(ADMIN_EMAIL, "Bench Admin", AppRole.admin)] + [
+            (driver_email(i), f"Driver {i:04d}", AppRole.driver) for i in range(self.config.drivers)
+        ]
+        for email, name, role in accounts:
+            user_id = self.new_id()
+            users.append({"id": user_id, "email": email, "encrypted_password": password_hash})
+            profiles.append({
+                "id": self.new_id(),
+                "user_id": user_id,
+                "full_name": name,
+                "phone": f"9{self.rng.randrange(10**9):09d}",
+                "license_number": f"DL{self.rng.randrange(10**10):010d}" if role == AppRole.driver else None,
+            })
+            roles.append({"id": self.new_id(), "user_id": user_id, "role": role})
+        self.admin_profile_id = profiles[0]["id"]
+        self.driver_profiles = profiles[1:]
+        return users, profiles, roles
+
+    def routes(self) -> List[dict]:
+        rows = []
+        for i in range(self.config.routes):
+            from_state, to_state = self.rng.sample(self.states, 2)
+            distance = self.rng.randrange(150, 900)
+            rows.append({
+                "id": self.new_id(),
+                "route_name": f"Route {i:03d}",
+                "from_state_id": from_state,
+                "to_state_id": to_state,
+                "from_address": f"Depot {i:03d}A",
+                "to_address": f"Depot {i:03d}B",
+                "distance_km": distance,
+                "estimated_duration_hours": round(distance / 50, 1),
+            })
+        self.route_rows = rows
+        return rows
+
+    def buses(self) -> List[dict]:
+        rows = []
+        for i in range(self.config.buses):
+            rows.append({
+                "id": self.new_id(),
+                "registration_number": f"KA{self.rng.randrange(1, 70):02d}"
+                                       f"{chr(65 + self.rng.randrange(26))}{chr(65 + self.rng.randrange(26))}"
+                                       f"{self.rng.randrange(10000):04d}",
+                "bus_name": f"Bus {i:03d}",
+                "capacity": self.rng.choice([36, 40, 45, 49]),
+                "status": BusStatus.active,
+                "home_state_id": self.rng.choice(self.states),
+            })
+        self.bus_rows = rows
+        return rows
+
+    def schedules(self) -> List[dict]:
+        """Schedules assigned to buses round-robin; most run daily, some on weekdays only"""
+        rows = []
+        for i in range(self.config.schedules):
+            bus = self.bus_rows[i % len(self.bus_rows)]
+            route = self.rng.choice(self.route_rows)
+            driver = self.rng.choice(self.driver_profiles)
+            departure = time(self.rng.randrange(5, 23), self.rng.choice([0, 15, 30, 45]))
+            duration = timedelta(hours=float(route["estimated_duration_hours"]))
+            arrival = (datetime.combine(date.min, departure) + duration).time()
+            return_departure = (datetime.combine(date.min, arrival) + timedelta(hours=3)).time()
+            rows.append({
+                "id": self.new_id(),
+                "bus_id": bus["id"],
+                "route_id": route["id"],
+                "driver_id": driver["id"],
+                "days_of_week": DAY_NAMES if self.rng.random() < 0.8 else DAY_NAMES[:5],
+                "departure_time": departure,
+                "arrival_time": arrival,
+                "is_two_way": True,
+                "return_departure_time": return_departure,
+                "return_arrival_time": (datetime.combine(date.min, return_departure) + duration).time(),
+                "is_active": True,
+                "is_overnight": arrival < departure,
+                "arrival_next_day": arrival < departure,
+            })
+        self.schedule_rows = rows
+        return rows
+
+    def _expenses(self, rng: random.Random, trip: dict, driver_id: uuid.UUID, legs: int) -> List[dict]:
+        rows = []
+        recent = trip["trip_date"] > self.config.end_date - timedelta(days=self.config.pending_days)
+        for name, (per_leg, (low, high)) in EXPENSE_PROFILE.items():
+            if name not in self.categories:
+                continue
+            for _ in range(legs):
+                if rng.random() >= per_leg:
+                    continue
+                amount = rng.randrange(low, high)
+                if recent:
+                    status = ExpenseStatus.pending
+                else:
+                    status = ExpenseStatus.denied if rng.random() < 0.03 else ExpenseStatus.approved
+                rows.append({
+                    "id": self.new_id(rng),
+                    "trip_id": trip["id"],
+                    "category_id": self.categories[name],
+                    "submitted_by": driver_id,
+                    "amount": amount,
+                    "expense_date": trip["trip_date"],
+                    "fuel_quantity": round(amount / DIESEL_PRICE, 2) if name == "Diesel" else None,
+                    "status": status,
+                    "approved_by": None if status == ExpenseStatus.pending else self.admin_profile_id,
+                })
+        return rows
+
+    def _trip(self, rng: random.Random, day: date, number: int, schedule: dict, odometer: float) -> dict:
+        route = self._routes[schedule["route_id"]]
+        bus = self._buses[schedule["bus_id"]]
+        driver = self._drivers[schedule["driver_id"]]
+        distance = float(route["distance_km"])
+        outward = odometer + distance * rng.uniform(0.98, 1.05)
+        back = outward + distance * rng.uniform(0.98, 1.05)
+        start_at = datetime.combine(day, schedule["departure_time"], LOCAL_TZ)
+        trip = {
+            "id": self.new_id(rng),
+            "trip_number": f"TR{day:%y%m%d}-{number:05d}",
+            "bus_id": bus["id"],
+            "driver_id": driver["id"],
+            "route_id": route["id"],
+            "schedule_id": schedule["id"],
+            "start_date": start_at,
+            "end_date": start_at + timedelta(hours=2 * float(route["estimated_duration_hours"]) + 3),
+            "trip_date": day,
+            "status": TripStatus.completed,
+            "trip_type": "two_way",
+            "bus_name_snapshot": bus["bus_name"],
+            "driver_name_snapshot": driver["full_name"],
+            "departure_time": schedule["departure_time"],
+            "arrival_time": schedule["arrival_time"],
+            "odometer_start": round(odometer, 1),
+            "odometer_end": round(outward, 1),
+            "odometer_return_start": round(outward, 1),
+            "odometer_return_end": round(back, 1),
+            "return_departure_time": schedule["return_departure_time"],
+            "return_arrival_time": schedule["return_arrival_time"],
+            "water_taken": rng.randrange(0, 4),
+            "gst_percentage": 18,
+            "previous_trip_id": None,
+            "next_trip_id": None,
+            "cycle_position": 1,
+        }
+        seats = bus["capacity"]
+        for prefix in ("", "return_"):
+            fare = distance * rng.uniform(1.2, 2.0)
+            occupied = rng.randrange(seats // 3, seats + 1)
+            total = fare * occupied
+            shares = [rng.random() for _ in range(5)]
+            for channel, share in zip(("cash", "online", "paytm", "others", "agent"), shares):
+                trip[f"{prefix}revenue_{channel}"] = round(total * share / sum(shares), 2)
+        trip["return_total_revenue"] = round(
+            sum(trip[f"return_revenue_{c}"] for c in ("cash", "online", "paytm", "others", "agent")), 2
+        )
+        return trip
+
+    def trips(self, shard: int = 0, shards: int = 1) -> Iterator[Tuple[dict, List[dict]]]:
+        """
+        Yield (trip, expenses) for every scheduled day of the buses in this shard.
+
+        Consecutive daily trips of a schedule are chained through
+        previous_trip_id/next_trip_id with an increasing cycle_position, as
+        the schedule trip generator does; a day off starts a new cycle. A
+        trip is yielded once the next day is decided so next_trip_id is
+        filled in, and total_expense already holds its approved expenses.
+        """
+        self._routes = {route["id"]: route for route in self.route_rows}
+        self._buses = {bus["id"]: bus for bus in self.bus_rows}
+        self._drivers = {profile["id"]: profile for profile in self.driver_profiles}
+        numbers = {schedule["id"]: i for i, schedule in enumerate(self.schedule_rows)}
+        by_bus: Dict[uuid.UUID, List[dict]] = {}
+        for schedule in self.schedule_rows:
+            by_bus.setdefault(schedule["bus_id"], []).append(schedule)
+
+        buses = [(i, bus) for i, bus in enumerate(self.bus_rows) if i % shards == shard and bus["id"] in by_bus]
+        rngs = {bus["id"]: self.stream("bus", i) for i, bus in buses}
+        buses = [bus for _, bus in buses]
+        odometers = {bus["id"]: rngs[bus["id"]].randrange(20000, 300000) for bus in buses}
+        # schedule id -> yesterday's (trip, expenses), held back until today is decided
+        pending: Dict[uuid.UUID, Tuple[dict, List[dict]]] = {}
+
+        day = self.start_date
+        while day <= self.config.end_date:
+            for bus in buses:
+                rng = rngs[bus["id"]]
+                for schedule in by_bus[bus["id"]]:
+                    previous = pending.pop(schedule["id"], None)
+                    if DAY_NAMES[day.weekday()] not in schedule["days_of_week"] or rng.random() < 0.02:
+                        if previous:
+                            yield previous
+                        continue
+                    trip = self._trip(rng, day, numbers[schedule["id"]], schedule, odometers[bus["id"]])
+                    odometers[bus["id"]] = trip["odometer_return_end"]
+                    expenses = self._expenses(rng, trip, schedule["driver_id"], legs=2)
+                    trip["total_expense"] = sum(
+                        expense["amount"] for expense in expenses if expense["status"] == ExpenseStatus.approved
+                    )
+                    if previous:
+                        previous[0]["next_trip_id"] = trip["id"]
+                        trip["previous_trip_id"] = previous[0]["id"]
+                        trip["cycle_position"] = previous[0]["cycle_position"] + 1
+                        yield previous
+                    pending[schedule["id"]] = (trip, expenses)
+            day += timedelta(days=1)
+        yield from pending.values()
+
+    def invoices(self, shard: int = 0, shards: int = 1) -> Iterator[Tuple[dict, List[dict]]]:
+        """Yield (invoice, line items) for the months in this shard: charters billed monthly, settled except the last month"""
+        months = []
+        month = self.start_date.replace(day=1)
+        while month <= self.config.end_date:
+            months.append(month)
+            month = (month + timedelta(days=32)).replace(day=1)
+
+        for month in months[shard::shards]:
+            rng = self.stream("invoices", f"{month:%Y%m}")
+            for number in range(1, self.config.invoices_per_month + 1):
+                invoice_date = min(month + timedelta(days=rng.randrange(28)), self.config.end_date)
+                items = []
+                for i in range(rng.randrange(1, 4)):
+                    quantity = rng.randrange(1, 5)
+                    unit_price = rng.randrange(5000, 40000)
+                    base = quantity * unit_price
+                    items.append({
+                        "id": self.new_id(rng),
+                        "description": f"Charter service {i + 1}",
+                        "quantity": quantity,
+                        "unit_price": unit_price,
+                        "gst_percentage": 18,
+                        "base_amount": base,
+                        "gst_amount": round(base * 0.18, 2),
+                        "amount": round(base * 1.18, 2),
+                    })
+                subtotal = sum(item["base_amount"] for item in items)
+                gst = round(sum(item["gst_amount"] for item in items), 2)
+                settled = invoice_date < self.config.end_date - timedelta(days=30)
+                invoice = {
+                    "id": self.new_id(rng),
+                    "invoice_number": f"BENCH-{month:%Y%m}-{number:05d}",
+                    "invoice_date": invoice_date,
+                    "due_date": invoice_date + timedelta(days=15),
+                    "invoice_type": InvoiceType.charter,
+                    "customer_name": f"Customer {rng.randrange(500):03d}",
+                    "bus_id": rng.choice(self.bus_rows)["id"],
+                    "subtotal": subtotal,
+                    "gst_amount": gst,
+                    "total_amount": subtotal + gst,
+                    "amount_paid": subtotal + gst if settled else 0,
+                    "balance_due": 0 if settled else subtotal + gst,
+                    "status": InvoiceStatus.paid if settled else InvoiceStatus.sent,
+                }
+                for item in items:
+                    item["invoice_id"] = invoice["id"]
+                yield invoice, items
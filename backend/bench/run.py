@@ -0,0 +1,197 @@
+"""
+Run benchmark scenarios against the real app and save the results.
+
+    python -m bench.run --database-url postgresql://postgres:pw@localhost/busmanager_bench --workers 2
+
+Without --base-url the runner starts uvicorn itself against the given
+database, with the query detector on (so every response reports its SQL
+statement count) and background jobs off. Results are written to
+bench/results/<timestamp>-<commit>.json.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.scenarios import SCENARIOS, Fixtures, Samples, Session, load_fixtures
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples: Samples, wall_seconds: float) -> dict:
+    endpoints = {}
+    total = errors = 0
+    for name, entries in sorted(samples.items()):
+        latencies = sorted(seconds * 1000 for seconds, _, _ in entries)
+        failed = sum(1 for _, status, _ in entries if status == 0 or status >= 400)
+        queries = [q for _, _, q in entries if q is not None]
+        endpoints[name] = {
+            "requests": len(entries),
+            "errors": failed,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "queries_mean": round(sum(queries) / len(queries), 2) if queries else None,
+            "queries_max": max(queries) if queries else None,
+        }
+        total += len(entries)
+        errors += failed
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / wall_seconds, 2) if wall_seconds else None,
+        "endpoints": endpoints,
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, fixtures: Fixtures, name: str, users: int, iterations: int) -> dict:
+    scenario, _, _ = SCENARIOS[name]
+    samples: Samples = {}
+    fixtures.users = users
+
+    async def virtual_user(user: int) -> None:
+        session = Session(client, samples)
+        for iteration in range(iterations):
+            try:
+                await scenario(session, fixtures, user, iteration)
+            except httpx.HTTPError as e:
+                print(f"[bench] {name} user {user}: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(virtual_user(user) for user in range(users)))
+    result = summarize(samples, time.perf_counter() - start)
+    result.update({"users": users, "iterations": iterations})
+    return result
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_url: str, workers: int) -> Tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "QUERY_DETECTOR": "log",
+        # Count queries on every response without logging each repeated shape
+        "QUERY_DETECTOR_THRESHOLD": "1000000",
+        "BACKGROUND_JOBS_ENABLED": "false",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit("uvicorn exited during startup")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return server, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise SystemExit("uvicorn did not become healthy within 60s")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace, base_url: str) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        fixtures = await load_fixtures(client, run_id, args.drivers)
+        scenarios: Dict[str, dict] = {}
+        for name in args.scenarios:
+            _, default_users, default_iterations = SCENARIOS[name]
+            users = args.users or default_users
+            iterations = args.iterations or default_iterations
+            print(f"[bench] {name}: {users} users x {iterations} iterations")
+            scenarios[name] = await run_scenario(client, fixtures, name, users, iterations)
+            print(f"[bench] {name}: {scenarios[name]['throughput_rps']} req/s, {scenarios[name]['errors']} errors")
+    return {
+        "meta": {
+            "run_id": run_id,
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "workers": args.workers if not args.base_url else None,
+            "connections": args.connections,
+            "base_url": args.base_url,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run benchmark scenarios")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"), help="start uvicorn against this database")
+    target.add_argument("--base-url", help="benchmark an already running server instead")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--users", type=int, help="override every scenario's virtual users")
+    parser.add_argument("--iterations", type=int, help="override every scenario's iterations per user")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--drivers", type=int, default=50, help="driver accounts created by bench.seed")
+    parser.add_argument("--output", type=Path, help="result file (default bench/results/<timestamp>-<commit>.json)")
+    args = parser.parse_args()
+    if not args.database_url and not args.base_url:
+        parser.error("one of --database-url (or BENCH_DATABASE_URL) or --base-url is required")
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server, base_url = start_server(args.database_url, args.workers)
+    try:
+        result = asyncio.run(run(args, base_url))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{result['meta']['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"[bench] results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Scripted benchmark scenarios.
+
+Each scenario is a coroutine run once per virtual user and iteration. All
+requests go through ``Session.request`` so latency, status and the
+``X-Query-Count`` header (set by the query detector the runner enables) are
+recorded under a stable endpoint name rather than the concrete URL.
+"""
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.fleet import ADMIN_EMAIL, BENCH_PASSWORD, driver_email
+
+# endpoint name -> [(seconds, status, queries or None)]
+Samples = Dict[str, List[Tuple[float, int, Optional[int]]]]
+
+
+@dataclass
+class Session:
+    client: httpx.AsyncClient
+    samples: Samples
+    token: Optional[str] = None
+
+    async def request(self, method: str, name: str, url: str, **kwargs) -> httpx.Response:
+        headers = kwargs.pop("headers", {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.samples.setdefault(f"{method} {name}", []).append((time.perf_counter() - start, 0, None))
+            raise
+        elapsed = time.perf_counter() - start
+        queries = response.headers.get("x-query-count")
+        self.samples.setdefault(f"{method} {name}", []).append(
+            (elapsed, response.status_code, int(queries) if queries else None)
+        )
+        return response
+
+    async def login(self, email: str) -> None:
+        response = await self.request("POST", "/auth/login", "/auth/login", json={"email": email, "password": BENCH_PASSWORD})
+        response.raise_for_status()
+        self.token = response.json()["access_token"]
+
+
+@dataclass
+class Fixtures:
+    """Ids and dates shared by the scenarios, looked up once before a run"""
+    run_id: str
+    drivers: int
+    end_date: date
+    # Virtual users of the scenario being run
+    users: int = 1
+    route_ids: List[str] = field(default_factory=list)
+    trip_ids: List[str] = field(default_factory=list)
+    pending_expense_ids: List[str] = field(default_factory=list)
+
+
+async def load_fixtures(client: httpx.AsyncClient, run_id: str, drivers: int) -> Fixtures:
+    admin = Session(client, {})
+    await admin.login(ADMIN_EMAIL)
+    trips = (await admin.request("GET", "/trips", "/trips", params={"limit": 1000})).json()
+    routes = (await admin.request("GET", "/routes", "/routes")).json()
+    pending = (await admin.request("GET", "/expenses", "/expenses", params={"status": "pending", "limit": 1000})).json()
+    end_date = max((date.fromisoformat(trip["trip_date"]) for trip in trips if trip["trip_date"]), default=date.today())
+    return Fixtures(
+        run_id=run_id,
+        drivers=drivers,
+        end_date=end_date,
+        route_ids=[route["id"] for route in routes],
+        trip_ids=[trip["id"] for trip in trips],
+        pending_expense_ids=[expense["id"] for expense in pending],
+    )
+
+
+async def driver_morning_login(session: Session, fx: Fixtures, user: int, iteration: int) -> None:
+    """Drivers open the app at the start of a shift"""
+    await session.login(driver_email((user + iteration) % fx.drivers))
+    await session.request("GET", "/auth/me", "/auth/me")
+    await session.request("GET", "/trips/my", "/trips/my", params={"limit": 50})
+    await session.request("GET", "/expenses/my", "/expenses/my", params={"limit": 50})
+    await session.request("GET", "/notifications/unread-count", "/notifications/unread-count")
+    await session.request("GET", "/notifications", "/notifications")
+
+
+async def admin_analytics(session: Session, fx: Fixtures, user: int, iteration: int) -> None:
+    """Dashboard and report pages over the last month"""
+    if not session.token:
+        await session.login(ADMIN_EMAIL)
+    month_start = (fx.end_date - timedelta(days=30)).isoformat()
+    month_end = fx.end_date.isoformat()
+    route_id = fx.route_ids[(user + iteration) % len(fx.route_ids)]
+    trip_id = fx.trip_ids[(user * 31 + iteration) % len(fx.trip_ids)]
+
+    await session.request("GET", "/trips", "/trips", params={"from_date": month_start, "to_date": month_end, "limit": 1000})
+    await session.request("GET", "/expenses", "/expenses", params={"from_date": month_start, "to_date": month_end, "limit": 1000})
+    await session.request("GET", "/routes/{route_id}/expense-summary", f"/routes/{route_id}/expense-summary",
+                          params={"from_date": month_start, "to_date": month_end})
+    await session.request("GET", "/trips/{trip_id}/financials", f"/trips/{trip_id}/financials")
+    await session.request("GET", "/exports/period", "/exports/period", params={"from_date": month_start, "to_date": month_end})
+    await session.request("GET", "/exports/trip-sheet", "/exports/trip-sheet",
+                          params={"from_date": month_start, "to_date": month_end, "format": "csv"})
+
+
+async def month_end_invoicing(session: Session, fx: Fixtures, user: int, iteration: int) -> None:
+    """Raise and settle invoices, then clear a slice of the approval backlog"""
+    if not session.token:
+        await session.login(ADMIN_EMAIL)
+    response = await session.request("POST", "/invoices", "/invoices", json={
+        "invoice_number": f"RUN-{fx.run_id}-{user:03d}-{iteration:04d}",
+        "invoice_type": "charter",
+        "customer_name": f"Bench customer {user}",
+        "line_items": [
+            {"description": "Charter", "quantity": 2, "unit_price": 18000},
+            {"description": "Toll recovery", "quantity": 1, "unit_price": 2400, "gst_percentage": 0},
+            {"description": "Advance received", "quantity": 1, "unit_price": 5000, "is_deduction": True},
+        ],
+    })
+    if response.status_code == 200:
+        invoice = response.json()
+        await session.request("POST", "/invoices/{invoice_id}/payments", f"/invoices/{invoice['id']}/payments",
+                              json={"amount": round(invoice["total_amount"] / 2, 2), "payment_mode": "UPI"})
+        await session.request("GET", "/invoices/{invoice_id}", f"/invoices/{invoice['id']}")
+    await session.request("GET", "/invoices", "/invoices", params={"limit": 100})
+
+    # Each user approves its own slice so concurrent batches never overlap
+    slot = iteration * fx.users + user
+    batch = fx.pending_expense_ids[slot * 20:(slot + 1) * 20]
+    if batch:
+        await session.request("POST", "/expenses/approve-batch", "/expenses/approve-batch",
+                              json={"expense_ids": batch, "status": "approved", "admin_remarks": "Month-end review"})
+
+
+async def trip_generation(session: Session, fx: Fixtures, user: int, iteration: int) -> None:
+    """The daily schedule run; after the first call it only checks existing trips"""
+    if not session.token:
+        await session.login(ADMIN_EMAIL)
+    await session.request("POST", "/schedules/generate-trips", "/schedules/generate-trips")
+    await session.request("GET", "/trips", "/trips", params={"from_date": date.today().isoformat(), "limit": 1000})
+
+
+ScenarioFn = Callable[[Session, Fixtures, int, int], Awaitable[None]]
+
+# name -> (coroutine, default virtual users, default iterations per user)
+SCENARIOS: Dict[str, Tuple[ScenarioFn, int, int]] = {
+    "driver_morning_login": (driver_morning_login, 50, 2),
+    "admin_analytics": (admin_analytics, 5, 10),
+    "month_end_invoicing": (month_end_invoicing, 5, 10),
+    "trip_generation": (trip_generation, 1, 5),
+}
@@ -0,0 +1,272 @@
+"""
+Seed a scratch Postgres with a synthetic fleet.
+
+    python -m bench.seed --database-url postgresql://postgres:pw@localhost/busmanager_bench --reset
+    python -m bench.seed --reset --buses 2000 --schedules 10000 --drivers 3000 --days 500 --jobs 8
+
+The database must already have the schema (docker/init-db-python.sql),
+which also provides the states and expense categories the fleet uses.
+Rows are streamed with COPY; trips, expenses and invoices are generated
+and loaded by --jobs worker processes, one shard of buses (or months) per
+transaction. The output only depends on --seed and the sizes, never on
+--jobs.
+"""
+import argparse
+import enum
+import itertools
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Iterable, List, Optional
+
+from passlib.context import CryptContext
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.engine import Engine
+
+from bench.fleet import BENCH_PASSWORD, Fleet, FleetConfig
+from partitions import PARTITIONED_TABLES
+from models import (
+    Bus, BusSchedule, Expense, ExpenseCategory, IndianState, Invoice, InvoiceLineItem, Profile, Route, Trip,
+    User, UserRole
+)
+
+# Shards per worker process, so one slow shard does not leave the others idle
+SHARDS_PER_JOB = 4
+
+# Emptied by --reset, children first; reference data (states, categories, settings) is kept
+FLEET_TABLES = [
+    "public.notifications", "public.notification_counters", "public.fleet_daily_expense_rollups",
+    "public.fleet_daily_rollups", "public.invoice_payments",
+    "public.invoice_line_items", "public.invoices", "public.expenses", "public.trips",
+    "public.bus_schedules", "public.buses", "public.routes", "public.user_roles",
+    "public.profiles", "auth.users",
+]
+
+# Switched off while trips and expenses are copied in: trips are generated
+# with total_expense already summed, the fleet rollups are rebuilt in one
+# pass afterwards instead of per COPY, and generated trip references are
+# always valid
+LOAD_DISABLED_TRIGGERS = [
+    ("public.expenses", "trip_expense_total_insert"),
+    ("public.expenses", "fleet_expense_rollups_insert"),
+    ("public.expenses", "expenses_trip_reference_insert"),
+    ("public.invoices", "invoices_trip_reference_insert"),
+    ("public.trips", "fleet_rollups_insert"),
+]
+
+
+def copy_value(value) -> str:
+    """Render one value in COPY text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, enum.Enum):
+        value = value.value
+    elif isinstance(value, (list, tuple)):
+        value = "{" + ",".join(value) + "}"
+    elif hasattr(value, "isoformat"):
+        value = value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_line(columns: List[str], row: dict) -> str:
+    return "\t".join(copy_value(row[c]) for c in columns) + "\n"
+
+
+def _copy_sql(table, columns: List[str]) -> str:
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    return f"COPY {table.fullname} ({column_list}) FROM STDIN"
+
+
+class CopyStream:
+    """File-like view over rows rendered as COPY lines, pulled as psycopg2 reads"""
+
+    def __init__(self, columns: List[str], rows: Iterable[dict]):
+        self._lines = (copy_line(columns, row) for row in rows)
+        self._buffer = ""
+        self.count = 0
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+            self.count += 1
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def copy_rows(cursor, table, rows: Iterable[dict]) -> int:
+    """COPY rows (dicts sharing the same keys) into table; returns the number copied"""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+    stream = CopyStream(list(first), itertools.chain([first], rows))
+    cursor.copy_expert(_copy_sql(table, list(first)), stream)
+    return stream.count
+
+
+def _copy_with_children(cursor, parent_table, child_table, pairs) -> tuple:
+    """COPY (parent, [children]) pairs: parents stream straight in while children spill to a temp file"""
+    child_columns: List[str] = []
+    child_count = 0
+    with tempfile.TemporaryFile("w+") as spill:
+        def parents():
+            nonlocal child_count
+            for parent, children in pairs:
+                for child in children:
+                    if not child_columns:
+                        child_columns.extend(child)
+                    spill.write(copy_line(child_columns, child))
+                    child_count += 1
+                yield parent
+
+        parent_count = copy_rows(cursor, parent_table, parents())
+        if child_count:
+            spill.seek(0)
+            cursor.copy_expert(_copy_sql(child_table, child_columns), spill)
+    return parent_count, child_count
+
+
+# Worker process state, set once by _init_worker
+_worker_engine: Optional[Engine] = None
+_worker_fleet: Optional[Fleet] = None
+
+
+def _init_worker(database_url: str, fleet: Fleet) -> None:
+    global _worker_engine, _worker_fleet
+    _worker_engine = create_engine(database_url, pool_size=1, max_overflow=0)
+    _worker_fleet = fleet
+
+
+def _load_trip_shard(shard: int, shards: int) -> tuple:
+    conn = _worker_engine.raw_connection()
+    try:
+        counts = _copy_with_children(
+            conn.cursor(), Trip.__table__, Expense.__table__, _worker_fleet.trips(shard, shards)
+        )
+        conn.commit()
+        return counts
+    finally:
+        conn.close()
+
+
+def _load_invoice_shard(shard: int, shards: int) -> tuple:
+    conn = _worker_engine.raw_connection()
+    try:
+        counts = _copy_with_children(
+            conn.cursor(), Invoice.__table__, InvoiceLineItem.__table__, _worker_fleet.invoices(shard, shards)
+        )
+        conn.commit()
+        return counts
+    finally:
+        conn.close()
+
+
+def check_target(engine: Engine, reset: bool, force: bool) -> None:
+    """Refuse to touch a database that does not look like a scratch copy"""
+    name = engine.url.database or ""
+    if "bench" not in name and not force:
+        raise SystemExit(f"Refusing to seed '{name}': use a database with 'bench' in its name or pass --force")
+    with engine.begin() as conn:
+        populated = conn.execute(select(Trip.id).limit(1)).first() is not None
+        if populated and not reset:
+            raise SystemExit("Database already has trips; pass --reset to replace the fleet")
+        if reset:
+            conn.execute(text(f"TRUNCATE {', '.join(FLEET_TABLES)} CASCADE"))
+
+
+def seed(engine: Engine, config: FleetConfig, jobs: int = 1) -> dict:
+    started = time.perf_counter()
+    counts = {}
+    with engine.begin() as conn:
+        states = conn.execute(select(IndianState.id).order_by(IndianState.state_code)).scalars().all()
+        categories = dict(conn.execute(select(ExpenseCategory.name, ExpenseCategory.id)).all())
+    if not states or not categories:
+        raise SystemExit("States or expense categories missing; apply docker/init-db-python.sql first")
+
+    fleet = Fleet(config, states, categories)
+    # One bcrypt hash shared by every account keeps seeding fast
+    password_hash = CryptContext(schemes=["bcrypt"]).hash(BENCH_PASSWORD)
+    users, profiles, roles = fleet.users(password_hash)
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        counts["users"] = copy_rows(cursor, User.__table__, users)
+        counts["profiles"] = copy_rows(cursor, Profile.__table__, profiles)
+        copy_rows(cursor, UserRole.__table__, roles)
+        counts["routes"] = copy_rows(cursor, Route.__table__, fleet.routes())
+        counts["buses"] = copy_rows(cursor, Bus.__table__, fleet.buses())
+        counts["schedules"] = copy_rows(cursor, BusSchedule.__table__, fleet.schedules())
+        conn.commit()
+    finally:
+        conn.close()
+
+    shards = jobs * SHARDS_PER_JOB
+    with engine.begin() as conn:
+        # Months outside the partitions the schema created would land in the default partition
+        for table in PARTITIONED_TABLES:
+            conn.execute(select(func.public.ensure_monthly_partitions(table, fleet.start_date, config.end_date)))
+        for table, trigger in LOAD_DISABLED_TRIGGERS:
+            conn.execute(text(f"ALTER TABLE {table} DISABLE TRIGGER {trigger}"))
+    try:
+        with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(engine.url.render_as_string(hide_password=False), fleet)) as pool:
+            trip_shards = pool.map(_load_trip_shard, range(shards), [shards] * shards)
+            invoice_shards = pool.map(_load_invoice_shard, range(shards), [shards] * shards)
+            trip_counts = list(trip_shards)
+            invoice_counts = list(invoice_shards)
+    finally:
+        with engine.begin() as conn:
+            for table, trigger in LOAD_DISABLED_TRIGGERS:
+                conn.execute(text(f"ALTER TABLE {table} ENABLE TRIGGER {trigger}"))
+    counts["trips"] = sum(trips for trips, _ in trip_counts)
+    counts["expenses"] = sum(expenses for _, expenses in trip_counts)
+    counts["invoices"] = sum(invoices for invoices, _ in invoice_counts)
+    counts["invoice_line_items"] = sum(items for _, items in invoice_counts)
+    with engine.begin() as conn:
+        counts["rollup_rows"] = conn.execute(text("SELECT public.rebuild_fleet_rollups()")).scalar()
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+    counts["seconds"] = round(time.perf_counter() - started, 1)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed a benchmark database with a synthetic fleet")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"), required=not os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--buses", type=int, default=40)
+    parser.add_argument("--schedules", type=int, help="bus schedules (default one per bus)")
+    parser.add_argument("--drivers", type=int, default=50)
+    parser.add_argument("--routes", type=int, default=30)
+    parser.add_argument("--days", type=int, default=365, help="days of trip history")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None, help="last day of history (default yesterday)")
+    parser.add_argument("--invoices-per-month", type=int, default=20)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="parallel COPY worker processes")
+    parser.add_argument("--reset", action="store_true", help="empty the fleet tables first")
+    parser.add_argument("--force", action="store_true", help="allow a database without 'bench' in its name")
+    args = parser.parse_args()
+
+    config = FleetConfig(
+        seed=args.seed, buses=args.buses, schedules=args.schedules or args.buses, drivers=args.drivers,
+        routes=args.routes, days=args.days, invoices_per_month=args.invoices_per_month
+    )
+    if args.end_date:
+        config.end_date = args.end_date
+
+    engine = create_engine(args.database_url)
+    check_target(engine, args.reset, args.force)
+    print(seed(engine, config, jobs=max(1, args.jobs)))
+
+
+if __name__ == "__main__":
+    main()
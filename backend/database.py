@@ -2,10 +2,13 @@
 Database connection and session management
 """
 import os
+import time
 from urllib.parse import quote_plus
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.sql.dml import UpdateBase
 
 
 def _build_database_url() -> str:
@@ -25,16 +28,136 @@ def _build_database_url() -> str:
 
 
 DATABASE_URL = os.getenv("DATABASE_URL") or _build_database_url()
+# Optional streaming replica for reports and listings
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL", "")
+# After a client's own write its reads stay on the primary this long, so it
+# never reads back data the replica has not replayed yet. Write responses
+# carry the deadline (epoch ms) in READ_PRIMARY_HEADER and the client sends
+# it back, so this holds whichever worker answers.
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+# Direct server connection for what a transaction-mode pooler cannot carry
+# (the notification LISTEN connection); defaults to DATABASE_URL
+DIRECT_DATABASE_URL = os.getenv("DIRECT_DATABASE_URL") or DATABASE_URL
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, pool_size=5, max_overflow=10)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds a request waits for a free connection before failing with 503
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Connections older than this are replaced on checkout (-1 disables)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Server-side statement timeouts; 0 disables. Reports and exports get the long one.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+DB_REPORT_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_REPORT_STATEMENT_TIMEOUT_MS", "120000"))
+# PgBouncer in transaction pooling mode rejects startup options and mixes
+# sessions, so timeouts are set with SET LOCAL in every transaction instead
+PGBOUNCER_TRANSACTION_MODE = os.getenv("PGBOUNCER_TRANSACTION_MODE", "false").lower() == "true"
+
+connect_args = {}
+if DB_STATEMENT_TIMEOUT_MS and not PGBOUNCER_TRANSACTION_MODE:
+    connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+engine_options = dict(
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    connect_args=connect_args,
+)
+engine = create_engine(DATABASE_URL, **engine_options)
+replica_engine = create_engine(REPLICA_DATABASE_URL, **engine_options) if REPLICA_DATABASE_URL else None
+# Every engine by pool name; instrumentation listens on all of them
+engines = {"primary": engine}
+if replica_engine is not None:
+    engines["replica"] = replica_engine
+
+
+class RoutingSession(Session):
+    """Reads go to the replica when ``info["use_replica"]`` is set; flushes and DML always go to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["pending_write"] = True
+            return engine
+        if replica_engine is not None and self.info.get("use_replica"):
+            return replica_engine
+        return engine
+
+
+SessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, bind=engine,
+    # Only needs setting per transaction when the connection default cannot be used
+    info={"statement_timeout_ms": (DB_STATEMENT_TIMEOUT_MS or None) if PGBOUNCER_TRANSACTION_MODE else None}
+)
+ReportSessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, bind=engine,
+    info={"statement_timeout_ms": DB_REPORT_STATEMENT_TIMEOUT_MS}
+)
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency to get database session"""
-    db = SessionLocal()
+def _set_statement_timeout(session, transaction, connection):
+    timeout_ms = session.info.get("statement_timeout_ms")
+    if timeout_ms is not None:
+        # SET LOCAL ends with the transaction, so pooled connections keep their default
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def _commit_writes(session):
+    response = session.info.get("response")
+    if session.info.pop("pending_write", False) and response is not None and replica_engine is not None:
+        until_ms = int((time.time() + REPLICA_STICKY_SECONDS) * 1000)
+        response.headers[READ_PRIMARY_HEADER] = str(until_ms)
+
+
+def _discard_writes(session):
+    session.info.pop("pending_write", None)
+
+
+for _sessions in (SessionLocal, ReportSessionLocal):
+    event.listen(_sessions, "after_begin", _set_statement_timeout)
+    event.listen(_sessions, "after_commit", _commit_writes)
+    event.listen(_sessions, "after_rollback", _discard_writes)
+
+
+def _reads_from_replica(request: Request) -> bool:
+    """Replica unless the client echoes a READ_PRIMARY_HEADER that has not passed yet"""
+    if replica_engine is None:
+        return False
+    try:
+        until_ms = float(request.headers.get(READ_PRIMARY_HEADER, 0))
+    except ValueError:
+        return True
+    return until_ms <= time.time() * 1000
+
+
+def _session(sessions: sessionmaker, response: Response, use_replica: bool):
+    db = sessions()
+    db.info["use_replica"] = use_replica
+    db.info["response"] = response
     try:
         yield db
     finally:
         db.close()
+
+
+def get_db(response: Response):
+    """Dependency to get database session"""
+    yield from _session(SessionLocal, response, use_replica=False)
+
+
+def get_read_db(request: Request, response: Response):
+    """Dependency for read-only endpoints: the replica if configured, unless the client wrote recently"""
+    use_replica = _reads_from_replica(request)
+    if replica_engine is not None:
+        response.headers["X-Read-From"] = "replica" if use_replica else "primary"
+    yield from _session(SessionLocal, response, use_replica)
+
+
+def get_report_db(request: Request, response: Response):
+    """Dependency for reports and exports: long statement timeout, replica like get_read_db"""
+    use_replica = _reads_from_replica(request)
+    if replica_engine is not None:
+        response.headers["X-Read-From"] = "replica" if use_replica else "primary"
+    yield from _session(ReportSessionLocal, response, use_replica)
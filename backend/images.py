@@ -0,0 +1,103 @@
+"""
+Image pipeline for uploaded receipts and repair photos.
+
+Each raster upload gets a compressed web version and a small thumbnail
+(WebP), written next to the original as ``<stem>.web.webp`` and
+``<stem>.thumb.webp``. Decoding and resizing run in a small process pool so
+the event loop is never blocked.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Set
+
+from PIL import Image, ImageOps
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "1"))
+
+# variant name -> (longest side in px, WebP quality)
+VARIANTS = {
+    "web": (1600, 80),
+    "thumb": (400, 70),
+}
+
+RASTER_TYPES = {"image/jpeg", "image/png", "image/webp"}
+RASTER_EXTENSIONS = {"jpg", "jpeg", "png", "webp"}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pending: Set[asyncio.Task] = set()
+
+
+def variant_path(original_path: str, variant: str) -> str:
+    stem = os.path.splitext(original_path)[0]
+    return f"{stem}.{variant}.webp"
+
+
+def is_variant_file(filename: str) -> bool:
+    return any(filename.endswith(f".{variant}.webp") for variant in VARIANTS)
+
+
+def process_image(original_path: str) -> dict:
+    """Write every variant for one image (runs in a worker process)"""
+    largest = max(size for size, _ in VARIANTS.values())
+    with Image.open(original_path) as img:
+        # Let the JPEG decoder downscale while decoding; saves most of the memory
+        img.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+        written = {}
+        for variant, (size, quality) in sorted(VARIANTS.items(), key=lambda v: -v[1][0]):
+            img.thumbnail((size, size), Image.LANCZOS)
+            path = variant_path(original_path, variant)
+            temp_path = f"{path}.part"
+            img.save(temp_path, "WEBP", quality=quality, method=4)
+            os.replace(temp_path, path)
+            written[variant] = path
+    return written
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: never fork the running event loop and its threads
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def generate_variants(original_path: str) -> dict:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), process_image, original_path)
+
+
+def schedule_variants(original_path: str) -> None:
+    """Generate variants in the background after an upload has been saved"""
+    task = asyncio.create_task(generate_variants(original_path))
+    _pending.add(task)
+
+    def _done(t: asyncio.Task) -> None:
+        _pending.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            print(f"[images] Failed to process {original_path}: {t.exception()}")
+
+    task.add_done_callback(_done)
+
+
+def remove_variants(original_path: str) -> int:
+    """Delete an original's variants; returns the bytes freed"""
+    freed = 0
+    for variant in VARIANTS:
+        path = variant_path(original_path, variant)
+        if os.path.exists(path):
+            freed += os.path.getsize(path)
+            os.remove(path)
+    return freed
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
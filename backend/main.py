@@ -35,9 +35,10 @@ def load_env() -> None:
 load_env()
 
 # Now safe to import modules that read env vars at import time
-from fastapi import FastAPI  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
 from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
-from fastapi.staticfiles import StaticFiles  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError  # noqa: E402
 
 from routes import (  # noqa: E402
     auth_router,
@@ -45,6 +46,9 @@ from routes import (  # noqa: E402
     drivers_router,
     expense_categories_router,
     expenses_router,
+    exports_router,
+    admin_router,
+    analytics_router,
     invoices_router,
     notifications_router,
     repairs_router,
@@ -55,7 +59,22 @@ from routes import (  # noqa: E402
     stock_router,
     trips_router,
     uploads_router,
+    uploads_media_router,
 )
+from database import READ_PRIMARY_HEADER  # noqa: E402
+from routes.uploads import MAX_LOGO_SIZE, MAX_UPLOAD_SIZE, UploadSizeLimitMiddleware  # noqa: E402
+from images import shutdown_pool  # noqa: E402
+from background import register_job, start_background_jobs, stop_background_jobs  # noqa: E402
+from notify import NOTIFICATION_PURGE_INTERVAL_SECONDS, purge_notifications  # noqa: E402
+from upload_gc import UPLOAD_GC_INTERVAL_SECONDS, collect_orphaned_uploads  # noqa: E402
+from reconcile import RECONCILE_INTERVAL_SECONDS, reconcile_trip_totals  # noqa: E402
+from partitions import PARTITION_INTERVAL_SECONDS, ensure_partitions  # noqa: E402
+from stock_snapshots import STOCK_SNAPSHOT_INTERVAL_SECONDS, snapshot_stock_balances  # noqa: E402
+from realtime import notification_broker  # noqa: E402
+from metrics import MetricsMiddleware, mark_worker_dead, router as metrics_router  # noqa: E402
+from query_detector import QUERY_DETECTOR, QueryDetectorMiddleware  # noqa: E402
+from query_log import RequestIdMiddleware  # noqa: E402
+from profiling import PROFILING_ENABLED, ProfilingMiddleware  # noqa: E402
 
 # Create FastAPI app
 app = FastAPI(
@@ -64,6 +83,13 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Cap upload bodies before they are read (inside CORS so the 413 carries its headers)
+app.add_middleware(UploadSizeLimitMiddleware, limits={
+    "/upload/expense": MAX_UPLOAD_SIZE,
+    "/upload/repair": MAX_UPLOAD_SIZE,
+    "/upload/logo": MAX_LOGO_SIZE,
+})
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -71,8 +97,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by the client to keep its reads on the primary after a write
+    expose_headers=[READ_PRIMARY_HEADER],
 )
 
+# Request latency and per-request SQL statistics, scraped at /metrics
+app.add_middleware(MetricsMiddleware)
+app.include_router(metrics_router, tags=["Metrics"])
+
+# Development only: flag N+1 query patterns (QUERY_DETECTOR=log|raise)
+if QUERY_DETECTOR:
+    app.add_middleware(QueryDetectorMiddleware)
+
+# Admin-only per-request profiling (X-Profile: html|store or ?_profile=html|store)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Outermost: X-Request-ID on every response and as a comment on every SQL statement
+app.add_middleware(RequestIdMiddleware)
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_exhausted(request: Request, exc: PoolTimeoutError):
+    """No database connection freed up within DB_POOL_TIMEOUT"""
+    print(f"[db] pool exhausted: {request.method} {request.url.path}")
+    return JSONResponse(status_code=503, content={"detail": "Database busy, try again"}, headers={"Retry-After": "1"})
 
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -85,8 +134,8 @@ UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", BASE_DIR / "uploads")).resolve()
 (UPLOAD_DIR / "repairs").mkdir(parents=True, exist_ok=True)
 (UPLOAD_DIR / "logos").mkdir(parents=True, exist_ok=True)
 
-# Mount static files for uploads
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+# Uploaded files and their resized variants (/uploads/{folder}/{filename}[/thumb])
+app.include_router(uploads_media_router, prefix="/uploads", tags=["Uploads"])
 
 # Include routers
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
@@ -104,6 +153,30 @@ app.include_router(uploads_router, prefix="/upload", tags=["Uploads"])
 app.include_router(settings_router, prefix="/settings", tags=["Settings"])
 app.include_router(states_router, prefix="/states", tags=["Indian States"])
 app.include_router(notifications_router, prefix="/notifications", tags=["Notifications"])
+app.include_router(exports_router, prefix="/exports", tags=["Exports"])
+app.include_router(admin_router, prefix="/admin", tags=["Admin"])
+app.include_router(analytics_router, prefix="/analytics", tags=["Analytics"])
+
+
+# Periodic maintenance jobs
+register_job("notification-purge", NOTIFICATION_PURGE_INTERVAL_SECONDS, purge_notifications)
+register_job("upload-gc", UPLOAD_GC_INTERVAL_SECONDS, collect_orphaned_uploads)
+register_job("reconcile-trip-totals", RECONCILE_INTERVAL_SECONDS, reconcile_trip_totals)
+register_job("partition-maintenance", PARTITION_INTERVAL_SECONDS, ensure_partitions)
+register_job("stock-snapshots", STOCK_SNAPSHOT_INTERVAL_SECONDS, snapshot_stock_balances)
+
+
+@app.on_event("startup")
+async def start_jobs():
+    start_background_jobs()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_background_jobs()
+    await notification_broker.close()
+    shutdown_pool()
+    mark_worker_dead()
 
 
 @app.get("/")
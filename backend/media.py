@@ -0,0 +1,143 @@
+"""
+Serving uploaded files.
+
+Upload filenames are content hashes (or random ids), so a URL never changes
+content and browsers may cache it for a year. Range requests are honoured so
+PDF viewers can fetch pages on demand. With UPLOADS_ACCEL_REDIRECT set, the
+API only authorises the request and nginx streams the bytes via
+``X-Accel-Redirect``.
+"""
+import os
+import re
+from email.utils import formatdate
+from mimetypes import guess_type
+from typing import AsyncIterator, Optional, Tuple
+
+import aiofiles
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# Internal nginx location aliasing UPLOAD_DIR, e.g. /protected-uploads (empty = serve from Python)
+UPLOADS_ACCEL_REDIRECT = os.getenv("UPLOADS_ACCEL_REDIRECT", "").rstrip("/")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+SERVE_CHUNK_SIZE = 64 * 1024
+
+_CONTENT_ADDRESSED_NAME = re.compile(r"^([0-9a-f]{64})\.[a-z0-9]+$")
+_SINGLE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def strong_etag(path: str, stat_result: os.stat_result) -> str:
+    """ETag that changes whenever the bytes do.
+
+    Content-addressed files already carry their SHA-256 in the name.
+    """
+    match = _CONTENT_ADDRESSED_NAME.match(os.path.basename(path))
+    if match:
+        return f'"{match.group(1)}"'
+    return f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for GET)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into an inclusive (start, end).
+
+    Returns None when the header should be ignored (malformed or multiple
+    ranges) and raises ValueError when the range cannot be satisfied.
+    """
+    match = _SINGLE_RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = size - 1 if not last else min(int(last), size - 1)
+        if last and int(last) < start:
+            return None
+    else:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("empty suffix range")
+        start, end = max(size - suffix, 0), size - 1
+    if start >= size:
+        raise ValueError("range starts past the end of the file")
+    return start, end
+
+
+async def _read_range(path: str, start: int, length: int) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while length > 0:
+            chunk = await f.read(min(SERVE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+async def serve_file(
+    request: Request,
+    path: str,
+    accel_path: str,
+    immutable: bool = True,
+    media_type: Optional[str] = None
+) -> Response:
+    """Respond with the file at ``path``.
+
+    ``accel_path`` is the file's path relative to UPLOAD_DIR, used for the
+    nginx hand-off. Files whose URL can be overwritten (the company logo)
+    pass ``immutable=False`` so browsers revalidate them.
+    """
+    stat_result = os.stat(path)
+    etag = strong_etag(path, stat_result)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    media_type = media_type or guess_type(path)[0] or "application/octet-stream"
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if UPLOADS_ACCEL_REDIRECT:
+        # nginx serves the bytes (including Range requests) from its internal location
+        headers["X-Accel-Redirect"] = f"{UPLOADS_ACCEL_REDIRECT}/{accel_path}"
+        return Response(headers=headers, media_type=media_type)
+
+    size = stat_result.st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() in (etag, last_modified)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            if request.method == "HEAD":
+                return Response(status_code=206, headers=headers, media_type=media_type)
+            return StreamingResponse(
+                _read_range(path, start, end - start + 1),
+                status_code=206,
+                headers=headers,
+                media_type=media_type
+            )
+
+    headers["Content-Length"] = str(size)
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result)
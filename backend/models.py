@@ -2,10 +2,11 @@
 SQLAlchemy models matching the PostgreSQL schema
 """
 import uuid
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timezone
 from typing import Optional, List
+from zoneinfo import ZoneInfo
 from sqlalchemy import (
-    Column, String, Integer, Numeric, Boolean, Date, Time, DateTime,
+    Column, String, Integer, BigInteger, Numeric, Boolean, Date, Time, DateTime,
     ForeignKey, Text, Enum as SQLEnum, ARRAY, JSON
 )
 from sqlalchemy.dialects.postgresql import UUID
@@ -239,6 +240,20 @@ class ExpenseCategory(Base):
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
 
 
+# Timezone of a trip's day when only its start time is known
+TRIP_DATE_TIMEZONE = ZoneInfo("Asia/Kolkata")
+
+
+def default_trip_date(context):
+    """trip_date partitions the trips table, so trips created without one get their start day"""
+    start_date = context.get_current_parameters().get("start_date")
+    if start_date is None:
+        return None
+    if start_date.tzinfo is None:
+        start_date = start_date.replace(tzinfo=timezone.utc)
+    return start_date.astimezone(TRIP_DATE_TIMEZONE).date()
+
+
 class Trip(Base):
     __tablename__ = "trips"
 
@@ -250,7 +265,7 @@ class Trip(Base):
     schedule_id = Column(UUID(as_uuid=True), ForeignKey("bus_schedules.id"))
     start_date = Column(DateTime(timezone=True), nullable=False)
     end_date = Column(DateTime(timezone=True))
-    trip_date = Column(Date)
+    trip_date = Column(Date, nullable=False, default=default_trip_date)
     status = Column(SQLEnum(TripStatus), default=TripStatus.scheduled)
     trip_type = Column(String, default="one_way")
     notes = Column(Text)
@@ -417,6 +432,17 @@ class StockTransaction(Base):
     stock_item = relationship("StockItem", backref="transactions")
 
 
+class StockBalanceSnapshot(Base):
+    __tablename__ = "stock_balance_snapshots"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    stock_item_id = Column(UUID(as_uuid=True), ForeignKey("stock_items.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    snapshot_at = Column(DateTime(timezone=True), nullable=False)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("profiles.id"))
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
 class Invoice(Base):
     __tablename__ = "invoices"
 
@@ -498,3 +524,47 @@ class Notification(Base):
     read = Column(Boolean, default=False)
     link = Column(String)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class NotificationCounter(Base):
+    __tablename__ = "notification_counters"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# Maintained by database triggers (see init-db-python.sql)
+class FleetDailyRollup(Base):
+    __tablename__ = "fleet_daily_rollups"
+
+    id = Column(BigInteger, primary_key=True)
+    day = Column(Date, nullable=False)
+    bus_id = Column(UUID(as_uuid=True))
+    route_id = Column(UUID(as_uuid=True), nullable=False)
+    driver_id = Column(UUID(as_uuid=True))
+    trips = Column(Integer, nullable=False, default=0)
+    distance = Column(Numeric, nullable=False, default=0)
+    water_taken = Column(Integer, nullable=False, default=0)
+    revenue_cash = Column(Numeric, nullable=False, default=0)
+    revenue_online = Column(Numeric, nullable=False, default=0)
+    revenue_paytm = Column(Numeric, nullable=False, default=0)
+    revenue_others = Column(Numeric, nullable=False, default=0)
+    revenue_agent = Column(Numeric, nullable=False, default=0)
+    total_revenue = Column(Numeric, nullable=False, default=0)
+    total_expense = Column(Numeric, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class FleetDailyExpenseRollup(Base):
+    __tablename__ = "fleet_daily_expense_rollups"
+
+    id = Column(BigInteger, primary_key=True)
+    day = Column(Date, nullable=False)
+    bus_id = Column(UUID(as_uuid=True))
+    route_id = Column(UUID(as_uuid=True), nullable=False)
+    driver_id = Column(UUID(as_uuid=True))
+    category_id = Column(UUID(as_uuid=True), nullable=False)
+    expenses = Column(Integer, nullable=False, default=0)
+    amount = Column(Numeric, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow)
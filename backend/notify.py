@@ -0,0 +1,105 @@
+"""
+Notification helpers: bulk fan-out inserts and the retention purge.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Notification
+
+# Retention policy (overrideable via env)
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+NOTIFICATION_MAX_PER_USER = int(os.getenv("NOTIFICATION_MAX_PER_USER", "200"))
+NOTIFICATION_PURGE_BATCH_SIZE = int(os.getenv("NOTIFICATION_PURGE_BATCH_SIZE", "1000"))
+NOTIFICATION_PURGE_INTERVAL_SECONDS = int(os.getenv("NOTIFICATION_PURGE_INTERVAL_SECONDS", "3600"))
+
+
+def insert_notifications(db: Session, rows: List[dict]) -> int:
+    """Insert notification rows with a single multi-row INSERT.
+
+    Each row needs ``user_id``, ``title`` and ``message``; ``type`` and
+    ``link`` are optional. The caller owns the commit.
+    """
+    if not rows:
+        return 0
+    db.execute(insert(Notification).values([{
+        "id": uuid.uuid4(),
+        "user_id": row["user_id"],
+        "title": row["title"],
+        "message": row["message"],
+        "type": row.get("type") or "info",
+        "read": False,
+        "link": row.get("link"),
+        "created_at": datetime.utcnow(),
+    } for row in rows]))
+    return len(rows)
+
+
+def notify_many(
+    db: Session,
+    user_ids: Iterable[uuid.UUID],
+    title: str,
+    message: str,
+    type: str = "info",
+    link: Optional[str] = None,
+) -> int:
+    """Send the same notification to many users in one INSERT"""
+    return insert_notifications(db, [
+        {"user_id": user_id, "title": title, "message": message, "type": type, "link": link}
+        for user_id in dict.fromkeys(user_ids)
+    ])
+
+
+def _delete_in_batches(db: Session, id_query) -> int:
+    """Delete the rows selected by ``id_query`` batch by batch, committing each"""
+    deleted = 0
+    while True:
+        result = db.execute(
+            delete(Notification).where(
+                Notification.id.in_(id_query.limit(NOTIFICATION_PURGE_BATCH_SIZE).scalar_subquery())
+            ),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+        deleted += result.rowcount
+        if result.rowcount < NOTIFICATION_PURGE_BATCH_SIZE:
+            return deleted
+
+
+def purge_notifications(db: Optional[Session] = None) -> dict:
+    """Enforce the retention policy: drop notifications past the age limit,
+    then trim each user down to their newest NOTIFICATION_MAX_PER_USER.
+    """
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=NOTIFICATION_RETENTION_DAYS)
+        expired = _delete_in_batches(
+            db, select(Notification.id).where(Notification.created_at < cutoff)
+        )
+
+        over_cap_users = db.execute(
+            select(Notification.user_id)
+            .group_by(Notification.user_id)
+            .having(func.count() > NOTIFICATION_MAX_PER_USER)
+        ).scalars().all()
+
+        trimmed = 0
+        for user_id in over_cap_users:
+            trimmed += _delete_in_batches(
+                db,
+                select(Notification.id)
+                .where(Notification.user_id == user_id)
+                .order_by(Notification.created_at.desc())
+                .offset(NOTIFICATION_MAX_PER_USER)
+            )
+
+        return {"expired": expired, "trimmed": trimmed}
+    finally:
+        if own_session:
+            db.close()
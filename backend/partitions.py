@@ -0,0 +1,74 @@
+"""
+Monthly partitions of trips and expenses.
+
+Both tables are range partitioned by month on trip_date and expense_date
+(see init-db-python.sql). Rows for a month that has no partition yet go
+to the table's default partition, which date-bounded queries cannot skip,
+so this job creates each month's partitions PARTITION_MONTHS_AHEAD months
+in advance.
+"""
+import os
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+
+PARTITIONED_TABLES = ["trips", "expenses"]
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_INTERVAL_SECONDS = int(os.getenv("PARTITION_INTERVAL_SECONDS", "86400"))
+# Creating a partition briefly locks its parent table; rather than queue
+# (and hold up requests) behind a long report, give up and retry next run
+PARTITION_LOCK_TIMEOUT_MS = 5000
+
+
+def add_months(day: date, months: int) -> date:
+    """First day of the month ``months`` after ``day``'s"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ensure_partitions(db: Optional[Session] = None, months_ahead: int = PARTITION_MONTHS_AHEAD) -> dict:
+    """Create the missing partitions from this month through ``months_ahead`` months ahead"""
+    own_session = db is None
+    db = db or SessionLocal()
+    today = date.today()
+    through = add_months(today, months_ahead)
+    stats = {"through": through.isoformat(), "created": {}}
+    try:
+        for table in PARTITIONED_TABLES:
+            db.execute(text(f"SET LOCAL lock_timeout = {PARTITION_LOCK_TIMEOUT_MS}"))
+            stats["created"][table] = db.execute(
+                select(func.public.ensure_monthly_partitions(table, today, through))
+            ).scalar()
+            db.commit()
+        return stats
+    finally:
+        if own_session:
+            db.close()
+
+
+def list_partitions(db: Session) -> List[dict]:
+    """Partitions of the partitioned tables with their bounds, estimated rows and size"""
+    rows = db.execute(text("""
+        SELECT parent.relname AS parent, child.relname AS name,
+               pg_get_expr(child.relpartbound, child.oid) AS bounds,
+               child.reltuples::bigint AS estimated_rows,
+               pg_total_relation_size(child.oid) AS bytes
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        JOIN pg_namespace ns ON ns.oid = parent.relnamespace
+        WHERE ns.nspname = 'public' AND parent.relname = ANY(:tables)
+        ORDER BY parent.relname, child.relname
+    """), {"tables": PARTITIONED_TABLES}).all()
+    return [{
+        "table": row.parent,
+        "partition": row.name,
+        "bounds": row.bounds,
+        # -1 until the partition is first vacuumed or analyzed
+        "estimated_rows": max(row.estimated_rows, 0),
+        "bytes": row.bytes,
+    } for row in rows]
@@ -0,0 +1,184 @@
+"""
+Opt-in profiling of single requests.
+
+An admin adds ``X-Profile: html`` (or ``?_profile=html``) to a request to
+get pyinstrument's flame report back instead of the normal response, or
+``X-Profile: store`` (``?_profile=store``) to get the normal response with
+an ``X-Profile-Id`` header; stored reports are listed at
+``GET /admin/profiles`` and kept in PROFILE_DIR (shared by the workers).
+
+Requests without the flag only pay for a header and query string check;
+pyinstrument is not even imported until the first profile. To keep the
+flag from being used to slow the server down, each worker profiles one
+request at a time and at most one every PROFILE_MIN_INTERVAL_SECONDS;
+flagged requests that do not get a slot are served normally with
+``X-Profile: busy``, and a profiled request still running after
+PROFILE_MAX_SECONDS is cancelled with a 504 (its partial report is
+stored). Async routes are profiled in full; for the few sync routes the
+report shows the time spent waiting on the threadpool.
+"""
+import asyncio
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from auth import decode_token
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", Path(tempfile.gettempdir()) / "busmanager-profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_MIN_INTERVAL_SECONDS = float(os.getenv("PROFILE_MIN_INTERVAL_SECONDS", "5"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+# Profiled requests still running after this are cancelled (e.g. event streams)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+_MODES = ("html", "store")
+
+_slot = threading.Lock()
+_last_started = 0.0
+
+
+def requested_mode(scope: Scope) -> Optional[str]:
+    """The profiling mode a request asks for, if any"""
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value.decode("latin-1").strip().lower()
+    if b"_profile=" in scope["query_string"]:
+        values = parse_qs(scope["query_string"].decode("latin-1")).get("_profile")
+        return values[0].lower() if values else None
+    return None
+
+
+def _is_admin(scope: Scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            token_data = decode_token(token) if scheme.lower() == "bearer" and token else None
+            return token_data is not None and token_data.role == "admin"
+    return False
+
+
+def _acquire_slot() -> bool:
+    global _last_started
+    if not _slot.acquire(blocking=False):
+        return False
+    if time.monotonic() - _last_started < PROFILE_MIN_INTERVAL_SECONDS:
+        _slot.release()
+        return False
+    _last_started = time.monotonic()
+    return True
+
+
+def _store(html: str) -> str:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    profile_id = uuid.uuid4().hex
+    (PROFILE_DIR / f"{profile_id}.html").write_text(html, encoding="utf-8")
+    for old in list_profiles()[PROFILE_KEEP:]:
+        (PROFILE_DIR / f"{old['id']}.html").unlink(missing_ok=True)
+    return profile_id
+
+
+def list_profiles() -> List[dict]:
+    """Stored reports, newest first"""
+    if not PROFILE_DIR.is_dir():
+        return []
+    reports = []
+    for path in PROFILE_DIR.glob("*.html"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        reports.append({"id": path.stem, "created_at": stat.st_mtime, "bytes": stat.st_size})
+    return sorted(reports, key=lambda report: report["created_at"], reverse=True)
+
+
+def profile_path(profile_id: str) -> Optional[Path]:
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = PROFILE_DIR / f"{profile_id}.html"
+    return path if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    """Run pyinstrument around requests that ask for it (admins only)"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        mode = requested_mode(scope) if scope["type"] == "http" else None
+        if mode not in _MODES or not _is_admin(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not _acquire_slot():
+            async def send_busy(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message)["X-Profile"] = "busy"
+                await send(message)
+
+            await self.app(scope, receive, send_busy)
+            return
+
+        try:
+            await self._profile(mode, scope, receive, send)
+        finally:
+            _slot.release()
+
+    async def _profile(self, mode: str, scope: Scope, receive: Receive, send: Send) -> None:
+        from pyinstrument import Profiler
+
+        profiler = Profiler(interval=PROFILE_INTERVAL_MS / 1000, async_mode="enabled")
+        held: List[Message] = []
+
+        async def send_wrapper(message: Message) -> None:
+            # The store mode holds the response back until the report exists
+            # so it can carry X-Profile-Id; html mode discards it
+            held.append(message)
+
+        timed_out = False
+        profiler.start()
+        try:
+            await asyncio.wait_for(self.app(scope, receive, send_wrapper), PROFILE_MAX_SECONDS)
+        except asyncio.TimeoutError:
+            timed_out = True
+        finally:
+            profiler.stop()
+
+        # Rendering and writing the report take long enough to stall every
+        # other request on this worker, so they run in the threadpool
+        loop = asyncio.get_running_loop()
+        html = await loop.run_in_executor(None, profiler.output_html)
+        if timed_out:
+            profile_id = await loop.run_in_executor(None, _store, html)
+            await JSONResponse(
+                {"detail": f"Profiled request cancelled after {PROFILE_MAX_SECONDS:g}s", "profile_id": profile_id},
+                status_code=504,
+            )(scope, receive, send)
+            return
+        if mode == "html":
+            body = html.encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/html; charset=utf-8"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        profile_id = await loop.run_in_executor(None, _store, html)
+        for message in held:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            await send(message)
@@ -0,0 +1,169 @@
+"""
+Development aid for catching N+1 query patterns.
+
+With QUERY_DETECTOR=log (or raise) every request counts its SQL statements
+grouped by shape: literals and bind parameters are stripped, so
+``SELECT ... WHERE id = %(id_1)s`` run once per row shows up as one shape
+with a high count. A shape repeated more than QUERY_DETECTOR_THRESHOLD
+times in a request is logged, or (raise) answered with a 500 in place of
+the response and raised as NPlusOneError, which a test client surfaces as
+a failure. Responses carry an ``X-Query-Count`` header
+while the detector is on.
+
+Tests can cap the statements an endpoint may run::
+
+    with query_budget(5):
+        client.get("/drivers")
+"""
+import json
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from database import engines
+
+# "", "log" or "raise"
+QUERY_DETECTOR = os.getenv("QUERY_DETECTOR", "").lower()
+QUERY_DETECTOR_THRESHOLD = int(os.getenv("QUERY_DETECTOR_THRESHOLD", "5"))
+
+_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_PARAMETER = re.compile(r"%\(\w+\)s|\$\d+|\?")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class NPlusOneError(RuntimeError):
+    """Raised when a statement shape repeats more often than the threshold"""
+
+
+def normalize_sql(statement: str) -> str:
+    """Reduce a statement to its shape: comments go, literals, parameters and IN lists become ``?``"""
+    shape = _COMMENT.sub("", statement)
+    shape = _STRING.sub("?", shape)
+    shape = _PARAMETER.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryTracker:
+    """Statements seen during one request (or one ``query_budget`` block)"""
+
+    def __init__(self):
+        self.shapes: Counter = Counter()
+
+    @property
+    def count(self) -> int:
+        return sum(self.shapes.values())
+
+    def record(self, statement: str) -> None:
+        self.shapes[normalize_sql(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Shapes run more than ``threshold`` times, most frequent first"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > threshold]
+
+
+_current_tracker: ContextVar[Optional[QueryTracker]] = ContextVar("current_query_tracker", default=None)
+_budget_trackers: List[QueryTracker] = []
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.record(statement)
+    for budget in _budget_trackers:
+        budget.record(statement)
+
+
+for _engine in engines.values():
+    event.listen(_engine, "before_cursor_execute", _record_statement)
+
+
+def _report(method: str, path: str, tracker: QueryTracker) -> Optional[str]:
+    """Describe the shapes repeated past the threshold, or None if there are none"""
+    repeated = tracker.repeated(QUERY_DETECTOR_THRESHOLD)
+    if not repeated:
+        return None
+    details = "; ".join(f"{n}x {shape[:200]}" for shape, n in repeated)
+    return f"{method} {path} ran {tracker.count} queries, repeated: {details}"
+
+
+class QueryDetectorMiddleware:
+    """Count statements per request and flag repeated shapes (enable via QUERY_DETECTOR)"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tracker = QueryTracker()
+        token = _current_tracker.set(tracker)
+        failure: Optional[str] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal failure
+            if message["type"] == "http.response.start":
+                # In raise mode the verdict has to be in before the response
+                # goes out, so the offending request itself fails
+                failure = _report(scope["method"], scope["path"], tracker) if QUERY_DETECTOR == "raise" else None
+                if failure is not None:
+                    body = json.dumps({"detail": f"N+1 queries: {failure}"}).encode()
+                    await send({
+                        "type": "http.response.start",
+                        "status": 500,
+                        "headers": [
+                            (b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode()),
+                            (b"x-query-count", str(tracker.count).encode()),
+                        ],
+                    })
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                MutableHeaders(scope=message).append("X-Query-Count", str(tracker.count))
+            elif failure is not None:
+                # The original body is dropped
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_tracker.reset(token)
+        if failure is not None:
+            # Already answered with a 500; raising also fails a test client
+            raise NPlusOneError(failure)
+        message = _report(scope["method"], scope["path"], tracker)
+        if message is not None:
+            print(f"[n+1] {message}")
+
+
+@contextmanager
+def query_budget(max_queries: int) -> Iterator[QueryTracker]:
+    """Fail with AssertionError if the block runs more than ``max_queries`` statements.
+
+    Counts every statement on the engines (primary and replica), from any
+    thread, so it works with FastAPI's TestClient (which runs the app in
+    another thread).
+    """
+    tracker = QueryTracker()
+    _budget_trackers.append(tracker)
+    try:
+        yield tracker
+    finally:
+        _budget_trackers.remove(tracker)
+    if tracker.count > max_queries:
+        details = "\n".join(f"  {n}x {shape}" for shape, n in tracker.shapes.most_common())
+        raise AssertionError(f"{tracker.count} queries run, budget was {max_queries}:\n{details}")
@@ -0,0 +1,147 @@
+"""
+Request correlation IDs and the slow query log.
+
+Every HTTP request gets an ID, taken from a well-formed ``X-Request-ID``
+header or generated, and echoed back in the response. While the request
+runs, each SQL statement is sent with a trailing
+``/* request_id=... */`` comment, so the ID shows up in Postgres logs,
+pg_stat_activity and lock reports next to the statement itself.
+
+Statements slower than SLOW_QUERY_MS are logged with the request ID and
+route template. Bind parameter values are never logged and literals are
+stripped from the statement text. The most recent SLOW_QUERY_HISTORY slow
+statements are kept per worker, and ``top_slow_queries`` groups them by
+statement shape for the admin endpoint.
+"""
+import os
+import re
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Deque, List, Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from database import engines
+from metrics import route_template
+from query_detector import normalize_sql
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_HISTORY = int(os.getenv("SLOW_QUERY_HISTORY", "1000"))
+
+# Client-supplied IDs are only trusted if they cannot break out of a SQL comment
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestContext:
+    """The request a statement runs for; the scope gains its route once routing is done"""
+
+    __slots__ = ("request_id", "scope")
+
+    def __init__(self, request_id: str, scope: Scope):
+        self.request_id = request_id
+        self.scope = scope
+
+    @property
+    def route(self) -> str:
+        return f"{self.scope['method']} {route_template(self.scope)}"
+
+
+current_request: ContextVar[Optional[RequestContext]] = ContextVar("current_request", default=None)
+
+# (finished at, duration ms, shape, route, request id), newest last
+_slow_queries: Deque[tuple] = deque(maxlen=SLOW_QUERY_HISTORY)
+
+
+def _tag_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+    request = current_request.get()
+    if request is not None:
+        statement = f"{statement} /* request_id={request.request_id} */"
+    return statement, parameters
+
+
+def _log_slow_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+
+    request = current_request.get()
+    route = request.route if request else "background"
+    request_id = request.request_id if request else "-"
+    shape = normalize_sql(statement)
+    _slow_queries.append((datetime.now(timezone.utc), elapsed_ms, shape, route, request_id))
+    print(f"[slow-query] {elapsed_ms:.0f}ms request_id={request_id} route={route}: {shape[:1000]}")
+
+
+def _discard_failed_statement(context):
+    """A statement that raised never reaches after_cursor_execute; drop its start time"""
+    if context.connection is not None and context.cursor is not None:
+        starts = context.connection.info.get("slow_query_start")
+        if starts:
+            starts.pop()
+
+
+for _engine in engines.values():
+    event.listen(_engine, "before_cursor_execute", _tag_statement, retval=True)
+    event.listen(_engine, "after_cursor_execute", _log_slow_statement)
+    event.listen(_engine, "handle_error", _discard_failed_statement)
+
+
+def top_slow_queries(limit: int = 20, sort: str = "max_ms") -> List[dict]:
+    """Slow statements still in the history, grouped by shape, slowest first"""
+    groups = {}
+    for finished_at, elapsed_ms, shape, route, request_id in list(_slow_queries):
+        group = groups.setdefault(shape, {
+            "statement": shape, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "routes": set(),
+        })
+        group["count"] += 1
+        group["total_ms"] += elapsed_ms
+        group["routes"].add(route)
+        if elapsed_ms >= group["max_ms"]:
+            group["max_ms"] = elapsed_ms
+            group["slowest_request_id"] = request_id
+        group["last_seen"] = finished_at
+
+    result = sorted(groups.values(), key=lambda group: group[sort], reverse=True)[:limit]
+    for group in result:
+        group["mean_ms"] = round(group["total_ms"] / group["count"], 1)
+        group["total_ms"] = round(group["total_ms"], 1)
+        group["max_ms"] = round(group["max_ms"], 1)
+        group["routes"] = sorted(group["routes"])
+    return result
+
+
+class RequestIdMiddleware:
+    """Assign each request an ID, expose it as X-Request-ID and tag its SQL with it"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        supplied = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        request_id = supplied if _VALID_REQUEST_ID.match(supplied) else uuid.uuid4().hex
+        token = current_request.set(RequestContext(request_id, scope))
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+                if message["status"] >= 500:
+                    print(f"[request] {request_id} {scope['method']} {scope['path']} -> {message['status']}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            print(f"[request] {request_id} {scope['method']} {scope['path']} failed: {e!r}")
+            raise
+        finally:
+            current_request.reset(token)
@@ -0,0 +1,147 @@
+"""
+Realtime notification fan-out using Postgres LISTEN/NOTIFY.
+
+Each worker process keeps one dedicated LISTEN connection (outside the
+SQLAlchemy pool) and pushes every NOTIFY payload to the in-memory queues of
+the clients subscribed for that user. Subscribed clients that are idle cost
+no database queries at all.
+"""
+import asyncio
+import json
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy.engine import make_url
+
+from database import DIRECT_DATABASE_URL
+
+NOTIFICATION_CHANNEL = "notifications"
+SUBSCRIBER_QUEUE_SIZE = 100
+RECONNECT_DELAY_SECONDS = 5
+
+
+def _listener_dsn() -> str:
+    """libpq DSN for a direct (non-pooler) connection (drops any +driver suffix)"""
+    return make_url(DIRECT_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class NotificationBroker:
+    """Single LISTEN connection per worker fanning out to subscriber queues"""
+
+    def __init__(self, channel: str = NOTIFICATION_CHANNEL):
+        self.channel = channel
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._conn = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = asyncio.Lock()
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    async def subscribe(self, user_id: str) -> asyncio.Queue:
+        """Register a client queue for a user; starts listening on first use"""
+        await self._ensure_listening()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def _ensure_listening(self) -> None:
+        if self._conn is not None:
+            return
+        async with self._lock:
+            if self._conn is None:
+                await self._connect()
+
+    async def _connect(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        conn = await self._loop.run_in_executor(None, self._open_connection)
+        self._conn = conn
+        self._loop.add_reader(conn.fileno(), self._on_readable)
+
+    def _open_connection(self):
+        # TCP keepalives let libpq notice a dead server so we can reconnect
+        conn = psycopg2.connect(
+            _listener_dsn(),
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=3,
+        )
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+        return conn
+
+    def _on_readable(self) -> None:
+        try:
+            self._conn.poll()
+        except (psycopg2.Error, OSError) as e:
+            print(f"[notifications] LISTEN connection lost: {e}")
+            self._drop_connection()
+            self._reconnect_task = self._loop.create_task(self._reconnect())
+            return
+
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload)
+            except ValueError:
+                continue
+            self._publish(str(payload.get("user_id")), {"event": "notification", "data": payload})
+
+    def _publish(self, user_id: str, event: dict) -> None:
+        for queue in list(self._subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client; it will resync from GET /notifications
+                pass
+
+    def _broadcast(self, event: dict) -> None:
+        for user_id in list(self._subscribers):
+            self._publish(user_id, event)
+
+    def _drop_connection(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._loop.remove_reader(self._conn.fileno())
+        except (ValueError, OSError):
+            pass
+        try:
+            self._conn.close()
+        except psycopg2.Error:
+            pass
+        self._conn = None
+
+    async def _reconnect(self) -> None:
+        while self._conn is None:
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            try:
+                async with self._lock:
+                    if self._conn is None:
+                        await self._connect()
+            except (psycopg2.Error, OSError) as e:
+                print(f"[notifications] LISTEN reconnect failed: {e}")
+        # Anything sent while disconnected was missed; tell clients to refetch
+        self._broadcast({"event": "resync", "data": {}})
+
+    async def close(self) -> None:
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        self._drop_connection()
+
+
+notification_broker = NotificationBroker()
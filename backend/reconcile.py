@@ -0,0 +1,96 @@
+"""
+Reconciliation of denormalized trip totals.
+
+``trips.total_expense`` is maintained by statement-level triggers on
+expenses (see init-db-python.sql). Totals written before those triggers
+existed, or changed by hand, can still drift; this job walks the trips in
+primary-key batches, compares each stored total against the sum of its
+approved expenses and rewrites the ones that differ.
+"""
+import os
+from typing import List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Expense, ExpenseStatus, Trip
+
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "500"))
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("RECONCILE_INTERVAL_SECONDS", "86400"))
+# Mismatches listed individually in the report; the counts cover all of them
+RECONCILE_REPORT_LIMIT = 100
+
+
+def approved_total(trip_id_column):
+    """Correlated sum of a trip's approved expenses"""
+    return (
+        select(func.coalesce(func.sum(Expense.amount), 0))
+        .where(Expense.trip_id == trip_id_column, Expense.status == ExpenseStatus.approved)
+        .scalar_subquery()
+    )
+
+
+def _find_mismatches(db: Session, trip_ids: List) -> List:
+    actual = approved_total(Trip.id)
+    return db.execute(
+        select(Trip.id, Trip.trip_number, Trip.total_expense, actual.label("actual"))
+        .where(Trip.id.in_(trip_ids), func.coalesce(Trip.total_expense, 0) != actual)
+    ).all()
+
+
+def _repair(db: Session, trip_ids: List) -> int:
+    """Recompute the totals of ``trip_ids``; returns the number of rows rewritten.
+
+    The rows are locked in a statement of their own first, so the sums are
+    read after any concurrent expense change has committed its trigger delta.
+    """
+    db.execute(select(Trip.id).where(Trip.id.in_(trip_ids)).with_for_update())
+    actual = approved_total(Trip.id)
+    result = db.execute(
+        update(Trip)
+        .where(Trip.id.in_(trip_ids), func.coalesce(Trip.total_expense, 0) != actual)
+        .values(total_expense=actual),
+        execution_options={"synchronize_session": False}
+    )
+    db.commit()
+    return result.rowcount
+
+
+def reconcile_trip_totals(db: Optional[Session] = None, dry_run: bool = False) -> dict:
+    """Find trips whose total_expense disagrees with their approved expenses and fix them"""
+    own_session = db is None
+    db = db or SessionLocal()
+    stats = {"scanned": 0, "mismatched": 0, "fixed": 0, "dry_run": dry_run, "mismatches": []}
+    try:
+        last_id = None
+        while True:
+            query = select(Trip.id).order_by(Trip.id).limit(RECONCILE_BATCH_SIZE)
+            if last_id is not None:
+                query = query.where(Trip.id > last_id)
+            trip_ids = db.execute(query).scalars().all()
+            if not trip_ids:
+                break
+            last_id = trip_ids[-1]
+            stats["scanned"] += len(trip_ids)
+
+            mismatches = _find_mismatches(db, trip_ids)
+            # Release the snapshot between batches
+            db.rollback()
+            if not mismatches:
+                continue
+
+            stats["mismatched"] += len(mismatches)
+            for row in mismatches[:RECONCILE_REPORT_LIMIT - len(stats["mismatches"])]:
+                stats["mismatches"].append({
+                    "trip_id": str(row.id),
+                    "trip_number": row.trip_number,
+                    "stored": float(row.total_expense or 0),
+                    "actual": float(row.actual),
+                })
+            if not dry_run:
+                stats["fixed"] += _repair(db, [row.id for row in mismatches])
+        return stats
+    finally:
+        if own_session:
+            db.close()
@@ -0,0 +1,82 @@
+"""
+Daily fleet rollups.
+
+``fleet_daily_rollups`` holds trip counts, distance, water and revenue per
+channel per (day, bus, route, driver), and ``fleet_daily_expense_rollups``
+the approved expenses of the same keys per category. Statement-level
+triggers on trips and expenses keep both up to date (see
+init-db-python.sql), so analytics over any period read a few rows per day
+instead of every trip.
+
+A rebuild recomputes a range of days from the source tables. It is only
+needed after the triggers were bypassed (a restore, bulk load or manual
+fix). It runs one month per transaction: trip and expense writes to the
+month being recomputed wait for that batch only, and other months are not
+held up at all.
+
+    docker exec busmanager-api python rollups.py --from 2024-04-01 --to 2024-04-30
+"""
+import argparse
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import FleetDailyExpenseRollup, FleetDailyRollup, Trip
+from partitions import add_months
+
+
+def rebuild_rollups(
+    db: Optional[Session] = None,
+    from_day: Optional[date] = None,
+    to_day: Optional[date] = None,
+) -> dict:
+    """Recompute the rollups of [from_day, to_day] (open ends cover all days), one month per transaction"""
+    own_session = db is None
+    # A month of a large fleet can still outlast any request timeout
+    db = db or SessionLocal(info={"statement_timeout_ms": 0})
+    started = time.perf_counter()
+    try:
+        if from_day is None:
+            from_day = db.execute(select(func.least(
+                select(func.min(Trip.trip_date)).scalar_subquery(),
+                select(func.min(FleetDailyRollup.day)).scalar_subquery(),
+                select(func.min(FleetDailyExpenseRollup.day)).scalar_subquery(),
+            ))).scalar()
+        if to_day is None:
+            to_day = db.execute(select(func.greatest(
+                select(func.max(Trip.trip_date)).scalar_subquery(),
+                select(func.max(FleetDailyRollup.day)).scalar_subquery(),
+                select(func.max(FleetDailyExpenseRollup.day)).scalar_subquery(),
+            ))).scalar()
+        rows = 0
+        batch_from = from_day
+        while from_day is not None and to_day is not None and batch_from <= to_day:
+            batch_to = min(add_months(batch_from, 1) - timedelta(days=1), to_day)
+            rows += db.execute(select(func.public.rebuild_fleet_rollups(batch_from, batch_to))).scalar()
+            db.commit()
+            batch_from = batch_to + timedelta(days=1)
+        return {
+            "from_date": from_day.isoformat() if from_day else None,
+            "to_date": to_day.isoformat() if to_day else None,
+            "rollup_rows": rows,
+            "seconds": round(time.perf_counter() - started, 1),
+        }
+    finally:
+        if own_session:
+            db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the daily fleet rollups from trips and expenses")
+    parser.add_argument("--from", dest="from_day", type=date.fromisoformat, help="first day (default: all)")
+    parser.add_argument("--to", dest="to_day", type=date.fromisoformat, help="last day (default: all)")
+    args = parser.parse_args()
+    print(f"[rollups] {rebuild_rollups(from_day=args.from_day, to_day=args.to_day)}")
+
+
+if __name__ == "__main__":
+    main()
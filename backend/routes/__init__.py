@@ -12,10 +12,13 @@ from .schedules import router as schedules_router
 from .stock import router as stock_router
 from .invoices import router as invoices_router
 from .repairs import router as repairs_router
-from .uploads import router as uploads_router
+from .uploads import router as uploads_router, media_router as uploads_media_router
 from .settings import router as settings_router
 from .states import router as states_router
 from .notifications import router as notifications_router
+from .exports import router as exports_router
+from .admin import router as admin_router
+from .analytics import router as analytics_router
 
 __all__ = [
     "auth_router",
@@ -30,7 +33,11 @@ __all__ = [
     "invoices_router",
     "repairs_router",
     "uploads_router",
+    "uploads_media_router",
     "settings_router",
     "states_router",
     "notifications_router",
+    "exports_router",
+    "admin_router",
+    "analytics_router",
 ]
@@ -0,0 +1,137 @@
+"""
+Admin maintenance routes
+"""
+import asyncio
+import os
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from auth import require_admin, TokenData
+from background import run_job_once
+from database import (
+    DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_TIMEOUT, DB_REPORT_STATEMENT_TIMEOUT_MS,
+    DB_STATEMENT_TIMEOUT_MS, PGBOUNCER_TRANSACTION_MODE, REPLICA_STICKY_SECONDS, engine, get_db, replica_engine
+)
+from partitions import list_partitions
+from profiling import list_profiles, profile_path
+from query_log import SLOW_QUERY_HISTORY, SLOW_QUERY_MS, top_slow_queries
+from reconcile import reconcile_trip_totals
+from rollups import rebuild_rollups
+
+router = APIRouter()
+
+
+@router.post("/reconcile")
+async def run_reconcile(
+    dry_run: bool = False,
+    current_user: TokenData = Depends(require_admin)
+):
+    """Recompute drifted trip expense totals and report the mismatches (admin only)"""
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, run_job_once, "reconcile-trip-totals", lambda: reconcile_trip_totals(dry_run=dry_run)
+    )
+    if result is None:
+        raise HTTPException(status_code=409, detail="Reconciliation already running")
+    
+    return result
+
+
+@router.post("/rollups/rebuild")
+async def run_rollup_rebuild(
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    current_user: TokenData = Depends(require_admin)
+):
+    """Recompute the daily fleet rollups of a date range, all days if open (admin only)"""
+    if from_date and to_date and from_date > to_date:
+        raise HTTPException(status_code=400, detail="from_date must not be after to_date")
+    
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, run_job_once, "rebuild-fleet-rollups", lambda: rebuild_rollups(from_day=from_date, to_day=to_date)
+    )
+    if result is None:
+        raise HTTPException(status_code=409, detail="Rollup rebuild already running")
+    
+    return result
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=200),
+    sort: Literal["max_ms", "total_ms", "count"] = "max_ms",
+    current_user: TokenData = Depends(require_admin)
+):
+    """Slowest recent SQL statement shapes seen by the worker answering (admin only)"""
+    return {
+        "pid": os.getpid(),
+        "threshold_ms": SLOW_QUERY_MS,
+        "history_size": SLOW_QUERY_HISTORY,
+        "statements": top_slow_queries(limit, sort),
+    }
+
+
+@router.get("/profiles")
+def get_profiles(current_user: TokenData = Depends(require_admin)):
+    """Stored request profiles, newest first (admin only)"""
+    return list_profiles()
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, current_user: TokenData = Depends(require_admin)):
+    """One stored request profile as pyinstrument's HTML report (admin only)"""
+    path = profile_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    return FileResponse(path, media_type="text/html")
+
+
+@router.get("/partitions")
+async def get_partitions(
+    current_user: TokenData = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Monthly partitions of trips and expenses with bounds, row estimates and sizes (admin only)"""
+    return list_partitions(db)
+
+
+def _pool_stats(pool_engine) -> dict:
+    pool = pool_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "timeout_seconds": DB_POOL_TIMEOUT,
+        "recycle_seconds": DB_POOL_RECYCLE,
+    }
+
+
+@router.get("/db-pool")
+async def get_db_pool(
+    current_user: TokenData = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Connection pool usage of the worker answering, and server connections by state (admin only)"""
+    server = db.execute(
+        select(text("state"), func.count())
+        .select_from(text("pg_stat_activity"))
+        .where(text("datname = current_database()"))
+        .group_by(text("state"))
+    ).all()
+    return {
+        "pid": os.getpid(),
+        "pool": _pool_stats(engine),
+        "replica_pool": _pool_stats(replica_engine) if replica_engine is not None else None,
+        "replica_sticky_seconds": REPLICA_STICKY_SECONDS,
+        "statement_timeout_ms": DB_STATEMENT_TIMEOUT_MS,
+        "report_statement_timeout_ms": DB_REPORT_STATEMENT_TIMEOUT_MS,
+        "pgbouncer_transaction_mode": PGBOUNCER_TRANSACTION_MODE,
+        "server_connections": {state or "unknown": count for state, count in server},
+    }
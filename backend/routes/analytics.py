@@ -0,0 +1,145 @@
+"""
+Fleet analytics routes, served from the daily rollups
+"""
+import uuid
+from datetime import date, timedelta
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import Date, cast, func, select
+from sqlalchemy.orm import Session
+
+from database import get_report_db
+from models import Bus, ExpenseCategory, FleetDailyExpenseRollup, FleetDailyRollup, Profile, Route
+from auth import require_admin, TokenData
+
+router = APIRouter()
+
+REVENUE_CHANNELS = ["cash", "online", "paytm", "others", "agent"]
+# Window used when the client gives no from_date
+DEFAULT_PERIOD_DAYS = 30
+
+
+def group_key(rollup, group_by: str):
+    """Column a rollup table is grouped by"""
+    if group_by == "day":
+        return rollup.day
+    if group_by == "month":
+        return cast(func.date_trunc("month", rollup.day), Date)
+    return getattr(rollup, f"{group_by}_id")
+
+
+def group_labels(db: Session, group_by: str, keys: list) -> dict:
+    """Display names of the buses, routes or drivers among ``keys``"""
+    column = {
+        "bus": (Bus.id, Bus.registration_number),
+        "route": (Route.id, Route.route_name),
+        "driver": (Profile.id, Profile.full_name),
+    }.get(group_by)
+    ids = [key for key in keys if key is not None]
+    if column is None or not ids:
+        return {}
+    return dict(db.execute(select(*column).where(column[0].in_(ids))).all())
+
+
+@router.get("/fleet")
+async def get_fleet_summary(
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    group_by: Literal["day", "month", "bus", "route", "driver"] = "day",
+    bus_id: Optional[str] = None,
+    route_id: Optional[str] = None,
+    driver_id: Optional[str] = None,
+    current_user: TokenData = Depends(require_admin),
+    db: Session = Depends(get_report_db)
+):
+    """Trips, distance, water, revenue by channel and expenses by category over a period (admin only)"""
+    to_date = to_date or date.today()
+    from_date = from_date or to_date - timedelta(days=DEFAULT_PERIOD_DAYS - 1)
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="from_date must not be after to_date")
+    
+    def filters(rollup):
+        conditions = [rollup.day >= from_date, rollup.day <= to_date]
+        if bus_id:
+            conditions.append(rollup.bus_id == uuid.UUID(bus_id))
+        if route_id:
+            conditions.append(rollup.route_id == uuid.UUID(route_id))
+        if driver_id:
+            conditions.append(rollup.driver_id == uuid.UUID(driver_id))
+        return conditions
+    
+    key = group_key(FleetDailyRollup, group_by).label("key")
+    totals = db.execute(
+        select(
+            key,
+            func.sum(FleetDailyRollup.trips).label("trips"),
+            func.sum(FleetDailyRollup.distance).label("distance"),
+            func.sum(FleetDailyRollup.water_taken).label("water_taken"),
+            *[func.sum(getattr(FleetDailyRollup, f"revenue_{channel}")).label(channel) for channel in REVENUE_CHANNELS],
+            func.sum(FleetDailyRollup.total_revenue).label("total_revenue"),
+            func.sum(FleetDailyRollup.total_expense).label("total_expense")
+        )
+        .where(*filters(FleetDailyRollup))
+        .group_by(key)
+        .having(func.sum(FleetDailyRollup.trips) > 0)
+        .order_by(key)
+    ).all()
+    
+    expense_key = group_key(FleetDailyExpenseRollup, group_by).label("key")
+    categories = db.execute(
+        select(
+            expense_key,
+            FleetDailyExpenseRollup.category_id,
+            ExpenseCategory.name.label("category_name"),
+            func.sum(FleetDailyExpenseRollup.amount).label("amount"),
+            func.sum(FleetDailyExpenseRollup.expenses).label("expense_count")
+        )
+        .join(ExpenseCategory, FleetDailyExpenseRollup.category_id == ExpenseCategory.id)
+        .where(*filters(FleetDailyExpenseRollup))
+        .group_by(expense_key, FleetDailyExpenseRollup.category_id, ExpenseCategory.name)
+        .having(func.sum(FleetDailyExpenseRollup.expenses) > 0)
+        .order_by(func.sum(FleetDailyExpenseRollup.amount).desc())
+    ).all()
+    
+    by_key = {}
+    for row in categories:
+        by_key.setdefault(row.key, []).append({
+            "category_id": str(row.category_id),
+            "category_name": row.category_name,
+            "amount": float(row.amount),
+            "expense_count": row.expense_count
+        })
+    
+    labels = group_labels(db, group_by, [row.key for row in totals])
+    groups = []
+    for row in totals:
+        revenue = {channel: float(getattr(row, channel)) for channel in REVENUE_CHANNELS}
+        revenue["total"] = float(row.total_revenue)
+        groups.append({
+            "key": row.key.isoformat() if isinstance(row.key, date) else (str(row.key) if row.key else None),
+            "label": labels.get(row.key),
+            "trips": row.trips,
+            "distance_km": float(row.distance),
+            "water_taken": row.water_taken,
+            "revenue": revenue,
+            "total_expense": float(row.total_expense),
+            "net_income": float(row.total_revenue - row.total_expense),
+            "expenses_by_category": by_key.get(row.key, [])
+        })
+    
+    return {
+        "from_date": str(from_date),
+        "to_date": str(to_date),
+        "group_by": group_by,
+        "totals": {
+            "trips": sum(group["trips"] for group in groups),
+            "distance_km": sum(group["distance_km"] for group in groups),
+            "water_taken": sum(group["water_taken"] for group in groups),
+            "revenue": {
+                name: sum(group["revenue"][name] for group in groups) for name in REVENUE_CHANNELS + ["total"]
+            },
+            "total_expense": sum(group["total_expense"] for group in groups),
+            "net_income": sum(group["net_income"] for group in groups)
+        },
+        "groups": groups
+    }
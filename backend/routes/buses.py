@@ -8,7 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Bus, BusStatus, OwnershipType, IndianState
 from auth import get_current_user, require_admin, TokenData
 
@@ -85,7 +85,7 @@ def bus_to_dict(bus: Bus) -> dict:
 async def list_buses(
     status: Optional[str] = None,
     current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List all buses (admin only for full data, drivers get limited view)"""
     query = db.query(Bus).options(joinedload(Bus.home_state))
@@ -8,7 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Profile, UserRole, User, AppRole, Trip
 from auth import get_current_user, require_admin, TokenData, get_password_hash
 
@@ -58,7 +58,7 @@ def profile_to_dict(profile: Profile, user: User = None, role: UserRole = None)
 @router.get("")
 async def list_drivers(
     current_user: TokenData = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List all profiles (admin only) - for driver management page"""
     # Get all profiles (not just drivers) for the management page
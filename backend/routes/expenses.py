@@ -2,18 +2,21 @@
 Expense management routes
 """
 import uuid
-from typing import Optional
+from typing import List, Optional
 from datetime import date, datetime
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Expense, ExpenseStatus, ExpenseCategory, Trip, Profile
 from auth import get_current_user, require_admin, TokenData
 
 router = APIRouter()
 
+MAX_BATCH_SIZE = 1000
+
 
 class ExpenseCreate(BaseModel):
     trip_id: str
@@ -35,6 +38,12 @@ class ExpenseUpdate(BaseModel):
     admin_remarks: Optional[str] = None
 
 
+class ExpenseBatchReview(BaseModel):
+    expense_ids: List[str]
+    status: str
+    admin_remarks: Optional[str] = None
+
+
 def expense_to_dict(expense: Expense) -> dict:
     return {
         "id": str(expense.id),
@@ -71,13 +80,14 @@ def expense_to_dict(expense: Expense) -> dict:
 @router.get("")
 async def list_expenses(
     trip_id: Optional[str] = None,
+    route_id: Optional[str] = None,
     status: Optional[str] = None,
     from_date: Optional[date] = None,
     to_date: Optional[date] = None,
     limit: int = Query(100, le=1000),
     offset: int = 0,
     current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List expenses with optional filters"""
     query = db.query(Expense).options(
@@ -93,6 +103,8 @@ async def list_expenses(
     # Apply filters
     if trip_id:
         query = query.filter(Expense.trip_id == uuid.UUID(trip_id))
+    if route_id:
+        query = query.filter(Expense.trip.has(Trip.route_id == uuid.UUID(route_id)))
     if status:
         query = query.filter(Expense.status == ExpenseStatus(status))
     if from_date:
@@ -100,7 +112,8 @@ async def list_expenses(
     if to_date:
         query = query.filter(Expense.expense_date <= to_date)
     
-    expenses = query.order_by(Expense.created_at.desc()).offset(offset).limit(limit).all()
+    # Leading with the partition key lets newest-first pages read only the latest months
+    expenses = query.order_by(Expense.expense_date.desc(), Expense.created_at.desc()).offset(offset).limit(limit).all()
     
     return [expense_to_dict(e) for e in expenses]
 
@@ -110,7 +123,7 @@ async def get_my_expenses(
     status: Optional[str] = None,
     limit: int = Query(100, le=1000),
     current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get current user's expenses (for drivers)"""
     query = db.query(Expense).options(
@@ -122,7 +135,7 @@ async def get_my_expenses(
     if status:
         query = query.filter(Expense.status == ExpenseStatus(status))
     
-    expenses = query.order_by(Expense.created_at.desc()).limit(limit).all()
+    expenses = query.order_by(Expense.expense_date.desc(), Expense.created_at.desc()).limit(limit).all()
     
     return [expense_to_dict(e) for e in expenses]
 
@@ -200,6 +213,68 @@ async def create_expense(
     return expense_to_dict(expense)
 
 
+@router.post("/approve-batch")
+async def review_expenses_batch(
+    review: ExpenseBatchReview,
+    current_user: TokenData = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Approve or deny many expenses with shared remarks (admin only)"""
+    new_status = ExpenseStatus(review.status)
+    if new_status not in (ExpenseStatus.approved, ExpenseStatus.denied):
+        raise HTTPException(status_code=400, detail="Status must be approved or denied")
+    if new_status == ExpenseStatus.denied and not (review.admin_remarks or "").strip():
+        raise HTTPException(status_code=400, detail="Remarks are required when denying expenses")
+    if len(review.expense_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} expenses per batch")
+    
+    expense_ids = list(dict.fromkeys(uuid.UUID(expense_id) for expense_id in review.expense_ids))
+    if not expense_ids:
+        return {"updated": [], "unchanged": [], "not_found": []}
+    
+    # One UPDATE for the whole batch; the expense triggers fold the approved
+    # amounts into a single grouped update of the affected trips
+    values = {
+        "status": new_status,
+        "approved_by": uuid.UUID(current_user.profile_id),
+        "approved_at": datetime.utcnow(),
+    }
+    if review.admin_remarks is not None:
+        values["admin_remarks"] = review.admin_remarks
+    updated = db.execute(
+        update(Expense)
+        .where(Expense.id.in_(expense_ids), Expense.status != new_status)
+        .values(**values)
+        .returning(
+            Expense.id, Expense.trip_id, Expense.amount, Expense.status,
+            Expense.admin_remarks, Expense.approved_by, Expense.approved_at, Expense.updated_at
+        ),
+        execution_options={"synchronize_session": False}
+    ).all()
+    db.commit()
+    
+    updated_ids = {row.id for row in updated}
+    remaining = [expense_id for expense_id in expense_ids if expense_id not in updated_ids]
+    unchanged = set()
+    if remaining:
+        unchanged = set(db.execute(select(Expense.id).where(Expense.id.in_(remaining))).scalars())
+    
+    return {
+        "updated": [{
+            "id": str(row.id),
+            "trip_id": str(row.trip_id),
+            "amount": float(row.amount),
+            "status": row.status.value,
+            "admin_remarks": row.admin_remarks,
+            "approved_by": str(row.approved_by),
+            "approved_at": row.approved_at.isoformat(),
+            "updated_at": row.updated_at.isoformat() if row.updated_at else None
+        } for row in updated],
+        "unchanged": [str(expense_id) for expense_id in remaining if expense_id in unchanged],
+        "not_found": [str(expense_id) for expense_id in remaining if expense_id not in unchanged]
+    }
+
+
 @router.put("/{expense_id}")
 async def update_expense(
     expense_id: str,
@@ -232,6 +307,10 @@ async def update_expense(
                 expense.approved_by = uuid.UUID(current_user.profile_id)
                 expense.approved_at = datetime.utcnow()
     
+    # expense_date partitions the expenses table and cannot be cleared
+    if "expense_date" in update_data and update_data["expense_date"] is None:
+        raise HTTPException(status_code=400, detail="expense_date cannot be empty")
+    
     for key, value in update_data.items():
         if key == "status" and value:
             setattr(expense, key, ExpenseStatus(value))
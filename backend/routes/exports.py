@@ -0,0 +1,363 @@
+"""
+Trip sheet export routes (CSV / XLSX, streamed)
+"""
+import uuid
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, func, or_, select, true
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+
+from database import ReportSessionLocal, get_report_db
+from models import Bus, Expense, ExpenseCategory, ExpenseStatus, Profile, Route, Trip, TripStatus
+from auth import DOWNLOAD_LINK_EXPIRE_SECONDS, create_download_link, get_download_user, require_admin, TokenData
+from spreadsheet import CSV_MEDIA_TYPE, XLSX_MEDIA_TYPE, Sheet, stream_csv, stream_xlsx
+
+router = APIRouter()
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 500
+# Endpoints POST /exports/links may sign
+LINKABLE_EXPORTS = ("export_trip_sheet", "export_period")
+
+TITLE_ROW = ["BUS TRIP SHEET"]
+GROUP_ROW = ["", "Hours", "", "Journey", "", "Odometer Reading", "", "", "", "", "",
+             "Revenue from operation", "", "", "", "", "", "Expenses in operation"]
+COLUMNS = ["Date", "Out", "Returned", "From", "To", "Start", "Finished", "Dist KM", "Reason for trip",
+           "Driver", "Direction", "Cash", "Online", "Paytm", "Others", "Agent", "G.Total", "Diesel",
+           "Driver", "Route Exp.", "Maintenance", "Govt. duty", "Others", "Total Exp.", "N.Income"]
+COLUMN_WIDTHS = [12, 10, 10, 15, 15, 8, 8, 8, 15, 12, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 12, 10, 10, 10, 10]
+HEADER_MERGES = ["A1:Y1", "B3:C3", "D3:E3", "F3:G3", "L3:Q3", "R3:X3"]
+# Columns summed into the TOTAL row: Dist KM, revenue and expense columns
+TOTAL_COLUMNS = [7] + list(range(11, 25))
+# Trip sheet template has at least this many rows above the totals
+MIN_TRIP_SHEET_ROWS = 14
+
+EXPENSE_BUCKETS = ["diesel", "driver", "route", "maintenance", "govt_duty", "others"]
+
+
+def expense_bucket(category_name):
+    """Map an expense category name to its trip sheet column"""
+    name = func.lower(category_name)
+    return case(
+        (or_(name.contains("diesel"), name.contains("fuel")), "diesel"),
+        (or_(name.contains("driver"), name.contains("salary")), "driver"),
+        (or_(name.contains("route"), name.contains("toll")), "route"),
+        (or_(name.contains("maintenance"), name.contains("repair")), "maintenance"),
+        (or_(name.contains("govt"), name.contains("tax"), name.contains("duty")), "govt_duty"),
+        else_="others"
+    )
+
+
+def trip_sheet_query(tz: str):
+    """Trips with bus, route, driver and approved expenses per sheet column"""
+    categorised = (
+        select(expense_bucket(ExpenseCategory.name).label("bucket"), Expense.amount)
+        .join(ExpenseCategory, Expense.category_id == ExpenseCategory.id)
+        .where(Expense.trip_id == Trip.id, Expense.status == ExpenseStatus.approved)
+        .correlate(Trip)
+        .subquery("categorised")
+    )
+    expenses = select(*[
+        func.coalesce(func.sum(categorised.c.amount).filter(categorised.c.bucket == name), 0).label(name)
+        for name in EXPENSE_BUCKETS
+    ]).lateral("trip_expenses")
+
+    return (
+        select(
+            Trip,
+            func.timezone(tz, Trip.start_date).label("local_start"),
+            func.timezone(tz, Trip.end_date).label("local_end"),
+            Bus.registration_number,
+            Route.route_name,
+            Route.from_address,
+            Route.to_address,
+            Route.distance_km,
+            Profile.full_name.label("driver_name"),
+            *[expenses.c[name] for name in EXPENSE_BUCKETS]
+        )
+        .select_from(Trip)
+        .outerjoin(Bus, Trip.bus_id == Bus.id)
+        .outerjoin(Route, Trip.route_id == Route.id)
+        .outerjoin(Profile, Trip.driver_id == Profile.id)
+        .outerjoin(expenses, true())
+    )
+
+
+def local_bounds(tz: str, from_date: Optional[date], to_date: Optional[date]) -> list:
+    """Filters on Trip.start_date for whole local days (keeps the index usable)"""
+    filters = []
+    if from_date:
+        filters.append(Trip.start_date >= func.timezone(tz, datetime.combine(from_date, time.min)))
+    if to_date:
+        filters.append(Trip.start_date < func.timezone(tz, datetime.combine(to_date + timedelta(days=1), time.min)))
+    return filters
+
+
+def _number(value) -> float:
+    return float(value) if value else 0.0
+
+
+def _format_date(value: Optional[datetime]) -> str:
+    return f"{value.day}/{value.month}/{value:%y}" if value else ""
+
+
+def _format_time(value: Optional[datetime]) -> str:
+    return value.strftime("%I:%M %p").lower() if value else ""
+
+
+def sheet_rows(row, route_distance_fallback: bool = True) -> List[list]:
+    """One sheet row per journey: outward, plus return for two-way trips"""
+    trip = row.Trip
+    expense = {name: _number(row._mapping[name]) for name in EXPENSE_BUCKETS}
+    total_expense = sum(expense.values())
+    two_way = trip.trip_type == "two_way"
+    share = 0.5 if two_way else 1.0
+
+    route_parts = (row.route_name or "").split(" - ")
+    origin = row.from_address or route_parts[0]
+    destination = row.to_address or (route_parts[1] if len(route_parts) > 1 else "")
+    driver = row.driver_name or trip.driver_name_snapshot or ""
+    route_distance = _number(row.distance_km) if route_distance_fallback else 0.0
+    expense_cells = [expense[name] * share for name in EXPENSE_BUCKETS] + [total_expense * share]
+
+    def journey(hours_out, start, end, distance, reason, direction, revenue, from_, to):
+        revenue_total = sum(revenue)
+        return [
+            _format_date(row.local_start), hours_out, _format_time(row.local_end), from_, to,
+            _number(start), _number(end), _number(distance) or route_distance, reason, driver, direction,
+            *revenue, revenue_total, *expense_cells, revenue_total - total_expense * share,
+        ]
+
+    rows = [journey(
+        _format_time(row.local_start), trip.odometer_start, trip.odometer_end, trip.distance_traveled,
+        trip.notes or "Trip", "→ Outward",
+        [_number(trip.revenue_cash), _number(trip.revenue_online), _number(trip.revenue_paytm),
+         _number(trip.revenue_others), _number(trip.revenue_agent)],
+        origin, destination
+    )]
+    if two_way:
+        rows.append(journey(
+            "", trip.odometer_return_start, trip.odometer_return_end, trip.distance_return,
+            "Return", "↩ Return",
+            [_number(trip.return_revenue_cash), _number(trip.return_revenue_online), _number(trip.return_revenue_paytm),
+             _number(trip.return_revenue_others), _number(trip.return_revenue_agent)],
+            destination, origin
+        ))
+    return rows
+
+
+def totals_row(totals: List[float], label: str = "TOTAL") -> list:
+    row = [label] + [""] * (len(COLUMNS) - 1)
+    for column in TOTAL_COLUMNS:
+        row[column] = totals[column]
+    return row
+
+
+def _add_to_totals(totals: List[float], row: list) -> None:
+    for column in TOTAL_COLUMNS:
+        totals[column] += row[column]
+
+
+def _stream_rows(query, use_replica: bool, route_distance_fallback: bool = True) -> Iterator:
+    """Execute ``query`` on its own session and yield (row, sheet rows) lazily.
+
+    The request's session is closed before the response body is sent, so the
+    stream holds its own, read through a server-side cursor from the same
+    database the request's session reads from.
+    """
+    db = ReportSessionLocal()
+    db.info["use_replica"] = use_replica
+    try:
+        result = db.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for row in result:
+            yield row, sheet_rows(row, route_distance_fallback)
+    finally:
+        db.close()
+
+
+def _check_timezone(db: Session, tz: str) -> None:
+    try:
+        db.execute(select(func.timezone(tz, func.now())))
+    except DBAPIError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+
+
+def _export_response(content: Iterator[bytes], format: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        content,
+        media_type=XLSX_MEDIA_TYPE if format == "xlsx" else CSV_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    )
+
+
+class ExportLinkRequest(BaseModel):
+    path: str
+    params: Dict[str, str] = {}
+
+
+def _require_admin(current_user: TokenData) -> None:
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+
+@router.post("/links")
+def create_export_link(
+    link: ExportLinkRequest,
+    request: Request,
+    current_user: TokenData = Depends(require_admin)
+):
+    """Short-lived signed URL of an export, for the browser to download straight to disk (admin only)"""
+    if link.path not in {request.app.url_path_for(name) for name in LINKABLE_EXPORTS}:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    return {
+        "url": create_download_link(current_user, link.path, link.params),
+        "expires_in": DOWNLOAD_LINK_EXPIRE_SECONDS
+    }
+
+
+@router.get("/trip-sheet")
+def export_trip_sheet(
+    trip_id: Optional[str] = None,
+    bus_id: Optional[str] = None,
+    status: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    format: str = Query("xlsx", pattern="^(csv|xlsx)$"),
+    tz: str = "Asia/Kolkata",
+    current_user: TokenData = Depends(get_download_user),
+    db: Session = Depends(get_report_db)
+):
+    """Download a trip sheet for one trip or a filtered set of trips (admin only).
+
+    Also accepts a signed link from POST /exports/links, so the browser can
+    download it directly.
+    """
+    _require_admin(current_user)
+    _check_timezone(db, tz)
+    use_replica = db.info["use_replica"]
+
+    filters = local_bounds(tz, from_date, to_date)
+    if trip_id:
+        filters.append(Trip.id == uuid.UUID(trip_id))
+    if bus_id:
+        filters.append(Trip.bus_id == uuid.UUID(bus_id))
+    if status:
+        filters.append(Trip.status == TripStatus(status))
+
+    query = trip_sheet_query(tz).where(*filters).order_by(Trip.start_date, Trip.id)
+
+    if format == "csv":
+        def csv_rows():
+            yield ["Vehicle No"] + COLUMNS
+            for row, rows in _stream_rows(query, use_replica):
+                for sheet_row in rows:
+                    yield [row.registration_number or ""] + sheet_row
+        return _export_response(stream_csv(csv_rows()), format, "trip-sheet")
+
+    # The header names the vehicle, so look it up before streaming rows
+    buses = db.execute(
+        select(func.count(func.distinct(Trip.bus_id)), func.min(Bus.registration_number))
+        .select_from(Trip).outerjoin(Bus, Trip.bus_id == Bus.id)
+        .where(*filters)
+    ).one()
+    vehicle_no = (buses[1] or "Unknown") if buses[0] <= 1 else "Multiple Vehicles"
+
+    def xlsx_rows():
+        yield TITLE_ROW
+        yield ["Vehicle No", vehicle_no]
+        yield GROUP_ROW
+        yield COLUMNS
+        totals = [0.0] * len(COLUMNS)
+        count = 0
+        for _, rows in _stream_rows(query, use_replica):
+            for sheet_row in rows:
+                _add_to_totals(totals, sheet_row)
+                count += 1
+                yield sheet_row
+        for _ in range(count, MIN_TRIP_SHEET_ROWS - 4):
+            yield ["", "", "", "", "", "", "", 0, "", "", "", "", "", "", "", "", 0, "", "", "", "", "", "", 0, 0]
+        yield totals_row(totals)
+
+    sheet = Sheet("Trip Sheet", xlsx_rows(), COLUMN_WIDTHS, HEADER_MERGES)
+    return _export_response(stream_xlsx([sheet]), format, "trip-sheet")
+
+
+@router.get("/period")
+def export_period(
+    from_date: date,
+    to_date: date,
+    label: Optional[str] = None,
+    format: str = Query("xlsx", pattern="^(csv|xlsx)$"),
+    tz: str = "Asia/Kolkata",
+    current_user: TokenData = Depends(get_download_user),
+    db: Session = Depends(get_report_db)
+):
+    """Download the fleet trip sheet for a period: one sheet per bus plus a summary (admin only)"""
+    _require_admin(current_user)
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="to_date must not be before from_date")
+    _check_timezone(db, tz)
+    use_replica = db.info["use_replica"]
+
+    label = label or f"{from_date:%d/%m/%Y} - {to_date:%d/%m/%Y}"
+    query = (
+        trip_sheet_query(tz)
+        .where(*local_bounds(tz, from_date, to_date))
+        .order_by(Bus.registration_number, Trip.start_date, Trip.id)
+    )
+    filename = f"fleet-trip-sheet-{from_date}-{to_date}"
+
+    if format == "csv":
+        def csv_rows():
+            yield ["Vehicle No"] + COLUMNS
+            for row, rows in _stream_rows(query, use_replica, route_distance_fallback=False):
+                for sheet_row in rows:
+                    yield [row.registration_number or "Unknown"] + sheet_row
+        return _export_response(stream_csv(csv_rows()), format, filename)
+
+    # Per-bus totals for the summary sheet; one small entry per bus
+    summary = []
+
+    def bus_sheet(vehicle_no, trips):
+        yield TITLE_ROW
+        yield [f"Vehicle No: {vehicle_no}", "", "", f"Period: {label}"]
+        yield GROUP_ROW
+        yield COLUMNS
+        totals = [0.0] * len(COLUMNS)
+        trip_count = 0
+        for _, rows in trips:
+            trip_count += len(rows)
+            for sheet_row in rows:
+                _add_to_totals(totals, sheet_row)
+                yield sheet_row
+        yield totals_row(totals)
+        summary.append([vehicle_no, trip_count, totals[7], totals[16], totals[23], totals[24]])
+
+    def summary_rows():
+        yield ["FLEET SUMMARY"]
+        yield [f"Period: {label}"]
+        yield []
+        yield ["Vehicle", "Total Trips", "Total Distance (km)", "Total Revenue", "Total Expenses", "Net Income"]
+        fleet = ["FLEET TOTAL", 0, 0.0, 0.0, 0.0, 0.0]
+        for row in summary:
+            yield row
+            for i in range(1, len(fleet)):
+                fleet[i] += row[i]
+        yield fleet
+
+    def sheets():
+        grouped = groupby(
+            _stream_rows(query, use_replica, route_distance_fallback=False),
+            key=lambda item: item[0].registration_number or "Unknown"
+        )
+        for vehicle_no, trips in grouped:
+            yield Sheet(vehicle_no, bus_sheet(vehicle_no, trips), COLUMN_WIDTHS, HEADER_MERGES)
+        yield Sheet("Summary", summary_rows(), [15, 12, 18, 15, 15, 15], ["A1:F1"])
+
+    return _export_response(stream_xlsx(sheets()), format, filename)
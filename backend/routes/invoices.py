@@ -8,7 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Invoice, InvoiceLineItem, InvoicePayment, InvoiceStatus, InvoiceType
 from auth import get_current_user, require_admin, TokenData
 
@@ -147,7 +147,7 @@ async def list_invoices(
     limit: int = Query(100, le=1000),
     offset: int = 0,
     current_user: TokenData = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List invoices (admin only)"""
     query = db.query(Invoice).options(
@@ -1,18 +1,26 @@
 """
 Notifications routes
 """
+import asyncio
+import json
 import uuid
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 from database import get_db
-from models import Notification
-from auth import get_current_user, TokenData
+from models import Notification, NotificationCounter
+from auth import get_current_user, get_stream_user, require_admin, TokenData
+from background import run_job_once
+from notify import purge_notifications
+from realtime import notification_broker
 
 router = APIRouter()
 
+STREAM_HEARTBEAT_SECONDS = 15
+
 
 @router.get("")
 async def list_notifications(
@@ -42,6 +50,67 @@ async def list_notifications(
     } for n in notifications]
 
 
+@router.get("/unread-count")
+async def get_unread_count(
+    current_user: TokenData = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Unread notification count for the current user (primary-key lookup)"""
+    unread_count = db.query(NotificationCounter.unread_count).filter(
+        NotificationCounter.user_id == uuid.UUID(current_user.user_id)
+    ).scalar()
+    
+    return {"unread_count": unread_count or 0}
+
+
+@router.get("/stream")
+async def stream_notifications(
+    request: Request,
+    current_user: TokenData = Depends(get_stream_user)
+):
+    """Server-Sent Events stream of new notifications for the current user.
+
+    Emits ``notification`` events as rows are inserted, and ``resync`` when
+    the server may have missed some (the client should refetch the list).
+    """
+    queue = await notification_broker.subscribe(current_user.user_id)
+
+    async def event_stream():
+        try:
+            yield f"retry: {STREAM_HEARTBEAT_SECONDS * 1000}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            notification_broker.unsubscribe(current_user.user_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/purge")
+async def run_notification_purge(
+    current_user: TokenData = Depends(require_admin)
+):
+    """Apply the notification retention policy now (admin only)"""
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, run_job_once, "notification-purge", purge_notifications
+    )
+    if result is None:
+        raise HTTPException(status_code=409, detail="Notification purge already running")
+    
+    return result
+
+
 @router.put("/{notification_id}/read")
 async def mark_as_read(
     notification_id: str,
@@ -8,7 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 
-from database import get_db
+from database import get_db, get_read_db
 from models import RepairRecord, RepairOrganization, Bus, Profile
 from auth import get_current_user, require_admin, require_repair_org, TokenData
 
@@ -121,7 +121,7 @@ async def list_repairs(
     limit: int = Query(100, le=1000),
     offset: int = 0,
     current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List repair records"""
     query = db.query(RepairRecord).options(
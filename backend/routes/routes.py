@@ -3,12 +3,14 @@ Route management routes
 """
 import uuid
 from typing import Optional
+from datetime import date
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import and_, case, func, select, true
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 
-from database import get_db
-from models import Route, IndianState
+from database import get_db, get_read_db, get_report_db
+from models import Route, IndianState, Trip, Expense, ExpenseCategory, ExpenseStatus, TripStatus
 from auth import get_current_user, require_admin, TokenData
 
 router = APIRouter()
@@ -62,7 +64,7 @@ def route_to_dict(route: Route) -> dict:
 @router.get("")
 async def list_routes(
     current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List all routes"""
     routes = db.query(Route).options(
@@ -91,6 +93,111 @@ async def get_route(
     return route_to_dict(route)
 
 
+def leg_distance(start, end):
+    """Odometer distance of one leg, falling back to the route's planned distance"""
+    return case(
+        (and_(start.isnot(None), end.isnot(None), end > start), end - start),
+        else_=Route.distance_km
+    )
+
+
+@router.get("/{route_id}/expense-summary")
+async def get_route_expense_summary(
+    route_id: str,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    current_user: TokenData = Depends(require_admin),
+    db: Session = Depends(get_report_db)
+):
+    """Approved expenses on a route by category, with per-trip and per-km costs (admin only)"""
+    route_uuid = uuid.UUID(route_id)
+    # Cancelled trips are left out, as in the fleet rollups
+    trip_filters = [Trip.route_id == route_uuid, Trip.status != TripStatus.cancelled]
+    if from_date:
+        trip_filters.append(Trip.trip_date >= from_date)
+    if to_date:
+        trip_filters.append(Trip.trip_date <= to_date)
+    
+    distance = func.coalesce(leg_distance(Trip.odometer_start, Trip.odometer_end), 0) + case(
+        (Trip.trip_type == "two_way", func.coalesce(leg_distance(Trip.odometer_return_start, Trip.odometer_return_end), 0)),
+        else_=0
+    )
+    route_totals = (
+        select(
+            Route.route_name,
+            Route.distance_km,
+            func.count(Trip.id).label("trip_count"),
+            func.coalesce(func.sum(distance), 0).label("total_distance")
+        )
+        .select_from(Route)
+        .outerjoin(Trip, and_(*trip_filters))
+        .where(Route.id == route_uuid)
+        .group_by(Route.id)
+        .cte("route_totals")
+    )
+    category_totals = (
+        select(
+            ExpenseCategory.id.label("category_id"),
+            ExpenseCategory.name.label("category_name"),
+            func.sum(Expense.amount).label("total"),
+            func.count(Expense.id).label("expense_count"),
+            func.count(func.distinct(Expense.trip_id)).label("category_trip_count")
+        )
+        .select_from(Trip)
+        .join(Expense, Expense.trip_id == Trip.id)
+        .join(ExpenseCategory, Expense.category_id == ExpenseCategory.id)
+        .where(*trip_filters, Expense.status == ExpenseStatus.approved)
+        .group_by(ExpenseCategory.id, ExpenseCategory.name)
+        .cte("category_totals")
+    )
+    
+    rows = db.execute(
+        select(route_totals, category_totals)
+        .select_from(route_totals)
+        .outerjoin(category_totals, true())
+        .order_by(category_totals.c.total.desc())
+    ).all()
+    
+    if not rows:
+        raise HTTPException(status_code=404, detail="Route not found")
+    
+    first = rows[0]
+    trip_count = first.trip_count
+    total_distance = float(first.total_distance)
+    categories = [row for row in rows if row.category_id is not None]
+    total_expense = sum(float(row.total) for row in categories)
+    
+    def per_trip(amount: float) -> Optional[float]:
+        return round(amount / trip_count, 2) if trip_count else None
+    
+    def per_km(amount: float) -> Optional[float]:
+        return round(amount / total_distance, 2) if total_distance else None
+    
+    return {
+        "route_id": route_id,
+        "route_name": first.route_name,
+        "distance_km": float(first.distance_km) if first.distance_km else None,
+        "from_date": str(from_date) if from_date else None,
+        "to_date": str(to_date) if to_date else None,
+        "trip_count": trip_count,
+        "total_distance_km": total_distance,
+        "total_expense": total_expense,
+        "expense_count": sum(row.expense_count for row in categories),
+        "average_expense_per_trip": per_trip(total_expense),
+        "cost_per_km": per_km(total_expense),
+        "categories": [{
+            "category_id": str(row.category_id),
+            "category_name": row.category_name,
+            "total": float(row.total),
+            "expense_count": row.expense_count,
+            "trip_count": row.category_trip_count,
+            "average_per_trip": per_trip(float(row.total)),
+            "cost_per_km": per_km(float(row.total)),
+            "share": round(float(row.total) / total_expense, 4) if total_expense else None
+        } for row in categories]
+    }
+
+
 @router.post("")
 async def create_route(
     route_data: RouteCreate,
@@ -11,9 +11,10 @@ from sqlalchemy import cast, Text, ARRAY
 from sqlalchemy.dialects.postgresql import array
 from pydantic import BaseModel
 
-from database import get_db
-from models import BusSchedule, Bus, Route, Profile, Trip, TripStatus, Notification
+from database import get_db, get_read_db
+from models import BusSchedule, Bus, Route, Profile, Trip, TripStatus
 from auth import get_current_user, require_admin, TokenData
+from notify import insert_notifications
 
 router = APIRouter()
 
@@ -116,7 +117,7 @@ async def list_schedules(
     bus_id: Optional[str] = None,
     is_active: Optional[bool] = None,
     current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List all schedules"""
     query = db.query(BusSchedule).options(
@@ -164,6 +165,7 @@ async def generate_trips(
         trips_created = 0
         skipped = []
         errors = []
+        notifications = []
 
         for schedule in schedules:
             try:
@@ -245,26 +247,27 @@ async def generate_trips(
                 # Commit trip first so it's not lost if notification fails
                 db.commit()
 
-                # Send notification using driver's auth user_id (not profile id)
+                # Notify using driver's auth user_id (not profile id); sent in one batch below
                 if schedule.driver and schedule.driver.user_id:
-                    try:
-                        notification = Notification(
-                            id=uuid.uuid4(),
-                            user_id=schedule.driver.user_id,
-                            type="trip_reminder",
-                            title="Scheduled Trip Today",
-                            message=f"You have a scheduled trip: {schedule.route.route_name if schedule.route else 'Route'} departing at {dep_time}",
-                        )
-                        db.add(notification)
-                        db.commit()
-                    except Exception as notif_err:
-                        db.rollback()
-                        errors.append(f"Notification for schedule {schedule.id}: {str(notif_err)}")
+                    notifications.append({
+                        "user_id": schedule.driver.user_id,
+                        "type": "trip_reminder",
+                        "title": "Scheduled Trip Today",
+                        "message": f"You have a scheduled trip: {schedule.route.route_name if schedule.route else 'Route'} departing at {dep_time}",
+                    })
 
             except Exception as e:
                 db.rollback()
                 errors.append(f"Schedule {schedule.id}: {str(e)}")
 
+        if notifications:
+            try:
+                insert_notifications(db, notifications)
+                db.commit()
+            except Exception as notif_err:
+                db.rollback()
+                errors.append(f"Trip notifications: {str(notif_err)}")
+
         return {
             "success": True,
             "date": today_str,
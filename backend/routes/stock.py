@@ -2,13 +2,17 @@
 Stock management routes
 """
 import uuid
-from typing import Optional
+from typing import Optional, List
+from datetime import date, datetime, time, timedelta
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import Integer, Numeric, and_, case, cast, column, func, insert, or_, select, true, update, values
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from database import get_db
-from models import StockItem, StockTransaction, StockTransactionType
+from database import get_db, get_read_db
+from models import StockItem, StockTransaction, StockTransactionType, StockBalanceSnapshot
+from stock_snapshots import snapshot_stock_balances
 from auth import get_current_user, require_admin, TokenData
 
 router = APIRouter()
@@ -39,6 +43,18 @@ class StockAdjustment(BaseModel):
     notes: Optional[str] = None
 
 
+class StockMovement(BaseModel):
+    stock_item_id: str
+    quantity_change: int
+    transaction_type: str  # add, remove, adjustment
+    notes: Optional[str] = None
+
+
+class StockBatchAdjustment(BaseModel):
+    movements: List[StockMovement]
+    notes: Optional[str] = None  # applied to movements without their own notes
+
+
 def stock_item_to_dict(item: StockItem) -> dict:
     return {
         "id": str(item.id),
@@ -73,16 +89,74 @@ def transaction_to_dict(tx: StockTransaction) -> dict:
     }
 
 
+def signed_quantity_change():
+    """SQL expression for a ledger row's effect on quantity (removals are stored positive)"""
+    return case(
+        (StockTransaction.transaction_type == StockTransactionType.remove, -StockTransaction.quantity_change),
+        else_=StockTransaction.quantity_change
+    )
+
+
+def stock_items_as_of(db: Session, as_of: datetime) -> list:
+    """Stock items with their quantity at a point in time.
+
+    Starts from the nearest snapshot at or before ``as_of`` and adds the ledger
+    delta since then. Items without a snapshot start from the quantity before
+    their first transaction.
+    """
+    snapshot = select(
+        StockBalanceSnapshot.quantity, StockBalanceSnapshot.snapshot_at
+    ).where(
+        StockBalanceSnapshot.stock_item_id == StockItem.id,
+        StockBalanceSnapshot.snapshot_at <= as_of
+    ).order_by(StockBalanceSnapshot.snapshot_at.desc()).limit(1).lateral("snapshot")
+
+    first_tx = select(
+        StockTransaction.previous_quantity
+    ).where(
+        StockTransaction.stock_item_id == StockItem.id
+    ).order_by(StockTransaction.created_at).limit(1).lateral("first_tx")
+
+    delta = select(
+        func.coalesce(func.sum(signed_quantity_change()), 0).label("change")
+    ).where(
+        StockTransaction.stock_item_id == StockItem.id,
+        StockTransaction.created_at <= as_of,
+        or_(snapshot.c.snapshot_at.is_(None), StockTransaction.created_at > snapshot.c.snapshot_at)
+    ).lateral("delta")
+
+    base_quantity = func.coalesce(snapshot.c.quantity, first_tx.c.previous_quantity, StockItem.quantity)
+
+    return db.query(
+        StockItem, (base_quantity + delta.c.change).label("quantity_as_of")
+    ).outerjoin(
+        snapshot, true()
+    ).outerjoin(
+        first_tx, true()
+    ).outerjoin(
+        delta, true()
+    ).filter(
+        StockItem.created_at <= as_of
+    ).order_by(StockItem.item_name).all()
+
+
 @router.get("")
 async def list_stock_items(
+    as_of: Optional[datetime] = None,
     current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """List all stock items"""
+    """List all stock items, optionally with quantities as they were at ``as_of``"""
     # Only admin and driver can view
     if current_user.role not in ["admin", "driver"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
+    if as_of:
+        return [
+            {**stock_item_to_dict(item), "quantity": quantity, "as_of": as_of.isoformat()}
+            for item, quantity in stock_items_as_of(db, as_of)
+        ]
+    
     items = db.query(StockItem).order_by(StockItem.item_name).all()
     
     return [stock_item_to_dict(i) for i in items]
@@ -93,7 +167,7 @@ async def list_stock_transactions(
     stock_item_id: Optional[str] = None,
     limit: int = 100,
     current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List stock transactions"""
     if current_user.role not in ["admin", "driver"]:
@@ -109,6 +183,74 @@ async def list_stock_transactions(
     return [transaction_to_dict(t) for t in transactions]
 
 
+@router.post("/snapshots")
+async def create_stock_snapshots(
+    current_user: TokenData = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Record the current balance of every stock item now (admin only).
+
+    The stock-snapshots background job does this every
+    STOCK_SNAPSHOT_INTERVAL_SECONDS (nightly by default).
+    """
+    return snapshot_stock_balances(db, created_by=uuid.UUID(current_user.profile_id))
+
+
+@router.get("/consumption")
+async def stock_consumption(
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    current_user: TokenData = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Units removed per day for each item over a window (defaults to the last 30 days)"""
+    if current_user.role not in ["admin", "driver"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    to_date = to_date or date.today()
+    from_date = from_date or to_date - timedelta(days=29)
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="from_date must be on or before to_date")
+    days = (to_date - from_date).days + 1
+    
+    consumed = func.coalesce(func.sum(StockTransaction.quantity_change).filter(
+        StockTransaction.transaction_type == StockTransactionType.remove
+    ), 0)
+    per_day = cast(consumed, Numeric) / days
+    
+    rows = db.query(
+        StockItem.id,
+        StockItem.item_name,
+        StockItem.unit,
+        StockItem.quantity,
+        consumed.label("consumed"),
+        func.round(per_day, 2).label("units_per_day"),
+        func.round(StockItem.quantity / func.nullif(per_day, 0), 1).label("days_of_stock")
+    ).outerjoin(
+        StockTransaction,
+        and_(
+            StockTransaction.stock_item_id == StockItem.id,
+            StockTransaction.created_at >= datetime.combine(from_date, time.min),
+            StockTransaction.created_at < datetime.combine(to_date + timedelta(days=1), time.min)
+        )
+    ).group_by(StockItem.id).order_by(StockItem.item_name).all()
+    
+    return {
+        "from_date": str(from_date),
+        "to_date": str(to_date),
+        "days": days,
+        "items": [{
+            "id": str(r.id),
+            "item_name": r.item_name,
+            "unit": r.unit,
+            "quantity": r.quantity,
+            "consumed": int(r.consumed),
+            "units_per_day": float(r.units_per_day),
+            "days_of_stock": float(r.days_of_stock) if r.days_of_stock is not None else None
+        } for r in rows]
+    }
+
+
 @router.get("/{item_id}")
 async def get_stock_item(
     item_id: str,
@@ -231,6 +373,112 @@ async def adjust_stock(
     return stock_item_to_dict(item)
 
 
+@router.post("/adjust-batch")
+async def adjust_stock_batch(
+    batch: StockBatchAdjustment,
+    current_user: TokenData = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Apply many stock movements in one transaction (admin or driver).
+
+    All movements succeed or none do. Items are locked once, quantities are
+    written with a single UPDATE ... FROM (VALUES ...) and the ledger rows
+    with a single multi-row INSERT.
+    """
+    if current_user.role not in ["admin", "driver"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    if not batch.movements:
+        raise HTTPException(status_code=400, detail="No stock movements provided")
+
+    try:
+        item_ids = [uuid.UUID(m.stock_item_id) for m in batch.movements]
+        tx_types = [StockTransactionType(m.transaction_type) for m in batch.movements]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid stock movement: {str(e)}")
+
+    # Lock every touched row up front, in a stable order to avoid deadlocks
+    rows = db.query(
+        StockItem.id, StockItem.item_name, StockItem.quantity, StockItem.low_stock_threshold
+    ).filter(
+        StockItem.id.in_(set(item_ids))
+    ).order_by(StockItem.id).with_for_update().all()
+
+    items = {row.id: row for row in rows}
+    missing = [str(i) for i in dict.fromkeys(item_ids) if i not in items]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Stock items not found: {', '.join(missing)}")
+
+    profile_id = uuid.UUID(current_user.profile_id)
+    quantities = {item_id: row.quantity or 0 for item_id, row in items.items()}
+    transactions = []
+
+    # Movements on the same item are applied in request order
+    for movement, item_id, tx_type in zip(batch.movements, item_ids, tx_types):
+        previous_quantity = quantities[item_id]
+        if tx_type == StockTransactionType.remove:
+            new_quantity = previous_quantity - movement.quantity_change
+            if new_quantity < 0:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Insufficient stock for {items[item_id].item_name}"
+                )
+        else:  # add, adjustment
+            new_quantity = previous_quantity + movement.quantity_change
+
+        quantities[item_id] = new_quantity
+        transactions.append({
+            "id": uuid.uuid4(),
+            "stock_item_id": item_id,
+            "transaction_type": tx_type,
+            "quantity_change": movement.quantity_change,
+            "previous_quantity": previous_quantity,
+            "new_quantity": new_quantity,
+            "notes": movement.notes if movement.notes is not None else batch.notes,
+            "created_by": profile_id,
+        })
+
+    new_quantities = values(
+        column("id", UUID(as_uuid=True)),
+        column("quantity", Integer),
+        name="new_quantities"
+    ).data(list(quantities.items()))
+
+    db.execute(
+        update(StockItem)
+        .where(StockItem.id == new_quantities.c.id)
+        .values(quantity=new_quantities.c.quantity, last_updated_by=profile_id),
+        execution_options={"synchronize_session": False}
+    )
+    db.execute(insert(StockTransaction), transactions)
+    db.commit()
+
+    results = []
+    crossed_threshold = []
+    for item_id, row in items.items():
+        threshold = row.low_stock_threshold or 0
+        previous_quantity = row.quantity or 0
+        new_quantity = quantities[item_id]
+        result = {
+            "id": str(item_id),
+            "item_name": row.item_name,
+            "previous_quantity": previous_quantity,
+            "quantity": new_quantity,
+            "low_stock_threshold": row.low_stock_threshold
+        }
+        results.append(result)
+        if previous_quantity >= threshold > new_quantity:
+            crossed_threshold.append({**result, "direction": "below"})
+        elif previous_quantity < threshold <= new_quantity:
+            crossed_threshold.append({**result, "direction": "above"})
+
+    return {
+        "items": sorted(results, key=lambda r: r["item_name"]),
+        "transactions_created": len(transactions),
+        "crossed_threshold": crossed_threshold
+    }
+
+
 @router.delete("/{item_id}")
 async def delete_stock_item(
     item_id: str,
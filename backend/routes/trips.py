@@ -1,19 +1,35 @@
 """
 Trip management routes
 """
+import hashlib
+import os
 import uuid
-from typing import Optional, List
+from collections import OrderedDict
+from typing import Optional, List, Tuple
 from datetime import date, datetime, time
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 
-from database import get_db
-from models import Trip, TripStatus, Bus, Profile, Route
+from database import get_db, get_read_db
+from media import etag_matches
+from models import (
+    Trip, TripStatus, Bus, Profile, Route, Expense, ExpenseCategory, ExpenseStatus, AdminSetting
+)
 from auth import get_current_user, require_admin, TokenData
 
 router = APIRouter()
 
+# Financial summaries kept per worker; each entry is validated against the
+# trip, its expenses and the GST setting before it is served
+TRIP_FINANCIALS_CACHE_SIZE = int(os.getenv("TRIP_FINANCIALS_CACHE_SIZE", "1024"))
+_financials_cache: "OrderedDict[str, Tuple[tuple, dict]]" = OrderedDict()
+
+REVENUE_CHANNELS = ("cash", "online", "paytm", "others", "agent")
+DEFAULT_GST_PERCENTAGE = 18.0
+
 
 class TripCreate(BaseModel):
     trip_number: str
@@ -126,7 +142,7 @@ async def get_my_trips(
     to_date: Optional[date] = None,
     limit: int = Query(100, le=1000),
     current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get trips for the current driver"""
     query = db.query(Trip).options(
@@ -142,7 +158,7 @@ async def get_my_trips(
     if to_date:
         query = query.filter(Trip.trip_date <= to_date)
     
-    trips = query.order_by(Trip.start_date.desc()).limit(limit).all()
+    trips = query.order_by(Trip.trip_date.desc(), Trip.start_date.desc()).limit(limit).all()
     
     return [trip_to_dict(t) for t in trips]
 
@@ -157,7 +173,7 @@ async def list_trips(
     limit: int = Query(100, le=1000),
     offset: int = 0,
     current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List trips with optional filters"""
     query = db.query(Trip).options(
@@ -182,7 +198,8 @@ async def list_trips(
     if to_date:
         query = query.filter(Trip.trip_date <= to_date)
     
-    trips = query.order_by(Trip.start_date.desc()).offset(offset).limit(limit).all()
+    # Leading with the partition key lets newest-first pages read only the latest months
+    trips = query.order_by(Trip.trip_date.desc(), Trip.start_date.desc()).offset(offset).limit(limit).all()
     
     return [trip_to_dict(t) for t in trips]
 
@@ -210,6 +227,225 @@ async def get_trip(
     return trip_to_dict(trip)
 
 
+def _version_columns(trip_uuid: uuid.UUID) -> list:
+    """Columns that change whenever the financial summary of a trip can change.
+
+    The updated_at triggers bump the timestamps on every UPDATE; inserts and
+    deletes of expenses show up in the count and latest timestamp.
+    """
+    trip_expenses = Expense.trip_id == trip_uuid
+    return [
+        Trip.updated_at.label("trip_updated_at"),
+        select(func.count(Expense.id)).where(trip_expenses).scalar_subquery().label("expense_count"),
+        select(func.max(Expense.updated_at)).where(trip_expenses).scalar_subquery().label("expenses_updated_at"),
+        select(AdminSetting.updated_at).where(
+            AdminSetting.key == "gst_percentage"
+        ).scalar_subquery().label("gst_updated_at"),
+    ]
+
+
+def _financials_query(trip_uuid: uuid.UUID):
+    """Trip, GST setting, expense groups and the expense list as one statement"""
+    gst_value = select(AdminSetting.value).where(
+        AdminSetting.key == "gst_percentage"
+    ).scalar_subquery()
+    
+    groups = (
+        select(
+            Expense.category_id,
+            ExpenseCategory.name.label("category_name"),
+            Expense.status,
+            func.sum(Expense.amount).label("total"),
+            func.count(Expense.id).label("count"),
+            func.sum(Expense.fuel_quantity).label("fuel_quantity"),
+            func.sum(Expense.amount).filter(Expense.fuel_quantity > 0).label("fuel_cost")
+        )
+        .join(ExpenseCategory, Expense.category_id == ExpenseCategory.id)
+        .where(Expense.trip_id == trip_uuid)
+        .group_by(Expense.category_id, ExpenseCategory.name, Expense.status)
+        .subquery()
+    )
+    groups_json = select(
+        func.coalesce(func.json_agg(func.json_build_object(
+            "category_id", groups.c.category_id,
+            "category_name", groups.c.category_name,
+            "status", groups.c.status,
+            "total", groups.c.total,
+            "count", groups.c.count,
+            "fuel_quantity", groups.c.fuel_quantity,
+            "fuel_cost", groups.c.fuel_cost
+        )), func.json_build_array())
+    ).scalar_subquery()
+    
+    expense_object = func.json_build_object(
+        "id", Expense.id,
+        "amount", Expense.amount,
+        "expense_date", Expense.expense_date,
+        "status", Expense.status,
+        "description", Expense.description,
+        "document_url", Expense.document_url,
+        "fuel_quantity", Expense.fuel_quantity,
+        "admin_remarks", Expense.admin_remarks,
+        "category", func.json_build_object("id", ExpenseCategory.id, "name", ExpenseCategory.name),
+        "submitter", func.json_build_object("id", Profile.id, "full_name", Profile.full_name)
+    )
+    expenses_json = (
+        select(func.coalesce(
+            func.json_agg(aggregate_order_by(expense_object, Expense.expense_date.desc(), Expense.created_at.desc())),
+            func.json_build_array()
+        ))
+        .select_from(Expense)
+        .join(ExpenseCategory, Expense.category_id == ExpenseCategory.id)
+        .outerjoin(Profile, Expense.submitted_by == Profile.id)
+        .where(Expense.trip_id == trip_uuid)
+        .scalar_subquery()
+    )
+    
+    return select(
+        Trip,
+        gst_value.label("gst_setting"),
+        groups_json.label("expense_groups"),
+        expenses_json.label("expenses"),
+        *_version_columns(trip_uuid)
+    ).where(Trip.id == trip_uuid)
+
+
+def _revenue_leg(trip: Trip, prefix: str = "") -> dict:
+    leg = {channel: float(getattr(trip, f"{prefix}revenue_{channel}") or 0) for channel in REVENUE_CHANNELS}
+    leg["total"] = sum(leg.values())
+    return leg
+
+
+def _leg_distance(start, end) -> Optional[float]:
+    if start is not None and end is not None and end > start:
+        return float(end - start)
+    return None
+
+
+def build_trip_financials(trip: Trip, gst_setting: Optional[str], expense_groups: list, expenses: list) -> dict:
+    """Revenue, GST, expenses, fuel efficiency and profit for one trip"""
+    two_way = trip.trip_type == "two_way"
+    outward = _revenue_leg(trip)
+    return_leg = _revenue_leg(trip, "return_") if two_way else None
+    gross_revenue = outward["total"] + (return_leg["total"] if return_leg else 0)
+    
+    # admin_settings wins over the percentage stored on the trip, as in the revenue dialog
+    try:
+        gst_percentage = float(gst_setting) if gst_setting else None
+    except ValueError:
+        gst_percentage = None
+    if not gst_percentage:
+        gst_percentage = float(trip.gst_percentage) if trip.gst_percentage else DEFAULT_GST_PERCENTAGE
+    # Revenue is GST-inclusive, so the tax is extracted from the gross
+    gst_amount = gross_revenue * gst_percentage / (100 + gst_percentage)
+    net_revenue = gross_revenue - gst_amount
+    
+    by_status = {status.value: {"total": 0.0, "count": 0} for status in ExpenseStatus}
+    categories = {}
+    fuel_quantity = 0.0
+    fuel_cost = 0.0
+    for group in expense_groups:
+        amount = float(group["total"] or 0)
+        by_status[group["status"]]["total"] += amount
+        by_status[group["status"]]["count"] += group["count"]
+        category = categories.setdefault(group["category_id"], {
+            "category_id": group["category_id"],
+            "category_name": group["category_name"],
+            "total": 0.0,
+            "count": 0,
+            **{status.value: 0.0 for status in ExpenseStatus}
+        })
+        category[group["status"]] += amount
+        category["total"] += amount
+        category["count"] += group["count"]
+        if group["status"] != ExpenseStatus.denied.value:
+            fuel_quantity += float(group["fuel_quantity"] or 0)
+            fuel_cost += float(group["fuel_cost"] or 0)
+    
+    approved_expense = by_status[ExpenseStatus.approved.value]["total"]
+    legs = [_leg_distance(trip.odometer_start, trip.odometer_end)]
+    if two_way:
+        legs.append(_leg_distance(trip.odometer_return_start, trip.odometer_return_end))
+    distance = sum(leg for leg in legs if leg is not None) or None
+    
+    return {
+        "trip_id": str(trip.id),
+        "trip_number": trip.trip_number,
+        "trip_type": trip.trip_type,
+        "status": trip.status.value if trip.status else None,
+        "driver_id": str(trip.driver_id) if trip.driver_id else None,
+        "revenue": {
+            "outward": outward,
+            "return": return_leg,
+            "gross": gross_revenue,
+        },
+        "gst": {
+            "percentage": gst_percentage,
+            "amount": round(gst_amount, 2),
+            "net_revenue": round(net_revenue, 2),
+        },
+        "expenses": {
+            "total": sum(group["total"] for group in by_status.values()),
+            "by_status": by_status,
+            "by_category": sorted(categories.values(), key=lambda c: -c["total"]),
+            "items": expenses,
+        },
+        "fuel": {
+            "quantity": fuel_quantity,
+            "cost": fuel_cost,
+            "distance_km": distance,
+            "km_per_unit": round(distance / fuel_quantity, 2) if distance and fuel_quantity else None,
+            "cost_per_km": round(fuel_cost / distance, 2) if distance else None,
+        },
+        "net_profit": round(net_revenue - approved_expense, 2),
+    }
+
+
+@router.get("/{trip_id}/financials")
+async def get_trip_financials(
+    trip_id: str,
+    request: Request,
+    response: Response,
+    current_user: TokenData = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Revenue, GST, expenses, fuel efficiency and net profit of a trip"""
+    trip_uuid = uuid.UUID(trip_id)
+    cached = _financials_cache.get(trip_id)
+    financials = None
+    
+    if cached:
+        version = db.execute(select(*_version_columns(trip_uuid)).where(Trip.id == trip_uuid)).first()
+        if version is None:
+            _financials_cache.pop(trip_id, None)
+            raise HTTPException(status_code=404, detail="Trip not found")
+        if tuple(version) == cached[0]:
+            version, financials = cached
+            _financials_cache.move_to_end(trip_id)
+    
+    if financials is None:
+        row = db.execute(_financials_query(trip_uuid)).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Trip not found")
+        version = (row.trip_updated_at, row.expense_count, row.expenses_updated_at, row.gst_updated_at)
+        financials = build_trip_financials(row.Trip, row.gst_setting, row.expense_groups, row.expenses)
+        _financials_cache[trip_id] = (version, financials)
+        _financials_cache.move_to_end(trip_id)
+        while len(_financials_cache) > TRIP_FINANCIALS_CACHE_SIZE:
+            _financials_cache.popitem(last=False)
+    
+    # Check access
+    if current_user.role == "driver" and financials["driver_id"] != current_user.profile_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    etag = '"' + hashlib.sha1(repr(version).encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return financials
+
+
 @router.post("")
 async def create_trip(
     trip_data: TripCreate,
@@ -1,19 +1,220 @@
 """
 File upload routes
 """
+import asyncio
+import hashlib
 import os
+import time
 import uuid
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from fastapi.responses import FileResponse
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
 import aiofiles
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from auth import get_current_user, TokenData
+from database import get_db
+from models import Expense, RepairRecord
+from auth import get_current_user, require_admin, TokenData
+from background import run_job_once
+from media import serve_file
+from upload_gc import UPLOAD_GC_GRACE_HOURS, collect_orphaned_uploads, remove_if_stale, upload_path
+from images import RASTER_EXTENSIONS, RASTER_TYPES, VARIANTS, generate_variants, remove_variants, schedule_variants, variant_path
 
 router = APIRouter()
+# Mounted at /uploads; serves the uploaded files themselves
+media_router = APIRouter()
 
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/app/uploads")
 
+# Uploads are streamed to disk in chunks so large files never sit in memory
+UPLOAD_CHUNK_SIZE = 256 * 1024
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE_MB", "15")) * 1024 * 1024
+MAX_LOGO_SIZE = 2 * 1024 * 1024
+MULTIPART_OVERHEAD = 64 * 1024
+
+EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/svg+xml": "svg",
+    "application/pdf": "pdf",
+}
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Detect the file type from its leading bytes instead of trusting the client"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in text):
+        return "image/svg+xml"
+    return None
+
+
+def sharded_name(digest: str, extension: str) -> str:
+    """Relative path for a content-addressed file, e.g. ``ab/cd/abcd....jpg``.
+
+    Two levels of 256 subdirectories keep every directory small.
+    """
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+def resolve_upload_path(folder: str, name: str) -> str:
+    """Absolute path of an uploaded file, refusing anything outside ``folder``"""
+    base = os.path.realpath(os.path.join(UPLOAD_DIR, folder))
+    filepath = os.path.realpath(os.path.join(base, name))
+    if not filepath.startswith(base + os.sep) or os.path.basename(filepath).startswith("."):
+        raise HTTPException(status_code=404, detail="File not found")
+    return filepath
+
+
+def upload_relpath(filepath: str) -> str:
+    """Path of a resolved upload relative to UPLOAD_DIR, with forward slashes"""
+    return os.path.relpath(filepath, os.path.realpath(UPLOAD_DIR)).replace(os.sep, "/")
+
+
+def count_references(db: Session, url_path: str) -> int:
+    """Number of expense and repair rows whose stored URL points at ``url_path``"""
+    expenses = select(func.count()).select_from(Expense).where(upload_path(Expense.document_url) == url_path)
+    repairs = select(func.count()).select_from(RepairRecord).where(or_(
+        upload_path(RepairRecord.photo_before_url) == url_path,
+        upload_path(RepairRecord.photo_after_url) == url_path
+    ))
+    return db.execute(select(expenses.scalar_subquery() + repairs.scalar_subquery())).scalar()
+
+
+class UploadSizeLimitMiddleware:
+    """Reject oversized upload requests before their body is parsed.
+
+    FastAPI reads and spools the whole multipart form before an upload
+    endpoint runs, so the limit has to be enforced here: requests whose
+    Content-Length exceeds it get a 413 without being read, and bodies sent
+    without one (chunked) are counted as they arrive and cut off with a 413
+    once they pass it. ``limits`` maps request paths to the maximum file size.
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        max_size = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if max_size is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Allow some slack for the multipart envelope
+        max_body = max_size + MULTIPART_OVERHEAD
+        detail = f"File too large. Maximum {max_size // (1024 * 1024)}MB."
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_body:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def save_upload(
+    file: UploadFile,
+    directory: str,
+    allowed_types: List[str],
+    max_size: int,
+    filename_stem: Optional[str] = None
+) -> dict:
+    """Stream an upload to ``directory`` in fixed-size chunks.
+
+    The type is sniffed from the first chunk, the size limit of the file part
+    is enforced while copying (UploadSizeLimitMiddleware has already capped
+    the request as a whole), and the file only appears under its final name
+    once complete.
+    Without ``filename_stem`` the file is stored under the SHA-256 of its
+    content (see ``sharded_name``), so identical uploads share one file.
+    """
+    head = await file.read(UPLOAD_CHUNK_SIZE)
+    content_type = sniff_content_type(head)
+    if content_type not in allowed_types:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File type not allowed. Allowed types: {', '.join(allowed_types)}"
+        )
+
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{uuid.uuid4()}.part")
+
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        async with aiofiles.open(temp_path, "wb") as f:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large. Maximum {max_size // (1024 * 1024)}MB."
+                    )
+                digest.update(chunk)
+                await f.write(chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    sha256 = digest.hexdigest()
+    if filename_stem:
+        filename = f"{filename_stem}.{EXTENSIONS[content_type]}"
+    else:
+        filename = sharded_name(sha256, EXTENSIONS[content_type])
+    filepath = os.path.join(directory, filename)
+
+    deduplicated = os.path.exists(filepath) and not filename_stem
+    if deduplicated:
+        # Same content is already stored; refresh its mtime so the orphan
+        # cleanup treats it as freshly uploaded
+        os.remove(temp_path)
+        os.utime(filepath)
+    else:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        os.replace(temp_path, filepath)
+
+    return {
+        "filepath": filepath,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "sha256": sha256,
+        "deduplicated": deduplicated
+    }
+
+
+def ensure_variants(saved: dict) -> None:
+    """Schedule preview generation unless a deduplicated upload already has them"""
+    if saved["deduplicated"] and all(os.path.exists(variant_path(saved["filepath"], v)) for v in VARIANTS):
+        return
+    schedule_variants(saved["filepath"])
+
 
 @router.post("/expense")
 async def upload_expense_document(
@@ -22,25 +223,16 @@ async def upload_expense_document(
 ):
     """Upload an expense document"""
     allowed_types = ["image/jpeg", "image/png", "image/webp", "application/pdf"]
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File type not allowed. Allowed types: {', '.join(allowed_types)}"
-        )
-    
-    ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    filename = f"{uuid.uuid4()}.{ext}"
-    filepath = os.path.join(UPLOAD_DIR, "expenses", filename)
     
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    async with aiofiles.open(filepath, "wb") as f:
-        content = await file.read()
-        await f.write(content)
+    saved = await save_upload(file, os.path.join(UPLOAD_DIR, "expenses"), allowed_types, MAX_UPLOAD_SIZE)
+    if saved["content_type"] in RASTER_TYPES:
+        ensure_variants(saved)
     
     return {
-        "url": f"/uploads/expenses/{filename}",
-        "filename": filename,
-        "content_type": file.content_type
+        "url": f"/uploads/expenses/{saved['filename']}",
+        "thumbnail_url": f"/uploads/expenses/{saved['filename']}/thumb" if saved["content_type"] in RASTER_TYPES else None,
+        "filename": saved["filename"],
+        "content_type": saved["content_type"]
     }
 
 
@@ -51,25 +243,15 @@ async def upload_repair_photo(
 ):
     """Upload a repair photo"""
     allowed_types = ["image/jpeg", "image/png", "image/webp"]
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File type not allowed. Allowed types: {', '.join(allowed_types)}"
-        )
-    
-    ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    filename = f"{uuid.uuid4()}.{ext}"
-    filepath = os.path.join(UPLOAD_DIR, "repairs", filename)
     
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    async with aiofiles.open(filepath, "wb") as f:
-        content = await file.read()
-        await f.write(content)
+    saved = await save_upload(file, os.path.join(UPLOAD_DIR, "repairs"), allowed_types, MAX_UPLOAD_SIZE)
+    ensure_variants(saved)
     
     return {
-        "url": f"/uploads/repairs/{filename}",
-        "filename": filename,
-        "content_type": file.content_type
+        "url": f"/uploads/repairs/{saved['filename']}",
+        "thumbnail_url": f"/uploads/repairs/{saved['filename']}/thumb",
+        "filename": saved["filename"],
+        "content_type": saved["content_type"]
     }
 
 
@@ -83,65 +265,150 @@ async def upload_logo(
         raise HTTPException(status_code=403, detail="Admin access required")
 
     allowed_types = ["image/jpeg", "image/png", "image/webp", "image/svg+xml"]
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File type not allowed. Allowed types: {', '.join(allowed_types)}"
-        )
-
-    # Max 2MB
-    content = await file.read()
-    if len(content) > 2 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large. Maximum 2MB.")
-
-    ext = file.filename.split(".")[-1] if "." in file.filename else "png"
-    filename = f"company-logo.{ext}"
     logo_dir = os.path.join(UPLOAD_DIR, "logos")
-    os.makedirs(logo_dir, exist_ok=True)
 
-    # Remove any previous logo files
+    saved = await save_upload(file, logo_dir, allowed_types, MAX_LOGO_SIZE, filename_stem="company-logo")
+
+    # Remove any previous logo files only once the new one is fully written
     for old_file in os.listdir(logo_dir):
-        if old_file.startswith("company-logo"):
+        if old_file.startswith("company-logo") and old_file != saved["filename"]:
             os.remove(os.path.join(logo_dir, old_file))
 
-    filepath = os.path.join(logo_dir, filename)
-    async with aiofiles.open(filepath, "wb") as f:
-        await f.write(content)
-
     return {
-        "url": f"/uploads/logos/{filename}",
-        "filename": filename,
-        "content_type": file.content_type
+        "url": f"/uploads/logos/{saved['filename']}",
+        "filename": saved["filename"],
+        "content_type": saved["content_type"]
     }
 
 
-@router.delete("/expense/{filename}")
-async def delete_expense_document(
+@router.delete("/expense/{filename:path}")
+def delete_expense_document(
     filename: str,
+    db: Session = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
-    """Delete an expense document"""
-    filepath = os.path.join(UPLOAD_DIR, "expenses", filename)
+    """Delete an expense document.
+
+    Files are shared between identical uploads, so the file is only removed
+    once no expense or repair record references it any more, and only once
+    it is past the upload GC grace period: a duplicate uploaded meanwhile
+    (which refreshes the mtime) may be about to be attached to a new record.
+    Younger files are left to the orphan sweep.
+    """
+    filepath = resolve_upload_path("expenses", filename)
     
-    if not os.path.exists(filepath):
+    if not os.path.isfile(filepath):
         raise HTTPException(status_code=404, detail="File not found")
     
-    os.remove(filepath)
+    references = count_references(db, f"/uploads/{upload_relpath(filepath)}")
+    if references:
+        return {"message": "File is still in use", "deleted": False, "references": references}
+    
+    if remove_if_stale(filepath, time.time() - UPLOAD_GC_GRACE_HOURS * 3600) is None:
+        return {"message": "File will be removed by the upload cleanup", "deleted": False, "references": 0}
+    remove_variants(filepath)
     
-    return {"message": "File deleted successfully"}
+    return {"message": "File deleted successfully", "deleted": True, "references": 0}
 
 
-@router.delete("/repair/{filename}")
-async def delete_repair_photo(
+@router.delete("/repair/{filename:path}")
+def delete_repair_photo(
     filename: str,
+    db: Session = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
-    """Delete a repair photo"""
-    filepath = os.path.join(UPLOAD_DIR, "repairs", filename)
+    """Delete a repair photo.
+
+    Files are shared between identical uploads, so the file is only removed
+    once no expense or repair record references it any more, and only once
+    it is past the upload GC grace period: a duplicate uploaded meanwhile
+    (which refreshes the mtime) may be about to be attached to a new record.
+    Younger files are left to the orphan sweep.
+    """
+    filepath = resolve_upload_path("repairs", filename)
     
-    if not os.path.exists(filepath):
+    if not os.path.isfile(filepath):
         raise HTTPException(status_code=404, detail="File not found")
     
-    os.remove(filepath)
+    references = count_references(db, f"/uploads/{upload_relpath(filepath)}")
+    if references:
+        return {"message": "File is still in use", "deleted": False, "references": references}
+    
+    if remove_if_stale(filepath, time.time() - UPLOAD_GC_GRACE_HOURS * 3600) is None:
+        return {"message": "File will be removed by the upload cleanup", "deleted": False, "references": 0}
+    remove_variants(filepath)
+    
+    return {"message": "File deleted successfully", "deleted": True, "references": 0}
+
+
+@router.post("/gc")
+async def run_upload_gc(
+    dry_run: bool = False,
+    current_user: TokenData = Depends(require_admin)
+):
+    """Delete orphaned uploads now and report reclaimed space (admin only)"""
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, run_job_once, "upload-gc", lambda: collect_orphaned_uploads(dry_run=dry_run)
+    )
+    if result is None:
+        raise HTTPException(status_code=409, detail="Upload cleanup already running")
+    
+    return result
+
+
+@media_router.get("/{folder}/{shard1}/{shard2}/{filename}/{variant}")
+async def get_sharded_image_variant(
+    request: Request,
+    folder: str,
+    shard1: str,
+    shard2: str,
+    filename: str,
+    variant: str
+):
+    """Serve a variant of a content-addressed upload"""
+    return await get_image_variant(request, folder, f"{shard1}/{shard2}/{filename}", variant)
+
+
+@media_router.get("/{folder}/{filename}/{variant}")
+async def get_image_variant(
+    request: Request,
+    folder: str,
+    filename: str,
+    variant: str
+):
+    """Serve the web-sized or thumbnail version of an uploaded image.
+
+    Variants missing for older uploads are generated on first request.
+    """
+    if folder not in ("expenses", "repairs") or variant not in VARIANTS:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    original = resolve_upload_path(folder, filename)
+    if not os.path.isfile(original):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    path = variant_path(original, variant)
+    if not os.path.exists(path):
+        if original.rsplit(".", 1)[-1].lower() not in RASTER_EXTENSIONS:
+            raise HTTPException(status_code=404, detail="No preview available for this file type")
+        await generate_variants(original)
+    
+    return await serve_file(request, path, upload_relpath(path), media_type="image/webp")
+
+
+@media_router.api_route("/{folder}/{filename:path}", methods=["GET", "HEAD"])
+async def get_upload(
+    request: Request,
+    folder: str,
+    filename: str
+):
+    """Serve an uploaded file with long-lived caching and Range support"""
+    if folder not in ("expenses", "repairs", "logos"):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    filepath = resolve_upload_path(folder, filename)
+    if not os.path.isfile(filepath):
+        raise HTTPException(status_code=404, detail="File not found")
     
-    return {"message": "File deleted successfully"}
+    # The logo keeps a fixed name across re-uploads, so it must be revalidated
+    return await serve_file(request, filepath, upload_relpath(filepath), immutable=folder != "logos")
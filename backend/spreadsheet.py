@@ -0,0 +1,194 @@
+"""
+Streaming CSV and XLSX writers.
+
+Both writers consume rows lazily and yield encoded chunks, so an export of
+any size is produced in constant memory. The XLSX writer emits a minimal
+workbook (inline strings, no styles) straight into a zip stream; sheets are
+written before the workbook index, so their number need not be known up
+front.
+"""
+import csv
+import io
+import re
+import zipfile
+from decimal import Decimal
+from typing import Iterable, Iterator, List, NamedTuple, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+# Rows are buffered up to this many bytes before a chunk is yielded
+FLUSH_SIZE = 64 * 1024
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+
+_INVALID_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+class Sheet(NamedTuple):
+    name: str
+    rows: Iterable[Sequence]
+    widths: Sequence[float] = ()
+    merges: Sequence[str] = ()
+
+
+def stream_csv(rows: Iterable[Sequence]) -> Iterator[bytes]:
+    """Encode rows as UTF-8 CSV (with a BOM so Excel detects the encoding)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkBuffer:
+    """Write-only, non-seekable file object collecting zip output"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def column_letter(index: int) -> str:
+    """0 -> A, 25 -> Z, 26 -> AA"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _cell_xml(ref: str, value) -> str:
+    if value is None or value == "":
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = escape(_INVALID_XML_CHARS.sub("", str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row_xml(number: int, row: Sequence) -> str:
+    cells = "".join(_cell_xml(f"{column_letter(i)}{number}", value) for i, value in enumerate(row))
+    return f'<row r="{number}">{cells}</row>'
+
+
+def _add_sheet_name(names: List[str], name: str) -> str:
+    """Excel sheet names: max 31 chars, no []:*?/\\ and unique (case-insensitive)"""
+    base = _INVALID_SHEET_CHARS.sub("_", name).strip("'")[:31] or "Sheet"
+    candidate, counter = base, 2
+    taken = {existing.lower() for existing in names}
+    while candidate.lower() in taken:
+        suffix = f" ({counter})"
+        candidate = base[:31 - len(suffix)] + suffix
+        counter += 1
+    names.append(candidate)
+    return candidate
+
+
+def _workbook_parts(names: List[str]) -> List[Tuple[str, str]]:
+    sheets = "".join(
+        f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+        for i, name in enumerate(names, 1)
+    )
+    sheet_rels = "".join(
+        f'<Relationship Id="rId{i}" '
+        f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, len(names) + 1)
+    )
+    sheet_types = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, len(names) + 1)
+    )
+    return [
+        ("xl/workbook.xml",
+         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+         '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+         'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+         f'<sheets>{sheets}</sheets></workbook>'),
+        ("xl/_rels/workbook.xml.rels",
+         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+         f'{sheet_rels}</Relationships>'),
+        ("_rels/.rels",
+         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+         '<Relationship Id="rId1" '
+         'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+         'Target="xl/workbook.xml"/></Relationships>'),
+        ("[Content_Types].xml",
+         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+         '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+         '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+         '<Default Extension="xml" ContentType="application/xml"/>'
+         '<Override PartName="/xl/workbook.xml" '
+         'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+         f'{sheet_types}</Types>'),
+    ]
+
+
+def stream_xlsx(sheets: Iterable[Sheet]) -> Iterator[bytes]:
+    """Write sheets into an XLSX zip stream, yielding it chunk by chunk"""
+    buffer = _ChunkBuffer()
+    names: List[str] = []
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, sheet in enumerate(sheets, 1):
+            _add_sheet_name(names, sheet.name)
+            with archive.open(f"xl/worksheets/sheet{index}.xml", "w") as part:
+                part.write(
+                    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                )
+                if sheet.widths:
+                    cols = "".join(
+                        f'<col min="{i}" max="{i}" width="{width}" customWidth="1"/>'
+                        for i, width in enumerate(sheet.widths, 1)
+                    )
+                    part.write(f"<cols>{cols}</cols>".encode())
+                part.write(b"<sheetData>")
+                for number, row in enumerate(sheet.rows, 1):
+                    part.write(_row_xml(number, row).encode("utf-8"))
+                    if buffer.size >= FLUSH_SIZE:
+                        yield buffer.drain()
+                part.write(b"</sheetData>")
+                if sheet.merges:
+                    merges = "".join(f'<mergeCell ref="{ref}"/>' for ref in sheet.merges)
+                    part.write(f'<mergeCells count="{len(sheet.merges)}">{merges}</mergeCells>'.encode())
+                part.write(b"</worksheet>")
+            yield buffer.drain()
+
+        if not names:
+            # A workbook needs at least one sheet
+            names.append("Sheet1")
+            archive.writestr(
+                "xl/worksheets/sheet1.xml",
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData/></worksheet>'
+            )
+        for name, content in _workbook_parts(names):
+            archive.writestr(name, content)
+    yield buffer.drain()
@@ -0,0 +1,46 @@
+"""
+Periodic stock balance snapshots.
+
+Point-in-time stock queries start from the nearest snapshot and replay the
+ledger since then (see routes/stock.py), so a nightly snapshot keeps that
+replay short however long the ledger grows.
+"""
+import os
+import uuid
+from typing import Optional
+
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import StockBalanceSnapshot, StockItem
+
+STOCK_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("STOCK_SNAPSHOT_INTERVAL_SECONDS", "86400"))
+
+
+def snapshot_stock_balances(db: Optional[Session] = None, created_by: Optional[uuid.UUID] = None) -> dict:
+    """Record the current balance of every stock item in one statement"""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        # now() is fixed for the whole transaction, so every row shares one timestamp
+        snapshot_at = db.execute(select(func.now())).scalar()
+        result = db.execute(
+            insert(StockBalanceSnapshot).from_select(
+                ["id", "stock_item_id", "quantity", "snapshot_at", "created_by", "created_at"],
+                select(
+                    func.gen_random_uuid(),
+                    StockItem.id,
+                    func.coalesce(StockItem.quantity, 0),
+                    func.now(),
+                    literal(created_by, UUID(as_uuid=True)),
+                    func.now()
+                )
+            )
+        )
+        db.commit()
+        return {"snapshot_at": snapshot_at.isoformat(), "items_snapshotted": result.rowcount}
+    finally:
+        if own_session:
+            db.close()
@@ -0,0 +1,153 @@
+"""
+Orphaned upload cleanup.
+
+Files are uploaded before the expense or repair that uses them is saved, and
+deleting a record leaves its files behind. This sweep walks UPLOAD_DIR with
+``os.scandir`` and checks candidates against the database in fixed-size
+batches, so memory stays flat no matter how many files there are. Files
+younger than the grace period are never touched, which protects uploads whose
+record has not been submitted yet.
+"""
+import os
+import time
+from typing import Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from images import RASTER_EXTENSIONS, VARIANTS, is_variant_file, remove_variants
+from models import AdminSetting, Expense, RepairRecord
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/app/uploads")
+UPLOAD_FOLDERS = ("expenses", "repairs", "logos")
+
+UPLOAD_GC_GRACE_HOURS = float(os.getenv("UPLOAD_GC_GRACE_HOURS", "24"))
+UPLOAD_GC_BATCH_SIZE = int(os.getenv("UPLOAD_GC_BATCH_SIZE", "500"))
+UPLOAD_GC_INTERVAL_SECONDS = int(os.getenv("UPLOAD_GC_INTERVAL_SECONDS", "86400"))
+
+# Stored URLs carry the API host; compare on the /uploads/... part only.
+# Must match the expression indexes in init-db-python.sql.
+UPLOAD_PATH_PATTERN = "/uploads/.*$"
+
+
+def upload_path(column):
+    """SQL expression extracting the ``/uploads/...`` path from a stored URL"""
+    return func.substring(column, UPLOAD_PATH_PATTERN)
+
+
+def referenced_paths(db: Session, paths: List[str]) -> Set[str]:
+    """The subset of ``paths`` (``/uploads/...``) referenced by any record"""
+    if not paths:
+        return set()
+    query = union_all(
+        select(upload_path(Expense.document_url)).where(upload_path(Expense.document_url).in_(paths)),
+        select(upload_path(RepairRecord.photo_before_url)).where(upload_path(RepairRecord.photo_before_url).in_(paths)),
+        select(upload_path(RepairRecord.photo_after_url)).where(upload_path(RepairRecord.photo_after_url).in_(paths)),
+        select(upload_path(AdminSetting.value)).where(
+            AdminSetting.key == "company_logo_url",
+            upload_path(AdminSetting.value).in_(paths)
+        ),
+    )
+    return set(db.execute(query).scalars())
+
+
+def _scan(directory: str) -> Iterator[os.DirEntry]:
+    """Yield every regular file below ``directory`` without listing it into memory"""
+    try:
+        iterator = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with iterator:
+        for entry in iterator:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def _has_original(variant_file: str) -> bool:
+    stem = variant_file
+    for variant in VARIANTS:
+        suffix = f".{variant}.webp"
+        if variant_file.endswith(suffix):
+            stem = variant_file[:-len(suffix)]
+            break
+    return any(os.path.exists(f"{stem}.{ext}") for ext in RASTER_EXTENSIONS)
+
+
+def remove_if_stale(path: str, cutoff: float) -> Optional[int]:
+    """Delete ``path`` unless it was touched after ``cutoff``.
+
+    The mtime is re-checked here because a duplicate upload refreshes the
+    mtime of the file it resolves to. Returns the bytes freed, or None if the
+    file was kept or is already gone.
+    """
+    try:
+        stat_result = os.stat(path)
+        if stat_result.st_mtime >= cutoff:
+            return None
+        os.remove(path)
+    except FileNotFoundError:
+        return None
+    return stat_result.st_size
+
+
+def collect_orphaned_uploads(db: Optional[Session] = None, dry_run: bool = False) -> dict:
+    """Delete uploads that no record references and that are past the grace period"""
+    own_session = db is None
+    db = db or SessionLocal()
+    cutoff = time.time() - UPLOAD_GC_GRACE_HOURS * 3600
+    root = os.path.realpath(UPLOAD_DIR)
+    stats = {"scanned": 0, "orphaned": 0, "deleted": 0, "reclaimed_bytes": 0, "dry_run": dry_run}
+
+    def sweep(batch: List[Tuple[str, str, int]]) -> None:
+        referenced = referenced_paths(db, [url_path for url_path, _, _ in batch])
+        # Release the snapshot between batches; the sweep can take a while
+        db.rollback()
+        for url_path, path, size in batch:
+            if url_path in referenced:
+                continue
+            stats["orphaned"] += 1
+            if dry_run:
+                stats["reclaimed_bytes"] += size
+                continue
+            freed = remove_if_stale(path, cutoff)
+            if freed is not None:
+                stats["deleted"] += 1
+                stats["reclaimed_bytes"] += freed + remove_variants(path)
+
+    try:
+        batch: List[Tuple[str, str, int]] = []
+        for folder in UPLOAD_FOLDERS:
+            for entry in _scan(os.path.join(root, folder)):
+                stats["scanned"] += 1
+                stat_result = entry.stat(follow_symlinks=False)
+                if stat_result.st_mtime >= cutoff:
+                    continue
+
+                # Abandoned partial uploads and previews of deleted originals
+                if entry.name.startswith(".") or (is_variant_file(entry.name) and not _has_original(entry.path)):
+                    stats["orphaned"] += 1
+                    if dry_run:
+                        stats["reclaimed_bytes"] += stat_result.st_size
+                    else:
+                        freed = remove_if_stale(entry.path, cutoff)
+                        if freed is not None:
+                            stats["deleted"] += 1
+                            stats["reclaimed_bytes"] += freed
+                    continue
+                if is_variant_file(entry.name):
+                    continue
+
+                url_path = "/uploads/" + os.path.relpath(entry.path, root).replace(os.sep, "/")
+                batch.append((url_path, entry.path, stat_result.st_size))
+                if len(batch) >= UPLOAD_GC_BATCH_SIZE:
+                    sweep(batch)
+                    batch = []
+        if batch:
+            sweep(batch)
+        return stats
+    finally:
+        if own_session:
+            db.close()
@@ -193,9 +193,89 @@ CREATE TABLE IF NOT EXISTS public.bus_schedules (
     updated_at timestamptz NOT NULL DEFAULT now()
 );
 
+-- Trips and expenses are range partitioned by month on trip_date and
+-- expense_date, so date-bounded queries only read the matching months and
+-- old months can be vacuumed, archived or dropped on their own. Rows of a
+-- month without a partition land in the <table>_default partition.
+--
+-- Creates the monthly partitions of ``p_table`` covering [p_from, p_to]
+-- that do not exist yet and returns how many it created. The API's
+-- partition job calls it to stay PARTITION_MONTHS_AHEAD months ahead. A
+-- month that already has rows in the default partition is skipped with a
+-- notice: attaching it would mean moving those rows first.
+CREATE OR REPLACE FUNCTION public.ensure_monthly_partitions(p_table text, p_from date, p_to date)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    key_column text;
+    month date := date_trunc('month', p_from)::date;
+    next_month date;
+    partition_name text;
+    in_default boolean;
+    created integer := 0;
+BEGIN
+    -- One caller at a time (API workers, the init script)
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_monthly_partitions'));
+
+    SELECT a.attname INTO key_column
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = format('public.%I', p_table)::regclass;
+    IF key_column IS NULL THEN
+        RAISE EXCEPTION 'public.% is not partitioned', p_table;
+    END IF;
+
+    WHILE month <= p_to LOOP
+        next_month := (month + interval '1 month')::date;
+        partition_name := format('%s_%s', p_table, to_char(month, 'YYYY_MM'));
+        IF to_regclass(format('public.%I', partition_name)) IS NULL THEN
+            EXECUTE format('SELECT EXISTS (SELECT 1 FROM public.%I WHERE %I >= %L AND %I < %L)',
+                p_table || '_default', key_column, month, key_column, next_month)
+            INTO in_default;
+            IF in_default THEN
+                RAISE NOTICE 'Skipping %: rows for that month are in %_default', partition_name, p_table;
+            ELSE
+                EXECUTE format('CREATE TABLE public.%I PARTITION OF public.%I FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, p_table, month, next_month);
+                created := created + 1;
+            END IF;
+        END IF;
+        month := next_month;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+-- Databases created before partitioning have plain trips and expenses
+-- tables: set them aside (with the foreign keys a partitioned trips table
+-- cannot carry); their rows are moved into the partitioned tables once
+-- all tables exist, further down.
+DO $$
+DECLARE
+    old_index record;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('public.trips') AND relkind = 'r') THEN
+        ALTER TABLE public.expenses DROP CONSTRAINT IF EXISTS expenses_trip_id_fkey;
+        IF to_regclass('public.invoices') IS NOT NULL THEN
+            ALTER TABLE public.invoices DROP CONSTRAINT IF EXISTS invoices_trip_id_fkey;
+        END IF;
+        ALTER TABLE public.trips RENAME TO trips_unpartitioned;
+        ALTER TABLE public.expenses RENAME TO expenses_unpartitioned;
+        -- Frees the index (and primary key) names for the new tables
+        FOR old_index IN
+            SELECT indexname FROM pg_indexes
+            WHERE schemaname = 'public' AND tablename IN ('trips_unpartitioned', 'expenses_unpartitioned')
+        LOOP
+            EXECUTE format('ALTER INDEX public.%I RENAME TO %I', old_index.indexname, left('old_' || old_index.indexname, 63));
+        END LOOP;
+    END IF;
+END
+$$;
+
 -- Trips table
 CREATE TABLE IF NOT EXISTS public.trips (
-    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    id uuid NOT NULL DEFAULT gen_random_uuid(),
     trip_number text NOT NULL,
     bus_id uuid REFERENCES buses(id),
     driver_id uuid REFERENCES profiles(id),
@@ -203,7 +283,8 @@ CREATE TABLE IF NOT EXISTS public.trips (
     schedule_id uuid REFERENCES bus_schedules(id),
     start_date timestamptz NOT NULL,
     end_date timestamptz,
-    trip_date date,
+    -- Partition key; the API fills it from start_date (IST) when not given
+    trip_date date NOT NULL,
     expected_arrival_date date,
     status trip_status NOT NULL DEFAULT 'scheduled',
     trip_type text NOT NULL DEFAULT 'one_way',
@@ -253,8 +334,21 @@ CREATE TABLE IF NOT EXISTS public.trips (
     next_trip_id uuid,
     cycle_position integer DEFAULT 1,
     created_at timestamptz NOT NULL DEFAULT now(),
-    updated_at timestamptz NOT NULL DEFAULT now()
-);
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, trip_date)
+) PARTITION BY RANGE (trip_date);
+
+CREATE TABLE IF NOT EXISTS public.trips_default PARTITION OF public.trips DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_trips_start_date
+    ON public.trips (start_date);
+
+-- Newest-first listings read the latest partitions first and stop early
+CREATE INDEX IF NOT EXISTS idx_trips_trip_date_start
+    ON public.trips (trip_date, start_date);
+
+CREATE INDEX IF NOT EXISTS idx_trips_route_start_date
+    ON public.trips (route_id, start_date);
 
 -- Expense Categories table
 CREATE TABLE IF NOT EXISTS public.expense_categories (
@@ -267,8 +361,9 @@ CREATE TABLE IF NOT EXISTS public.expense_categories (
 
 -- Expenses table
 CREATE TABLE IF NOT EXISTS public.expenses (
-    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
-    trip_id uuid NOT NULL REFERENCES trips(id) ON DELETE CASCADE,
+    id uuid NOT NULL DEFAULT gen_random_uuid(),
+    -- References trips(id) ON DELETE CASCADE, enforced by triggers below
+    trip_id uuid NOT NULL,
     category_id uuid NOT NULL REFERENCES expense_categories(id),
     submitted_by uuid NOT NULL REFERENCES profiles(id),
     amount numeric NOT NULL,
@@ -281,8 +376,17 @@ CREATE TABLE IF NOT EXISTS public.expenses (
     approved_by uuid REFERENCES profiles(id),
     approved_at timestamptz,
     created_at timestamptz NOT NULL DEFAULT now(),
-    updated_at timestamptz NOT NULL DEFAULT now()
-);
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, expense_date)
+) PARTITION BY RANGE (expense_date);
+
+CREATE TABLE IF NOT EXISTS public.expenses_default PARTITION OF public.expenses DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_expenses_trip_status
+    ON public.expenses (trip_id, status);
+
+CREATE INDEX IF NOT EXISTS idx_expenses_date_created
+    ON public.expenses (expense_date, created_at);
 
 -- Repair Records table
 CREATE TABLE IF NOT EXISTS public.repair_records (
@@ -313,6 +417,15 @@ CREATE TABLE IF NOT EXISTS public.repair_records (
     updated_at timestamptz NOT NULL DEFAULT now()
 );
 
+-- Uploaded-file lookups by /uploads/... path (stored URLs include the API host);
+-- used by upload deletion and the orphaned-upload sweep
+CREATE INDEX IF NOT EXISTS idx_expenses_document_path
+    ON public.expenses ((substring(document_url, '/uploads/.*$')));
+CREATE INDEX IF NOT EXISTS idx_repair_records_photo_before_path
+    ON public.repair_records ((substring(photo_before_url, '/uploads/.*$')));
+CREATE INDEX IF NOT EXISTS idx_repair_records_photo_after_path
+    ON public.repair_records ((substring(photo_after_url, '/uploads/.*$')));
+
 -- Admin Settings table
 CREATE TABLE IF NOT EXISTS public.admin_settings (
     id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -351,6 +464,20 @@ CREATE TABLE IF NOT EXISTS public.stock_transactions (
     created_at timestamptz NOT NULL DEFAULT now()
 );
 
+CREATE INDEX IF NOT EXISTS idx_stock_transactions_item_created
+    ON public.stock_transactions (stock_item_id, created_at);
+
+-- Stock Balance Snapshots table (point-in-time quantity per item)
+CREATE TABLE IF NOT EXISTS public.stock_balance_snapshots (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    stock_item_id uuid NOT NULL REFERENCES stock_items(id) ON DELETE CASCADE,
+    quantity integer NOT NULL,
+    snapshot_at timestamptz NOT NULL,
+    created_by uuid REFERENCES profiles(id),
+    created_at timestamptz NOT NULL DEFAULT now(),
+    UNIQUE (stock_item_id, snapshot_at)
+);
+
 -- Invoices table
 CREATE TABLE IF NOT EXISTS public.invoices (
     id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -368,7 +495,8 @@ CREATE TABLE IF NOT EXISTS public.invoices (
     vendor_address text,
     vendor_phone text,
     vendor_gst text,
-    trip_id uuid REFERENCES trips(id),
+    -- References trips(id), enforced by triggers below
+    trip_id uuid,
     bus_id uuid REFERENCES buses(id),
     subtotal numeric NOT NULL DEFAULT 0,
     gst_amount numeric NOT NULL DEFAULT 0,
@@ -423,6 +551,56 @@ CREATE TABLE IF NOT EXISTS public.notifications (
     created_at timestamptz NOT NULL DEFAULT now()
 );
 
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created
+    ON public.notifications (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_notifications_created
+    ON public.notifications (created_at);
+
+-- Per-user unread notification counter (maintained by triggers below)
+CREATE TABLE IF NOT EXISTS public.notification_counters (
+    user_id uuid PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    unread_count integer NOT NULL DEFAULT 0,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Daily fleet rollups per (day, bus, route, driver), maintained by the
+-- triggers below; analytics read these instead of scanning trips.
+-- NULLS NOT DISTINCT (PostgreSQL 15+) so trips without a bus or driver
+-- still land in one row per key.
+CREATE TABLE IF NOT EXISTS public.fleet_daily_rollups (
+    id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    day date NOT NULL,
+    bus_id uuid,
+    route_id uuid NOT NULL,
+    driver_id uuid,
+    trips integer NOT NULL DEFAULT 0,
+    distance numeric NOT NULL DEFAULT 0,
+    water_taken integer NOT NULL DEFAULT 0,
+    revenue_cash numeric NOT NULL DEFAULT 0,
+    revenue_online numeric NOT NULL DEFAULT 0,
+    revenue_paytm numeric NOT NULL DEFAULT 0,
+    revenue_others numeric NOT NULL DEFAULT 0,
+    revenue_agent numeric NOT NULL DEFAULT 0,
+    total_revenue numeric NOT NULL DEFAULT 0,
+    total_expense numeric NOT NULL DEFAULT 0,
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    UNIQUE NULLS NOT DISTINCT (day, bus_id, route_id, driver_id)
+);
+
+-- Approved expenses per rollup key and category
+CREATE TABLE IF NOT EXISTS public.fleet_daily_expense_rollups (
+    id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    day date NOT NULL,
+    bus_id uuid,
+    route_id uuid NOT NULL,
+    driver_id uuid,
+    category_id uuid NOT NULL,
+    expenses integer NOT NULL DEFAULT 0,
+    amount numeric NOT NULL DEFAULT 0,
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    UNIQUE NULLS NOT DISTINCT (day, bus_id, route_id, driver_id, category_id)
+);
+
 -- Security Audit Log table
 CREATE TABLE IF NOT EXISTS public.security_audit_log (
     id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -436,6 +614,51 @@ CREATE TABLE IF NOT EXISTS public.security_audit_log (
     created_at timestamptz NOT NULL DEFAULT now()
 );
 
+-- Monthly partitions for the past year and the months ahead
+SELECT public.ensure_monthly_partitions('trips', (now() - interval '12 months')::date, (now() + interval '3 months')::date);
+SELECT public.ensure_monthly_partitions('expenses', (now() - interval '12 months')::date, (now() + interval '3 months')::date);
+
+-- Move the rows of tables set aside above into the partitioned tables,
+-- creating the partitions their dates need. Their triggers are switched
+-- off first: derived columns and rollups are copied as they are.
+DO $$
+DECLARE
+    source text;
+    target text;
+    key_column text;
+    first_day date;
+    last_day date;
+    columns text;
+BEGIN
+    FOREACH target IN ARRAY ARRAY['trips', 'expenses'] LOOP
+        source := target || '_unpartitioned';
+        CONTINUE WHEN to_regclass(format('public.%I', source)) IS NULL;
+        key_column := CASE target WHEN 'trips' THEN 'trip_date' ELSE 'expense_date' END;
+
+        EXECUTE format('ALTER TABLE public.%I DISABLE TRIGGER USER', source);
+        IF target = 'trips' THEN
+            UPDATE public.trips_unpartitioned
+            SET trip_date = (start_date AT TIME ZONE 'Asia/Kolkata')::date
+            WHERE trip_date IS NULL;
+        END IF;
+
+        EXECUTE format('SELECT min(%I), max(%I) FROM public.%I', key_column, key_column, source)
+        INTO first_day, last_day;
+        IF first_day IS NOT NULL THEN
+            PERFORM public.ensure_monthly_partitions(target, first_day, last_day);
+        END IF;
+
+        -- Generated columns are recomputed by the target
+        SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO columns
+        FROM pg_attribute
+        WHERE attrelid = format('public.%I', target)::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+        EXECUTE format('INSERT INTO public.%I (%s) SELECT %s FROM public.%I', target, columns, columns, source);
+        EXECUTE format('DROP TABLE public.%I', source);
+        RAISE NOTICE 'Moved % into partitioned %', source, target;
+    END LOOP;
+END
+$$;
+
 -- ===========================================
 -- TRIGGERS
 -- ===========================================
@@ -468,25 +691,541 @@ BEGIN
 END
 $$;
 
--- Update trip total expense when expense status changes
-CREATE OR REPLACE FUNCTION public.update_trip_total_expense()
+-- Keep trips.total_expense equal to the sum of its approved expenses.
+-- Statement-level triggers with transition tables: every insert, update or
+-- delete of expenses becomes one grouped UPDATE of the affected trips, so
+-- bulk approvals cost a single trips update. The reconcile job
+-- (POST /admin/reconcile) repairs totals that drifted before these existed.
+DROP TRIGGER IF EXISTS update_expense_total ON public.expenses;
+DROP FUNCTION IF EXISTS public.update_trip_total_expense();
+
+CREATE OR REPLACE FUNCTION public.apply_trip_expense_deltas()
 RETURNS trigger
 LANGUAGE plpgsql
 AS $$
 BEGIN
-    IF NEW.status = 'approved' AND (OLD.status IS NULL OR OLD.status != 'approved') THEN
-        UPDATE public.trips SET total_expense = COALESCE(total_expense, 0) + NEW.amount WHERE id = NEW.trip_id;
-    ELSIF OLD.status = 'approved' AND NEW.status != 'approved' THEN
-        UPDATE public.trips SET total_expense = COALESCE(total_expense, 0) - OLD.amount WHERE id = NEW.trip_id;
+    IF TG_OP = 'INSERT' THEN
+        UPDATE public.trips t
+        SET total_expense = COALESCE(t.total_expense, 0) + d.delta
+        FROM (
+            SELECT trip_id, sum(amount) AS delta FROM new_rows
+            WHERE status = 'approved' GROUP BY trip_id
+        ) d
+        WHERE t.id = d.trip_id AND d.delta <> 0;
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE public.trips t
+        SET total_expense = COALESCE(t.total_expense, 0) + d.delta
+        FROM (
+            SELECT trip_id, sum(delta) AS delta FROM (
+                SELECT trip_id, -amount AS delta FROM old_rows WHERE status = 'approved'
+                UNION ALL
+                SELECT trip_id, amount AS delta FROM new_rows WHERE status = 'approved'
+            ) changes
+            GROUP BY trip_id
+        ) d
+        WHERE t.id = d.trip_id AND d.delta <> 0;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE public.trips t
+        SET total_expense = COALESCE(t.total_expense, 0) - d.removed
+        FROM (
+            SELECT trip_id, sum(amount) AS removed FROM old_rows
+            WHERE status = 'approved' GROUP BY trip_id
+        ) d
+        WHERE t.id = d.trip_id AND d.removed <> 0;
     END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trip_expense_total_insert ON public.expenses;
+CREATE TRIGGER trip_expense_total_insert
+    AFTER INSERT ON public.expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_trip_expense_deltas();
+
+DROP TRIGGER IF EXISTS trip_expense_total_update ON public.expenses;
+CREATE TRIGGER trip_expense_total_update
+    AFTER UPDATE ON public.expenses
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_trip_expense_deltas();
+
+DROP TRIGGER IF EXISTS trip_expense_total_delete ON public.expenses;
+CREATE TRIGGER trip_expense_total_delete
+    AFTER DELETE ON public.expenses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_trip_expense_deltas();
+
+-- Push new notifications to API workers (LISTEN notifications).
+-- Text fields are truncated to stay under the 8000 byte NOTIFY payload limit.
+CREATE OR REPLACE FUNCTION public.notify_notification_insert()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('notifications', json_build_object(
+        'id', NEW.id,
+        'user_id', NEW.user_id,
+        'title', left(NEW.title, 200),
+        'message', left(NEW.message, 1000),
+        'type', NEW.type,
+        'read', NEW.read,
+        'link', left(NEW.link, 300),
+        'created_at', NEW.created_at
+    )::text);
     RETURN NEW;
 END;
 $$;
 
-DROP TRIGGER IF EXISTS update_expense_total ON public.expenses;
-CREATE TRIGGER update_expense_total
+DROP TRIGGER IF EXISTS notify_notification_insert ON public.notifications;
+CREATE TRIGGER notify_notification_insert
+    AFTER INSERT ON public.notifications
+    FOR EACH ROW EXECUTE FUNCTION public.notify_notification_insert();
+
+-- Keep notification_counters in sync. Statement-level triggers with
+-- transition tables so "mark all as read" is one counter update per user.
+CREATE OR REPLACE FUNCTION public.apply_notification_counter_deltas()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.notification_counters (user_id, unread_count)
+        SELECT user_id, count(*) FROM new_rows WHERE NOT read GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE
+            SET unread_count = notification_counters.unread_count + EXCLUDED.unread_count,
+                updated_at = now();
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO public.notification_counters (user_id, unread_count)
+        SELECT user_id, sum(delta) FROM (
+            SELECT user_id, -1 AS delta FROM old_rows WHERE NOT read
+            UNION ALL
+            SELECT user_id, 1 AS delta FROM new_rows WHERE NOT read
+        ) d
+        GROUP BY user_id
+        HAVING sum(delta) <> 0
+        ON CONFLICT (user_id) DO UPDATE
+            SET unread_count = GREATEST(notification_counters.unread_count + EXCLUDED.unread_count, 0),
+                updated_at = now();
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE public.notification_counters c
+        SET unread_count = GREATEST(c.unread_count - d.removed, 0),
+            updated_at = now()
+        FROM (SELECT user_id, count(*) AS removed FROM old_rows WHERE NOT read GROUP BY user_id) d
+        WHERE c.user_id = d.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS notification_counters_insert ON public.notifications;
+CREATE TRIGGER notification_counters_insert
+    AFTER INSERT ON public.notifications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_notification_counter_deltas();
+
+DROP TRIGGER IF EXISTS notification_counters_update ON public.notifications;
+CREATE TRIGGER notification_counters_update
+    AFTER UPDATE ON public.notifications
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_notification_counter_deltas();
+
+DROP TRIGGER IF EXISTS notification_counters_delete ON public.notifications;
+CREATE TRIGGER notification_counters_delete
+    AFTER DELETE ON public.notifications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_notification_counter_deltas();
+
+-- Backfill counters for notifications that existed before the triggers
+INSERT INTO public.notification_counters (user_id, unread_count)
+SELECT user_id, count(*) FILTER (WHERE NOT read) FROM public.notifications GROUP BY user_id
+ON CONFLICT (user_id) DO NOTHING;
+
+-- Keep the fleet rollups in sync. A trip counts on its trip_date (its
+-- start date in IST when unset); cancelled trips and their expenses are
+-- left out. Like the counters above, each statement becomes one grouped
+-- upsert of +/- deltas: old rows are subtracted and new rows added, so a
+-- trip moved to another day, bus or driver moves its figures with it.
+CREATE OR REPLACE FUNCTION public.trip_rollup_day(p_trip_date date, p_start_date timestamptz)
+RETURNS date
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT COALESCE(p_trip_date, (p_start_date AT TIME ZONE 'Asia/Kolkata')::date);
+$$;
+
+-- Rollup writers and rebuild_fleet_rollups meet on one advisory lock per
+-- month: the triggers share the lock of every month they touch, a rebuild
+-- takes the months it recomputes exclusively. Months are locked in order.
+CREATE OR REPLACE FUNCTION public.lock_rollup_months(p_days date[], p_exclusive boolean DEFAULT false)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    month_key integer;
+BEGIN
+    FOR month_key IN
+        SELECT DISTINCT (extract(year FROM d) * 12 + extract(month FROM d))::integer
+        FROM unnest(p_days) d
+        WHERE d IS NOT NULL
+        ORDER BY 1
+    LOOP
+        IF p_exclusive THEN
+            PERFORM pg_advisory_xact_lock(hashtext('fleet_rollups'), month_key);
+        ELSE
+            PERFORM pg_advisory_xact_lock_shared(hashtext('fleet_rollups'), month_key);
+        END IF;
+    END LOOP;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.apply_trip_rollup_deltas()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    changes text;
+BEGIN
+    -- Transition tables are visible to dynamic SQL, so one upsert serves all three events
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT 1 AS sign, * FROM new_rows'
+        WHEN 'UPDATE' THEN 'SELECT -1 AS sign, * FROM old_rows UNION ALL SELECT 1 AS sign, * FROM new_rows'
+        ELSE 'SELECT -1 AS sign, * FROM old_rows'
+    END;
+
+    EXECUTE format('SELECT public.lock_rollup_months(array_agg(public.trip_rollup_day(c.trip_date, c.start_date))) FROM (%s) c',
+                   changes);
+
+    EXECUTE format($sql$
+        INSERT INTO public.fleet_daily_rollups AS r (
+            day, bus_id, route_id, driver_id, trips, distance, water_taken,
+            revenue_cash, revenue_online, revenue_paytm, revenue_others, revenue_agent,
+            total_revenue, total_expense
+        )
+        SELECT
+            public.trip_rollup_day(c.trip_date, c.start_date), c.bus_id, c.route_id, c.driver_id,
+            sum(c.sign),
+            sum(c.sign * (COALESCE(c.distance_traveled, 0) + COALESCE(c.distance_return, 0))),
+            sum(c.sign * COALESCE(c.water_taken, 0)),
+            sum(c.sign * (COALESCE(c.revenue_cash, 0) + COALESCE(c.return_revenue_cash, 0))),
+            sum(c.sign * (COALESCE(c.revenue_online, 0) + COALESCE(c.return_revenue_online, 0))),
+            sum(c.sign * (COALESCE(c.revenue_paytm, 0) + COALESCE(c.return_revenue_paytm, 0))),
+            sum(c.sign * (COALESCE(c.revenue_others, 0) + COALESCE(c.return_revenue_others, 0))),
+            sum(c.sign * (COALESCE(c.revenue_agent, 0) + COALESCE(c.return_revenue_agent, 0))),
+            sum(c.sign * (COALESCE(c.total_revenue, 0) + COALESCE(c.return_revenue_cash, 0)
+                + COALESCE(c.return_revenue_online, 0) + COALESCE(c.return_revenue_paytm, 0)
+                + COALESCE(c.return_revenue_others, 0) + COALESCE(c.return_revenue_agent, 0))),
+            sum(c.sign * COALESCE(c.total_expense, 0))
+        FROM (%s) c
+        WHERE c.status <> 'cancelled'
+        GROUP BY 1, 2, 3, 4
+        -- Updates that touch none of the rolled-up columns cancel out
+        HAVING (sum(c.sign), sum(c.sign * (COALESCE(c.distance_traveled, 0) + COALESCE(c.distance_return, 0))),
+                sum(c.sign * COALESCE(c.water_taken, 0)),
+                sum(c.sign * (COALESCE(c.revenue_cash, 0) + COALESCE(c.return_revenue_cash, 0))),
+                sum(c.sign * (COALESCE(c.revenue_online, 0) + COALESCE(c.return_revenue_online, 0))),
+                sum(c.sign * (COALESCE(c.revenue_paytm, 0) + COALESCE(c.return_revenue_paytm, 0))),
+                sum(c.sign * (COALESCE(c.revenue_others, 0) + COALESCE(c.return_revenue_others, 0))),
+                sum(c.sign * (COALESCE(c.revenue_agent, 0) + COALESCE(c.return_revenue_agent, 0))),
+                sum(c.sign * COALESCE(c.total_expense, 0)))
+            <> (0, 0, 0, 0, 0, 0, 0, 0, 0)
+        ON CONFLICT (day, bus_id, route_id, driver_id) DO UPDATE
+            SET trips = r.trips + EXCLUDED.trips,
+                distance = r.distance + EXCLUDED.distance,
+                water_taken = r.water_taken + EXCLUDED.water_taken,
+                revenue_cash = r.revenue_cash + EXCLUDED.revenue_cash,
+                revenue_online = r.revenue_online + EXCLUDED.revenue_online,
+                revenue_paytm = r.revenue_paytm + EXCLUDED.revenue_paytm,
+                revenue_others = r.revenue_others + EXCLUDED.revenue_others,
+                revenue_agent = r.revenue_agent + EXCLUDED.revenue_agent,
+                total_revenue = r.total_revenue + EXCLUDED.total_revenue,
+                total_expense = r.total_expense + EXCLUDED.total_expense,
+                updated_at = now()
+    $sql$, changes);
+
+    -- A trip moved to another key (or into or out of cancelled) takes its
+    -- approved expenses along
+    IF TG_OP = 'UPDATE' THEN
+        INSERT INTO public.fleet_daily_expense_rollups AS r (
+            day, bus_id, route_id, driver_id, category_id, expenses, amount
+        )
+        SELECT k.day, k.bus_id, k.route_id, k.driver_id, e.category_id, sum(k.sign), sum(k.sign * e.amount)
+        FROM (
+            SELECT -1 AS sign, o.id, public.trip_rollup_day(o.trip_date, o.start_date) AS day,
+                   o.bus_id, o.route_id, o.driver_id, o.status
+            FROM old_rows o JOIN new_rows n ON n.id = o.id
+            WHERE (public.trip_rollup_day(o.trip_date, o.start_date), o.bus_id, o.route_id, o.driver_id, o.status = 'cancelled')
+                IS DISTINCT FROM (public.trip_rollup_day(n.trip_date, n.start_date), n.bus_id, n.route_id, n.driver_id, n.status = 'cancelled')
+            UNION ALL
+            SELECT 1 AS sign, n.id, public.trip_rollup_day(n.trip_date, n.start_date) AS day,
+                   n.bus_id, n.route_id, n.driver_id, n.status
+            FROM old_rows o JOIN new_rows n ON n.id = o.id
+            WHERE (public.trip_rollup_day(o.trip_date, o.start_date), o.bus_id, o.route_id, o.driver_id, o.status = 'cancelled')
+                IS DISTINCT FROM (public.trip_rollup_day(n.trip_date, n.start_date), n.bus_id, n.route_id, n.driver_id, n.status = 'cancelled')
+        ) k
+        JOIN public.expenses e ON e.trip_id = k.id AND e.status = 'approved'
+        WHERE k.status <> 'cancelled'
+        GROUP BY 1, 2, 3, 4, 5
+        HAVING sum(k.sign) <> 0 OR sum(k.sign * e.amount) <> 0
+        ON CONFLICT (day, bus_id, route_id, driver_id, category_id) DO UPDATE
+            SET expenses = r.expenses + EXCLUDED.expenses,
+                amount = r.amount + EXCLUDED.amount,
+                updated_at = now();
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.apply_expense_rollup_deltas()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    changes text;
+BEGIN
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT 1 AS sign, * FROM new_rows'
+        WHEN 'UPDATE' THEN 'SELECT -1 AS sign, * FROM old_rows UNION ALL SELECT 1 AS sign, * FROM new_rows'
+        ELSE 'SELECT -1 AS sign, * FROM old_rows'
+    END;
+
+    EXECUTE format('SELECT public.lock_rollup_months(array_agg(public.trip_rollup_day(t.trip_date, t.start_date)))
+                    FROM (%s) c JOIN public.trips t ON t.id = c.trip_id', changes);
+
+    -- Expenses removed with their trip find no trip here; the trips
+    -- delete trigger has already taken them out
+    EXECUTE format($sql$
+        INSERT INTO public.fleet_daily_expense_rollups AS r (
+            day, bus_id, route_id, driver_id, category_id, expenses, amount
+        )
+        SELECT public.trip_rollup_day(t.trip_date, t.start_date), t.bus_id, t.route_id, t.driver_id,
+               c.category_id, sum(c.sign), sum(c.sign * c.amount)
+        FROM (%s) c
+        JOIN public.trips t ON t.id = c.trip_id
+        WHERE c.status = 'approved' AND t.status <> 'cancelled'
+        GROUP BY 1, 2, 3, 4, 5
+        HAVING sum(c.sign) <> 0 OR sum(c.sign * c.amount) <> 0
+        ON CONFLICT (day, bus_id, route_id, driver_id, category_id) DO UPDATE
+            SET expenses = r.expenses + EXCLUDED.expenses,
+                amount = r.amount + EXCLUDED.amount,
+                updated_at = now()
+    $sql$, changes);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS fleet_rollups_insert ON public.trips;
+CREATE TRIGGER fleet_rollups_insert
+    AFTER INSERT ON public.trips
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_trip_rollup_deltas();
+
+DROP TRIGGER IF EXISTS fleet_rollups_update ON public.trips;
+CREATE TRIGGER fleet_rollups_update
+    AFTER UPDATE ON public.trips
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_trip_rollup_deltas();
+
+DROP TRIGGER IF EXISTS fleet_rollups_delete ON public.trips;
+CREATE TRIGGER fleet_rollups_delete
+    AFTER DELETE ON public.trips
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_trip_rollup_deltas();
+
+DROP TRIGGER IF EXISTS fleet_expense_rollups_insert ON public.expenses;
+CREATE TRIGGER fleet_expense_rollups_insert
+    AFTER INSERT ON public.expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_expense_rollup_deltas();
+
+DROP TRIGGER IF EXISTS fleet_expense_rollups_update ON public.expenses;
+CREATE TRIGGER fleet_expense_rollups_update
     AFTER UPDATE ON public.expenses
-    FOR EACH ROW EXECUTE FUNCTION public.update_trip_total_expense();
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_expense_rollup_deltas();
+
+DROP TRIGGER IF EXISTS fleet_expense_rollups_delete ON public.expenses;
+CREATE TRIGGER fleet_expense_rollups_delete
+    AFTER DELETE ON public.expenses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_expense_rollup_deltas();
+
+-- References to trips(id). A partitioned trips table has no unique key on
+-- id alone, so expenses.trip_id and invoices.trip_id are checked here
+-- instead of by foreign keys. Only statement-level triggers are used:
+-- moving a row to another month's partition fires row-level DELETE
+-- triggers, which must not cascade.
+CREATE OR REPLACE FUNCTION public.check_trip_references()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    changed text;
+    missing uuid;
+BEGIN
+    changed := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT trip_id FROM new_rows'
+        ELSE 'SELECT n.trip_id FROM new_rows n JOIN old_rows o ON o.id = n.id WHERE n.trip_id IS DISTINCT FROM o.trip_id'
+    END;
+    -- Lock the trips like a foreign key would, so a concurrent delete
+    -- either waits for this transaction or is seen below
+    EXECUTE format('SELECT count(*) FROM (SELECT 1 FROM public.trips WHERE id IN (%s) FOR KEY SHARE) locked', changed);
+    EXECUTE format('SELECT c.trip_id FROM (%s) c WHERE c.trip_id IS NOT NULL
+                    AND NOT EXISTS (SELECT 1 FROM public.trips t WHERE t.id = c.trip_id) LIMIT 1', changed)
+    INTO missing;
+    IF missing IS NOT NULL THEN
+        RAISE EXCEPTION 'insert or update on table "%" violates foreign key to table "trips"', TG_TABLE_NAME
+            USING ERRCODE = 'foreign_key_violation',
+                  DETAIL = format('Key (trip_id)=(%s) is not present in table "trips".', missing);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DO $$
+DECLARE
+    t text;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['expenses', 'invoices'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %s_trip_reference_insert ON public.%I', t, t);
+        EXECUTE format('CREATE TRIGGER %s_trip_reference_insert AFTER INSERT ON public.%I '
+                       'REFERENCING NEW TABLE AS new_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION public.check_trip_references()', t, t);
+        EXECUTE format('DROP TRIGGER IF EXISTS %s_trip_reference_update ON public.%I', t, t);
+        EXECUTE format('CREATE TRIGGER %s_trip_reference_update AFTER UPDATE ON public.%I '
+                       'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION public.check_trip_references()', t, t);
+    END LOOP;
+END
+$$;
+
+-- Deleting trips: refused while invoices point at them; otherwise their
+-- approved expenses leave the rollups and the expenses are deleted
+CREATE OR REPLACE FUNCTION public.apply_trip_delete_actions()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    referenced uuid;
+BEGIN
+    SELECT i.trip_id INTO referenced
+    FROM public.invoices i JOIN old_rows o ON o.id = i.trip_id
+    LIMIT 1;
+    IF referenced IS NOT NULL THEN
+        RAISE EXCEPTION 'update or delete on table "trips" violates foreign key from table "invoices"'
+            USING ERRCODE = 'foreign_key_violation',
+                  DETAIL = format('Key (id)=(%s) is still referenced from table "invoices".', referenced);
+    END IF;
+
+    PERFORM public.lock_rollup_months(ARRAY(SELECT public.trip_rollup_day(o.trip_date, o.start_date) FROM old_rows o));
+
+    INSERT INTO public.fleet_daily_expense_rollups AS r (
+        day, bus_id, route_id, driver_id, category_id, expenses, amount
+    )
+    SELECT public.trip_rollup_day(o.trip_date, o.start_date), o.bus_id, o.route_id, o.driver_id,
+           e.category_id, -count(*), -sum(e.amount)
+    FROM old_rows o
+    JOIN public.expenses e ON e.trip_id = o.id AND e.status = 'approved'
+    WHERE o.status <> 'cancelled'
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (day, bus_id, route_id, driver_id, category_id) DO UPDATE
+        SET expenses = r.expenses + EXCLUDED.expenses,
+            amount = r.amount + EXCLUDED.amount,
+            updated_at = now();
+
+    DELETE FROM public.expenses e USING old_rows o WHERE e.trip_id = o.id;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trip_delete_actions ON public.trips;
+CREATE TRIGGER trip_delete_actions
+    AFTER DELETE ON public.trips
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_trip_delete_actions();
+
+-- Recompute the rollups of [p_from, p_to] (open ends cover every day with
+-- trips or rollups) from trips and expenses; returns the number of trip
+-- rollup rows written. Trip and expense writers on the months being
+-- rebuilt wait until it commits, so their deltas land on the rebuilt rows;
+-- other months are not held up. ``python rollups.py`` and POST
+-- /admin/rollups/rebuild call it one month per transaction.
+CREATE OR REPLACE FUNCTION public.rebuild_fleet_rollups(p_from date DEFAULT NULL, p_to date DEFAULT NULL)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    rebuilt integer;
+BEGIN
+    p_from := COALESCE(p_from, LEAST(
+        (SELECT min(trip_date) FROM public.trips),
+        (SELECT min(day) FROM public.fleet_daily_rollups),
+        (SELECT min(day) FROM public.fleet_daily_expense_rollups)));
+    p_to := COALESCE(p_to, GREATEST(
+        (SELECT max(trip_date) FROM public.trips),
+        (SELECT max(day) FROM public.fleet_daily_rollups),
+        (SELECT max(day) FROM public.fleet_daily_expense_rollups)));
+    IF p_from IS NULL OR p_to IS NULL OR p_from > p_to THEN
+        RETURN 0;
+    END IF;
+
+    PERFORM public.lock_rollup_months(
+        ARRAY(SELECT generate_series(date_trunc('month', p_from), p_to, interval '1 month')::date), true);
+
+    DELETE FROM public.fleet_daily_rollups WHERE day BETWEEN p_from AND p_to;
+    DELETE FROM public.fleet_daily_expense_rollups WHERE day BETWEEN p_from AND p_to;
+
+    INSERT INTO public.fleet_daily_rollups (
+        day, bus_id, route_id, driver_id, trips, distance, water_taken,
+        revenue_cash, revenue_online, revenue_paytm, revenue_others, revenue_agent,
+        total_revenue, total_expense
+    )
+    SELECT
+        t.day, t.bus_id, t.route_id, t.driver_id,
+        count(*),
+        sum(COALESCE(t.distance_traveled, 0) + COALESCE(t.distance_return, 0)),
+        sum(COALESCE(t.water_taken, 0)),
+        sum(COALESCE(t.revenue_cash, 0) + COALESCE(t.return_revenue_cash, 0)),
+        sum(COALESCE(t.revenue_online, 0) + COALESCE(t.return_revenue_online, 0)),
+        sum(COALESCE(t.revenue_paytm, 0) + COALESCE(t.return_revenue_paytm, 0)),
+        sum(COALESCE(t.revenue_others, 0) + COALESCE(t.return_revenue_others, 0)),
+        sum(COALESCE(t.revenue_agent, 0) + COALESCE(t.return_revenue_agent, 0)),
+        sum(COALESCE(t.total_revenue, 0) + COALESCE(t.return_revenue_cash, 0)
+            + COALESCE(t.return_revenue_online, 0) + COALESCE(t.return_revenue_paytm, 0)
+            + COALESCE(t.return_revenue_others, 0) + COALESCE(t.return_revenue_agent, 0)),
+        sum(COALESCE(t.total_expense, 0))
+    FROM (
+        SELECT public.trip_rollup_day(trip_date, start_date) AS day, * FROM public.trips
+        WHERE status <> 'cancelled'
+    ) t
+    WHERE t.day BETWEEN p_from AND p_to
+    GROUP BY 1, 2, 3, 4;
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+
+    INSERT INTO public.fleet_daily_expense_rollups (
+        day, bus_id, route_id, driver_id, category_id, expenses, amount
+    )
+    SELECT t.day, t.bus_id, t.route_id, t.driver_id, e.category_id, count(*), sum(e.amount)
+    FROM (
+        SELECT id, public.trip_rollup_day(trip_date, start_date) AS day, bus_id, route_id, driver_id
+        FROM public.trips
+        WHERE status <> 'cancelled'
+    ) t
+    JOIN public.expenses e ON e.trip_id = t.id AND e.status = 'approved'
+    WHERE t.day BETWEEN p_from AND p_to
+    GROUP BY 1, 2, 3, 4, 5;
+
+    RETURN rebuilt;
+END;
+$$;
+
+-- Fill the rollups for data that existed before the triggers
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.fleet_daily_rollups) THEN
+        PERFORM public.rebuild_fleet_rollups();
+    END IF;
+END
+$$;
 
 -- ===========================================
 -- HELPER FUNCTIONS
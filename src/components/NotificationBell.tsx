@@ -39,7 +39,25 @@ export default function NotificationBell() {
 
     const init = async () => {
       await fetchNotifications();
-      if (USE_PYTHON_API) return; // No realtime in offline mode
+      if (cancelled) return;
+
+      if (USE_PYTHON_API) {
+        // Realtime via Server-Sent Events from the Python API
+        const stream = apiClient.openEventStream('/notifications/stream');
+        stream.addEventListener('notification', (event) => {
+          const notification = JSON.parse((event as MessageEvent).data) as Notification;
+          setNotifications((prev) => [notification, ...prev]);
+          setUnreadCount((prev) => prev + 1);
+        });
+        stream.addEventListener('resync', () => {
+          fetchNotifications();
+        });
+
+        cleanup = () => {
+          stream.close();
+        };
+        return;
+      }
 
       const supabase = await getCloudClient();
       if (cancelled) return;
@@ -77,10 +95,15 @@ export default function NotificationBell() {
 
   async function fetchNotifications() {
     if (USE_PYTHON_API) {
-      const { data, error } = await apiClient.get<Notification[]>('/notifications', { limit: 20 });
-      if (!error && data) {
-        setNotifications(data);
-        setUnreadCount(data.filter((n) => !n.read).length);
+      const [list, count] = await Promise.all([
+        apiClient.get<Notification[]>('/notifications', { limit: 20 }),
+        apiClient.get<{ unread_count: number }>('/notifications/unread-count'),
+      ]);
+      if (!list.error && list.data) {
+        setNotifications(list.data);
+      }
+      if (!count.error && count.data) {
+        setUnreadCount(count.data.unread_count);
       }
       return;
     }
@@ -8,6 +8,7 @@ import { USE_PYTHON_API, getCloudClient } from '@/lib/backend';
 import { apiClient } from '@/lib/api-client';
 import { Loader2, Download } from 'lucide-react';
 import { toast } from 'sonner';
+import { format } from 'date-fns';
 import { exportPeriodTripSheet, mapTripToPeriodData } from '@/lib/periodTripSheetExport';
 
 interface PeriodExportDialogProps {
@@ -63,16 +64,18 @@ export default function PeriodExportDialog({ open, onOpenChange }: PeriodExportD
       let expenses: any[] | null = null;
 
       if (USE_PYTHON_API) {
-        const [tripsRes, expRes] = await Promise.all([
-          apiClient.get<any[]>('/trips', {
-            start_date: start.toISOString(),
-            end_date: end.toISOString(),
-            limit: 5000,
-          }),
-          apiClient.get<any[]>('/expenses', { status: 'approved', limit: 5000 }),
-        ]);
-        trips = tripsRes.data;
-        expenses = expRes.data;
+        // Built and streamed by the server in a single request
+        const { error } = await apiClient.download('/exports/period', {
+          from_date: format(start, 'yyyy-MM-dd'),
+          to_date: format(end, 'yyyy-MM-dd'),
+          label,
+          tz: Intl.DateTimeFormat().resolvedOptions().timeZone,
+        });
+        if (error) throw error;
+        toast.success('Fleet Trip Sheet download started');
+        onOpenChange(false);
+        setLoading(false);
+        return;
       } else {
         const supabase = await getCloudClient();
         const [tripsRes, expRes] = await Promise.all([
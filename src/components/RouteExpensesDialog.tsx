@@ -20,6 +20,25 @@ interface RouteExpense {
   submitter: { full_name: string } | null;
 }
 
+interface CategorySummary {
+  category_id: string;
+  category_name: string;
+  total: number;
+  expense_count: number;
+  average_per_trip: number | null;
+  cost_per_km: number | null;
+  share: number | null;
+}
+
+interface RouteExpenseSummary {
+  trip_count: number;
+  total_distance_km: number;
+  total_expense: number;
+  average_expense_per_trip: number | null;
+  cost_per_km: number | null;
+  categories: CategorySummary[];
+}
+
 interface RouteExpensesDialogProps {
   open: boolean;
   onOpenChange: (open: boolean) => void;
@@ -36,6 +55,7 @@ export default function RouteExpensesDialog({
   const [expenses, setExpenses] = useState<RouteExpense[]>([]);
   const [loading, setLoading] = useState(true);
   const [totalAmount, setTotalAmount] = useState(0);
+  const [summary, setSummary] = useState<RouteExpenseSummary | null>(null);
 
   useEffect(() => {
     if (open && routeId) {
@@ -47,11 +67,15 @@ export default function RouteExpensesDialog({
     setLoading(true);
 
     if (USE_PYTHON_API) {
-      // Python API: get expenses by route
-      const res = await apiClient.get<any[]>('/expenses', { route_id: routeId, status: 'approved' });
+      // Python API: get expenses by route, with totals aggregated server-side
+      const [res, summaryRes] = await Promise.all([
+        apiClient.get<any[]>('/expenses', { route_id: routeId, status: 'approved' }),
+        apiClient.get<RouteExpenseSummary>(`/routes/${routeId}/expense-summary`),
+      ]);
       const data = res.data || [];
       setExpenses(data as RouteExpense[]);
-      setTotalAmount(data.reduce((sum, e) => sum + Number(e.amount), 0));
+      setSummary(summaryRes.data || null);
+      setTotalAmount(summaryRes.data?.total_expense ?? data.reduce((sum, e) => sum + Number(e.amount), 0));
     } else {
       const supabase = await getCloudClient();
       
@@ -142,8 +166,40 @@ export default function RouteExpensesDialog({
               <div className="mb-4 p-4 bg-muted rounded-lg">
                 <p className="text-sm text-muted-foreground">Total Approved Expenses</p>
                 <p className="text-2xl font-bold">{formatCurrency(totalAmount)}</p>
+                {summary && (
+                  <p className="text-sm text-muted-foreground mt-1">
+                    {summary.trip_count} trips · {summary.total_distance_km.toLocaleString()} km
+                    {summary.average_expense_per_trip !== null && ` · ${formatCurrency(summary.average_expense_per_trip)} per trip`}
+                    {summary.cost_per_km !== null && ` · ${formatCurrency(summary.cost_per_km)} per km`}
+                  </p>
+                )}
               </div>
 
+              {summary && summary.categories.length > 0 && (
+                <Table className="mb-4">
+                  <TableHeader>
+                    <TableRow>
+                      <TableHead>Category</TableHead>
+                      <TableHead>Total</TableHead>
+                      <TableHead>Per Trip</TableHead>
+                      <TableHead>Per km</TableHead>
+                      <TableHead>Share</TableHead>
+                    </TableRow>
+                  </TableHeader>
+                  <TableBody>
+                    {summary.categories.map((category) => (
+                      <TableRow key={category.category_id}>
+                        <TableCell className="font-medium">{category.category_name}</TableCell>
+                        <TableCell>{formatCurrency(category.total)}</TableCell>
+                        <TableCell>{category.average_per_trip !== null ? formatCurrency(category.average_per_trip) : '-'}</TableCell>
+                        <TableCell>{category.cost_per_km !== null ? formatCurrency(category.cost_per_km) : '-'}</TableCell>
+                        <TableCell>{category.share !== null ? `${(category.share * 100).toFixed(1)}%` : '-'}</TableCell>
+                      </TableRow>
+                    ))}
+                  </TableBody>
+                </Table>
+              )}
+
               <Table>
                 <TableHeader>
                   <TableRow>
@@ -48,8 +48,9 @@ export default function TripExpensesDialog({
     let data: any[] | null = null;
 
     if (USE_PYTHON_API) {
-      const res = await apiClient.get<any[]>('/expenses', { trip_id: tripId });
-      data = res.data;
+      // The financial summary embeds the trip's expenses
+      const res = await apiClient.get<{ expenses: { items: any[] } }>(`/trips/${tripId}/financials`);
+      data = res.data?.expenses.items ?? null;
     } else {
       const supabase = await getCloudClient();
       const res = await supabase
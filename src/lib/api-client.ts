@@ -6,6 +6,9 @@
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 const TOKEN_KEY = 'busmanager_token';
 const USER_KEY = 'busmanager_user';
+// Set on write responses when the API reads from a replica; sent back so our
+// own reads stay on the primary until the replica has caught up
+const READ_PRIMARY_HEADER = 'X-Read-Primary-Until';
 
 export interface User {
   id: string;
@@ -21,9 +24,85 @@ export interface AuthResponse {
   user: User;
 }
 
+type EventListener = (event: MessageEvent) => void;
+
+// Server-Sent Events read with fetch. EventSource cannot send headers and
+// would need the token in the URL, where it ends up in proxy logs and
+// browser history. Like EventSource, it reconnects after the server's
+// retry delay until closed, but gives up on an authentication error.
+export class EventStream {
+  private listeners = new Map<string, EventListener[]>();
+  private controller = new AbortController();
+  private retryMs = 3000;
+
+  constructor(private url: string, private headers: () => HeadersInit) {
+    this.run();
+  }
+
+  addEventListener(type: string, listener: EventListener): void {
+    this.listeners.set(type, [...(this.listeners.get(type) ?? []), listener]);
+  }
+
+  close(): void {
+    this.controller.abort();
+  }
+
+  private async run(): Promise<void> {
+    const { signal } = this.controller;
+    while (!signal.aborted) {
+      try {
+        const response = await fetch(this.url, { headers: this.headers(), signal });
+        if (response.status === 401 || response.status === 403) return;
+        if (response.ok && response.body) await this.read(response.body);
+      } catch {
+        // Network error or closed; reconnect below unless closed
+      }
+      if (signal.aborted) return;
+      await new Promise((resolve) => setTimeout(resolve, this.retryMs));
+    }
+  }
+
+  private async read(body: ReadableStream<Uint8Array>): Promise<void> {
+    const reader = body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    let type = 'message';
+    let data: string[] = [];
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) return;
+      buffer += value;
+      const lines = buffer.split('\n');
+      buffer = lines.pop() ?? '';
+      for (const raw of lines) {
+        const line = raw.endsWith('\r') ? raw.slice(0, -1) : raw;
+        if (line === '') {
+          // A blank line ends the event
+          if (data.length) this.dispatch(type, data.join('\n'));
+          type = 'message';
+          data = [];
+          continue;
+        }
+        if (line.startsWith(':')) continue;
+        const colon = line.indexOf(':');
+        const field = colon === -1 ? line : line.slice(0, colon);
+        const fieldValue = colon === -1 ? '' : line.slice(colon + 1).replace(/^ /, '');
+        if (field === 'event') type = fieldValue;
+        else if (field === 'data') data.push(fieldValue);
+        else if (field === 'retry' && /^\d+$/.test(fieldValue)) this.retryMs = Number(fieldValue);
+      }
+    }
+  }
+
+  private dispatch(type: string, data: string): void {
+    const event = new MessageEvent(type, { data });
+    this.listeners.get(type)?.forEach((listener) => listener(event));
+  }
+}
+
 class ApiClient {
   private token: string | null = null;
   private user: User | null = null;
+  private readPrimaryUntil: string | null = null;
   private authChangeCallbacks: ((user: User | null) => void)[] = [];
 
   constructor() {
@@ -48,9 +127,19 @@ class ApiClient {
     if (this.token) {
       headers['Authorization'] = `Bearer ${this.token}`;
     }
+    if (this.readPrimaryUntil) {
+      headers[READ_PRIMARY_HEADER] = this.readPrimaryUntil;
+    }
     return headers;
   }
 
+  private rememberReadPrimary(response: Response): void {
+    const until = response.headers.get(READ_PRIMARY_HEADER);
+    if (until) {
+      this.readPrimaryUntil = until;
+    }
+  }
+
   private async request<T>(
     method: string,
     path: string,
@@ -63,6 +152,7 @@ class ApiClient {
         headers: { ...this.getHeaders(), ...customHeaders },
         body: body ? JSON.stringify(body) : undefined,
       });
+      this.rememberReadPrimary(response);
 
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({}));
@@ -223,6 +313,7 @@ class ApiClient {
         },
         body: formData,
       });
+      this.rememberReadPrimary(response);
 
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({}));
@@ -236,6 +327,40 @@ class ApiClient {
     }
   }
 
+  // Server-Sent Events stream, authenticated with the Authorization header
+  openEventStream(path: string): EventStream {
+    return new EventStream(`${API_URL}${path}`, () => this.getHeaders());
+  }
+
+  // Let the browser download a server-generated file straight to disk (the
+  // response is streamed, so it never has to fit in memory here). The API
+  // signs a short-lived link for it, so the token never appears in the URL.
+  async download(
+    path: string,
+    params?: Record<string, string | number | undefined>
+  ): Promise<{ error: Error | null }> {
+    const query: Record<string, string> = {};
+    Object.entries(params ?? {}).forEach(([key, value]) => {
+      if (value !== undefined && value !== '') query[key] = String(value);
+    });
+    const { data, error } = await this.post<{ url: string }>('/exports/links', { path, params: query });
+    if (error || !data) return { error: error ?? new Error('Download failed') };
+
+    const link = document.createElement('a');
+    link.href = `${API_URL}${data.url}`;
+    link.rel = 'noopener';
+    link.click();
+    return { error: null };
+  }
+
+  // Resized preview of an uploaded expense/repair image (server generates WebP variants)
+  getPreviewUrl(url: string, variant: 'thumb' | 'web' = 'thumb'): string {
+    if (!/\/uploads\/(expenses|repairs)\/([0-9a-f]{2}\/[0-9a-f]{2}\/)?[^/]+\.(jpe?g|png|webp)$/i.test(url)) {
+      return url;
+    }
+    return `${this.getFileUrl(url)}/${variant}`;
+  }
+
   // Helper to get full file URL
   getFileUrl(path: string): string {
     if (path.startsWith('http')) {
@@ -394,7 +394,7 @@ export default function RepairRecords() {
                       <div>
                         <p className="text-xs text-muted-foreground mb-1">Before Repair</p>
                         <img
-                          src={selectedRecord.photo_before_url}
+                          src={USE_PYTHON_API ? apiClient.getPreviewUrl(selectedRecord.photo_before_url) : selectedRecord.photo_before_url}
                           alt="Before repair"
                           className="rounded-lg border max-h-48 w-full object-cover"
                         />
@@ -404,7 +404,7 @@ export default function RepairRecords() {
                       <div>
                         <p className="text-xs text-muted-foreground mb-1">After Repair</p>
                         <img
-                          src={selectedRecord.photo_after_url}
+                          src={USE_PYTHON_API ? apiClient.getPreviewUrl(selectedRecord.photo_after_url) : selectedRecord.photo_after_url}
                           alt="After repair"
                           className="rounded-lg border max-h-48 w-full object-cover"
                         />
@@ -23,7 +23,7 @@ import TripChainIndicator from '@/components/TripChainIndicator';
 import { useTableFilters } from '@/hooks/useTableFilters';
 import { SearchFilterBar, TablePagination } from '@/components/TableFilters';
 import DateRangeFilter, { DatePreset, getDefaultWeekRange } from '@/components/DateRangeFilter';
-import { subDays } from 'date-fns';
+import { format, subDays } from 'date-fns';
 
 export default function TripManagement() {
   const [trips, setTrips] = useState<Trip[]>([]);
@@ -139,6 +139,22 @@ export default function TripManagement() {
   async function handleExportTripSheet() {
     if (trips.length === 0) return;
     
+    if (USE_PYTHON_API) {
+      // Streamed by the server for the selected date range
+      const { error } = await apiClient.download('/exports/trip-sheet', {
+        from_date: startDate ? format(startDate, 'yyyy-MM-dd') : undefined,
+        to_date: endDate ? format(endDate, 'yyyy-MM-dd') : undefined,
+        tz: Intl.DateTimeFormat().resolvedOptions().timeZone,
+      });
+      if (error) {
+        console.error('Export error:', error);
+        toast.error('Failed to generate Trip Sheet');
+      } else {
+        toast.success('Trip Sheet download started');
+      }
+      return;
+    }
+    
     toast.info('Generating Trip Sheet...');
     
     try {
@@ -229,6 +245,20 @@ export default function TripManagement() {
   }
 
   async function handleDownloadSingleTripSheet(trip: Trip) {
+    if (USE_PYTHON_API) {
+      const { error } = await apiClient.download('/exports/trip-sheet', {
+        trip_id: trip.id,
+        tz: Intl.DateTimeFormat().resolvedOptions().timeZone,
+      });
+      if (error) {
+        console.error('Export error:', error);
+        toast.error('Failed to generate Trip Sheet');
+      } else {
+        toast.success('Trip Sheet download started');
+      }
+      return;
+    }
+    
     toast.info('Generating Trip Sheet...');
     
     try {